@@ -51,6 +51,51 @@ void handleRelay() {
   server.send(200, "text/plain", resp);
 }
 
+String relayStatusLine() {
+  return "living=" + String(digitalRead(PIN_LIVING))
+    + " kitchen=" + String(digitalRead(PIN_KITCHEN))
+    + " bed=" + String(digitalRead(PIN_BED))
+    + " bathroom=" + String(digitalRead(PIN_BATHROOM))
+    + " garden=" + String(digitalRead(PIN_GARDEN));
+}
+
+// GET /relays?set=living:on,kitchen:off  -> every room in one request.
+// All pairs are validated before any pin changes; replies with the resulting relay states.
+void handleRelayBatch() {
+  String spec = server.arg("set");
+  const int MAX_ROOMS = 8;
+  int pins[MAX_ROOMS];
+  int levels[MAX_ROOMS];
+  int count = 0;
+  int start = 0;
+  while (start < (int)spec.length()) {
+    int end = spec.indexOf(',', start);
+    if (end < 0) end = spec.length();
+    String pair = spec.substring(start, end);
+    int colon = pair.indexOf(':');
+    String room = colon > 0 ? pair.substring(0, colon) : "";
+    String state = colon > 0 ? pair.substring(colon + 1) : "";
+    int pin = _room_to_pin(room);
+    if (pin < 0 || (state != "on" && state != "off") || count >= MAX_ROOMS) {
+      server.send(400, "text/plain", "bad_payload");
+      return;
+    }
+    pins[count] = pin;
+    levels[count] = state == "on" ? HIGH : LOW;
+    count++;
+    start = end + 1;
+  }
+  if (count == 0) {
+    server.send(400, "text/plain", "bad_payload");
+    return;
+  }
+
+  for (int i = 0; i < count; i++) {
+    digitalWrite(pins[i], levels[i]);
+  }
+  server.send(200, "text/plain", relayStatusLine());
+}
+
 void handlePing() {
   server.send(200, "text/plain", "pong");
 }
@@ -78,19 +123,10 @@ bool readDht(float& humidity, float& tempC, bool forceRead = false) {
 }
 
 void handleStatus() {
-  int living = digitalRead(PIN_LIVING);
-  int kitchen = digitalRead(PIN_KITCHEN);
-  int bed = digitalRead(PIN_BED);
-  int bathroom = digitalRead(PIN_BATHROOM);
-  int garden = digitalRead(PIN_GARDEN);
   float humidity = NAN;
   float tempC = NAN;
   readDht(humidity, tempC, false);
-  String resp = "living=" + String(living)
-    + " kitchen=" + String(kitchen)
-    + " bed=" + String(bed)
-    + " bathroom=" + String(bathroom)
-    + " garden=" + String(garden);
+  String resp = relayStatusLine();
   if (!isnan(tempC)) {
     resp += " temp_c=" + String(tempC, 1);
   }
@@ -158,6 +194,7 @@ void setup() {
   server.on("/ping", handlePing);
   server.on("/status", HTTP_GET, handleStatus);
   server.on("/relay", HTTP_GET, handleRelay);
+  server.on("/relays", HTTP_GET, handleRelayBatch);
   server.on("/dht", HTTP_GET, handleDht);
   server.on("/sensor", HTTP_GET, handleDht);
 
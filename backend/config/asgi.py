@@ -17,6 +17,10 @@ import vitranslation.virecord.routing
 import viassistant.routing
 django_asgi_app = get_asgi_application()
 
+# 3b) Background services chỉ chạy trong process server (không chạy khi manage.py migrate/shell)
+from viassistant.apps import start_background_services
+start_background_services()
+
 # 4) Gộp tất cả WebSocket routes
 websocket_urlpatterns = (
     chatapp.routing.websocket_urlpatterns
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+class PCMRingBuffer:
+    """
+    Preallocated int16 sample buffer holding the most recent `capacity` samples.
+
+    Storage is allocated once with 25% slack over capacity. Writes append at the
+    head; when the head reaches the end, the live tail is moved back to the front
+    (amortized O(1) per sample). Because of that, view() is always one contiguous
+    slice of the storage and never copies.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._data = np.zeros(self.capacity + max(1, self.capacity // 4), dtype=np.int16)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def clear(self):
+        self._start = 0
+        self._end = 0
+
+    def append(self, pcm16) -> int:
+        """
+        Append PCM16 bytes-like data (bytes/bytearray/memoryview) or an int16 array.
+        Returns the number of samples written.
+        """
+        if isinstance(pcm16, np.ndarray):
+            samples = pcm16.astype(np.int16, copy=False).reshape(-1)
+        else:
+            mv = memoryview(pcm16).cast("B")
+            samples = np.frombuffer(mv[: len(mv) & ~1], dtype=np.int16)
+
+        n = int(samples.size)
+        if n == 0:
+            return 0
+        if n >= self.capacity:
+            self._data[: self.capacity] = samples[-self.capacity:]
+            self._start = 0
+            self._end = self.capacity
+            return n
+
+        if self._end + n > self._data.size:
+            keep = min(len(self), self.capacity - n)
+            self._data[:keep] = self._data[self._end - keep : self._end]
+            self._start = 0
+            self._end = keep
+
+        self._data[self._end : self._end + n] = samples
+        self._end += n
+        if len(self) > self.capacity:
+            self._start = self._end - self.capacity
+        return n
+
+    def keep_last(self, n: int):
+        """Drop everything except the most recent n samples."""
+        n = max(0, int(n))
+        if len(self) > n:
+            self._start = self._end - n
+
+    def drop_first(self, n: int):
+        """Drop the oldest n samples."""
+        n = max(0, int(n))
+        self._start = min(self._end, self._start + n)
+
+    def view(self, last: int | None = None) -> np.ndarray:
+        """
+        Zero-copy int16 view of the buffered audio (optionally only the last N samples).
+        The view is invalidated by the next append(); consume it before pushing again.
+        """
+        start = self._start
+        if last is not None and last > 0:
+            start = max(start, self._end - int(last))
+        return self._data[start : self._end]
@@ -0,0 +1,166 @@
+"""
+STT autotuner: sweep WhisperConfig candidates on a local evaluation set and keep, per use case,
+the fastest one whose WER stays under the ceiling.
+
+    python -m stt_engine.autotune --data bench/ --out stt_profiles.json \
+        --model-size tiny,small,medium --compute-type auto,int8 --beam-size 1,2,5 --vad 0,1
+
+Each candidate runs through the benchmark (stable mode for live captioning, file mode for
+commands and final passes). The written file is picked up at startup via stt_engine.profiles.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import time
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+
+from . import hardware
+from .benchmark import BenchResult, format_table, parse_config, run_benchmark
+from .config import WhisperConfig
+from .profiles import PROFILE_FIELDS, STT_PROFILES, USE_CASES
+from .stream import STREAM_DUTY
+
+
+@dataclass(frozen=True)
+class UseCase:
+    mode: str                 # benchmark mode the use case is scored on
+    metric: str               # BenchResult field to minimise
+    max_wer: float
+    max_rtf: float | None = None  # must keep up with real time
+
+
+TARGETS = {
+    "virecord_live": UseCase(mode="stable", metric="latency_p95_ms", max_wer=0.25, max_rtf=STREAM_DUTY),
+    "viassistant_command": UseCase(mode="file", metric="latency_p50_ms", max_wer=0.15),
+    "final_pass": UseCase(mode="file", metric="rtf", max_wer=0.10),
+}
+
+
+def sweep(
+    base: WhisperConfig,
+    model_sizes: list[str],
+    compute_types: list[str],
+    beam_sizes: list[int],
+    vad: list[bool],
+    engines: list[str] | None = None,
+) -> list[WhisperConfig]:
+    return [
+        replace(base, engine=e, model_size=m, compute_type=c, beam_size=b, vad_filter=v)
+        for e, m, c, b, v in itertools.product(engines or [base.engine], model_sizes, compute_types, beam_sizes, vad)
+    ]
+
+
+def _passes(r: BenchResult, target: UseCase) -> bool:
+    if r.mode != target.mode or r.errors or not r.clips:
+        return False
+    if r.wer > target.max_wer:
+        return False
+    return target.max_rtf is None or r.rtf <= target.max_rtf
+
+
+def pick_profiles(results: list[BenchResult], targets: dict[str, UseCase] = TARGETS) -> dict[str, BenchResult | None]:
+    """Fastest passing result per use case (ties -> lower WER); None when nothing meets the target."""
+    picked: dict[str, BenchResult | None] = {}
+    for use_case, target in targets.items():
+        ok = [r for r in results if _passes(r, target)]
+        picked[use_case] = min(ok, key=lambda r: (getattr(r, target.metric), r.wer)) if ok else None
+    return picked
+
+
+def build_report(
+    data_dir: str,
+    results: list[BenchResult],
+    targets: dict[str, UseCase] = TARGETS,
+) -> dict:
+    picked = pick_profiles(results, targets)
+    return {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "data": str(data_dir),
+        "hardware": hardware.describe(),
+        "targets": {k: asdict(v) for k, v in targets.items()},
+        "profiles": {
+            use_case: {
+                "config": {k: r.config[k] for k in PROFILE_FIELDS},
+                "mode": r.mode,
+                "wer": r.wer,
+                "rtf": r.rtf,
+                "latency_p50_ms": r.latency_p50_ms,
+                "latency_p95_ms": r.latency_p95_ms,
+            }
+            for use_case, r in picked.items() if r is not None
+        },
+        "unmet": [use_case for use_case, r in picked.items() if r is None],
+        "results": [asdict(r) for r in results],
+    }
+
+
+def _csv(raw: str) -> list[str]:
+    return [x.strip() for x in raw.split(",") if x.strip()]
+
+
+def _parse_max_wer(raw: str | None) -> dict[str, UseCase]:
+    """'0.2' applies to every use case; 'final_pass=0.08,virecord_live=0.3' overrides some."""
+    targets = dict(TARGETS)
+    for part in _csv(raw or ""):
+        key, _, val = part.rpartition("=")
+        for use_case in ([key] if key else USE_CASES):
+            if use_case not in targets:
+                raise ValueError(f"unknown use case: {use_case}")
+            targets[use_case] = replace(targets[use_case], max_wer=float(val))
+    return targets
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m stt_engine.autotune", description=__doc__.split("\n\n")[0].strip())
+    ap.add_argument("--data", required=True, help="directory of NAME.wav + NAME.txt pairs")
+    ap.add_argument("--out", default=STT_PROFILES, help="profiles JSON to write")
+    ap.add_argument("--engine", default=WhisperConfig().engine, help="comma list, e.g. faster-whisper,whisper.cpp")
+    ap.add_argument("--model-size", default="tiny,small,medium")
+    ap.add_argument("--compute-type", default="auto", help="comma list, or 'all' for every type this machine supports")
+    ap.add_argument("--beam-size", default="1,2,5")
+    ap.add_argument("--vad", default="0,1", help="vad_filter values to try (0/1)")
+    ap.add_argument("--language", default="en", help="language for every candidate (none = detect)")
+    ap.add_argument("--base", default="", help="extra WhisperConfig overrides, e.g. device=cpu,hotwords=a;b")
+    ap.add_argument("--max-wer", help="WER ceiling: one value, or use_case=value pairs")
+    ap.add_argument("--stub", action="store_true", help="fake model, no faster-whisper/GPU needed")
+    ap.add_argument("--isolate", action="store_true", help="run each candidate in its own process")
+    args = ap.parse_args(argv)
+
+    try:
+        targets = _parse_max_wer(args.max_wer)
+    except ValueError as e:
+        ap.error(str(e))
+    base = parse_config(args.base, parse_config(f"language={args.language}"))
+    compute_types = _csv(args.compute_type)
+    if compute_types == ["all"]:
+        compute_types = sorted(hardware.supported_compute_types(hardware.resolve_device(base.device)))
+    candidates = sweep(
+        base,
+        _csv(args.model_size),
+        compute_types,
+        [int(b) for b in _csv(args.beam_size)],
+        [v.lower() in ("1", "true", "yes", "on") for v in _csv(args.vad)],
+        _csv(args.engine),
+    )
+    modes = tuple(dict.fromkeys(t.mode for t in targets.values()))
+    results = run_benchmark(args.data, candidates, modes, stub=args.stub, isolate=args.isolate)
+    print(format_table(results))
+
+    report = build_report(args.data, results, targets)
+    Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print()
+    for use_case, prof in report["profiles"].items():
+        c = prof["config"]
+        print(f"{use_case:<20} {c['engine']}:{c['model_size']}/{c['compute_type']} b{c['beam_size']}"
+              f"{' vad' if c['vad_filter'] else ''}  WER {prof['wer']:.3f}  RTF {prof['rtf']:.3f}")
+    for use_case in report["unmet"]:
+        print(f"{use_case:<20} no candidate under WER {targets[use_case].max_wer} (defaults kept)")
+    print(f"wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,384 @@
+"""
+STT benchmark: real-time factor, latency percentiles, peak memory and WER per WhisperConfig.
+
+    python -m stt_engine.benchmark --data bench/ \
+        --config model_size=tiny,beam_size=1 --config model_size=medium,beam_size=30
+
+--data holds reference clips: NAME.wav next to NAME.txt (reference transcript).
+Modes: "file" drives transcribe_wav per clip; "stable" / "cumulative" replay each
+clip through StablePrefixStreamer / RealtimeWhisperStreamer in 100 ms chunks.
+--stub swaps in a fake model (no faster-whisper / GPU needed) to exercise the pipeline on CI.
+Engines are compared on the same clips: --config engine=whisper.cpp,model_size=small-q5_1
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+import wave
+from dataclasses import asdict, dataclass, field, fields, replace
+from pathlib import Path
+
+import numpy as np
+
+from .config import WhisperConfig
+from .engines import EngineCapabilities, FasterWhisperEngine
+
+MODES = ("file", "stable", "cumulative")
+DEFAULT_CONFIGS = (
+    "model_size=tiny,beam_size=1",
+    "model_size=small,beam_size=1",
+    "model_size=medium,beam_size=5",
+    "model_size=medium,beam_size=30",
+)
+STREAM_CHUNK_MS = 100
+STUB_RTF = float(os.getenv("STT_BENCH_STUB_RTF", "0.05"))  # simulated decode cost per audio second
+
+_NORM_RE = re.compile(r"[^\w\s']+", re.UNICODE)
+
+
+@dataclass
+class Clip:
+    name: str
+    path: Path
+    reference: str
+    duration: float
+    native: bool  # 16 kHz mono PCM16 (required for the streaming modes)
+
+
+@dataclass
+class BenchResult:
+    config: dict
+    mode: str
+    clips: int = 0
+    audio_sec: float = 0.0
+    decode_sec: float = 0.0
+    rtf: float = 0.0
+    latency_p50_ms: float = 0.0
+    latency_p95_ms: float = 0.0
+    final_latency_p50_ms: float = 0.0   # streaming: end of audio -> final text
+    load_sec: float = 0.0
+    peak_rss_mb: float = 0.0
+    wer: float = 0.0
+    cer: float = 0.0
+    errors: list[str] = field(default_factory=list)
+
+
+# ---------------- dataset ----------------
+def load_clips(data_dir: str | Path) -> list[Clip]:
+    clips: list[Clip] = []
+    for wav_path in sorted(Path(data_dir).glob("*.wav")):
+        txt = wav_path.with_suffix(".txt")
+        if not txt.exists():
+            continue
+        with wave.open(str(wav_path), "rb") as wf:
+            sr, ch, sw, n = wf.getframerate(), wf.getnchannels(), wf.getsampwidth(), wf.getnframes()
+        clips.append(Clip(
+            name=wav_path.stem,
+            path=wav_path,
+            reference=txt.read_text(encoding="utf-8").strip(),
+            duration=n / float(sr or 1),
+            native=(sr, ch, sw) == (16000, 1, 2),
+        ))
+    return clips
+
+
+def _read_pcm16(path: Path) -> bytes:
+    with wave.open(str(path), "rb") as wf:
+        return wf.readframes(wf.getnframes())
+
+
+# ---------------- scoring ----------------
+def _edit_distance(ref: list, hyp: list) -> int:
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_NORM_RE.sub(" ", (text or "").lower()).split())
+
+
+def error_counts(reference: str, hypothesis: str) -> tuple[int, int, int, int]:
+    """(word errors, reference words, char errors, reference chars); chars ignore spaces (zh)."""
+    ref, hyp = _normalize(reference), _normalize(hypothesis)
+    rw, hw = ref.split(), hyp.split()
+    rc, hc = list(ref.replace(" ", "")), list(hyp.replace(" ", ""))
+    return _edit_distance(rw, hw), len(rw), _edit_distance(rc, hc), len(rc)
+
+
+# ---------------- stub model ----------------
+class _StubWord:
+    def __init__(self, start: float, end: float, word: str):
+        self.start, self.end, self.word, self.probability = start, end, word, 0.9
+
+
+class _StubSegment:
+    def __init__(self, start: float, end: float, words: list[_StubWord]):
+        self.start, self.end = start, end
+        self.words = words
+        self.text = "".join(w.word for w in words)
+        self.avg_logprob, self.no_speech_prob = -0.2, 0.01
+
+
+class _StubInfo:
+    def __init__(self, language: str | None, duration: float):
+        self.language, self.language_probability, self.duration = language or "en", 1.0, duration
+
+
+class StubWhisperModel:
+    """Stands in for faster_whisper.WhisperModel: sleeps duration * STUB_RTF, emits 2.5 words/s."""
+
+    def __init__(self, cfg: WhisperConfig):
+        self.cfg = cfg
+
+    def transcribe(self, audio, language=None, word_timestamps=False, **_kw):
+        if isinstance(audio, np.ndarray):
+            duration = audio.size / 16000.0
+        else:
+            with wave.open(audio if isinstance(audio, str) else audio, "rb") as wf:
+                duration = wf.getnframes() / float(wf.getframerate() or 1)
+        time.sleep(duration * STUB_RTF)
+        words = [_StubWord(t, t + 0.3, " stub") for t in np.arange(0.0, max(0.0, duration - 0.3), 0.4)]
+        segs = [_StubSegment(0.0, duration, words)] if words else []
+        return iter(segs), _StubInfo(language, duration)
+
+
+class StubEngine(FasterWhisperEngine):
+    """Every engine name maps here under --stub; unbatched (no BatchedInferencePipeline)."""
+    name = "stub"
+    capabilities = EngineCapabilities(devices=("cpu",), hotwords=True)
+
+    def available(self) -> bool:
+        return True
+
+    def load(self, cfg: WhisperConfig):
+        return StubWhisperModel(cfg)
+
+
+def use_stub_models():
+    """Route every decode in this process to StubWhisperModel."""
+    from . import engines, scheduler, whisper_gpu
+    from .registry import ModelRegistry
+
+    engines.set_override(StubEngine())
+    whisper_gpu.registry = ModelRegistry(loader=StubWhisperModel, budget_mb=0, idle_ttl=0)
+    scheduler._scheduler = scheduler.STTScheduler(backend="thread")  # workers would load real models
+
+
+# ---------------- runners ----------------
+def _warmup(cfg: WhisperConfig) -> float:
+    from .whisper_gpu import transcribe_pcm
+
+    t0 = time.perf_counter()
+    transcribe_pcm(np.zeros(16000, dtype=np.int16), cfg)
+    return time.perf_counter() - t0
+
+
+def _run_file(clip: Clip, cfg: WhisperConfig) -> tuple[str, list[float], float]:
+    from .whisper_gpu import transcribe_wav
+
+    t0 = time.perf_counter()
+    text = transcribe_wav(str(clip.path), cfg)
+    dt = time.perf_counter() - t0
+    return text, [dt], dt
+
+
+def _run_stream(clip: Clip, cfg: WhisperConfig, mode: str) -> tuple[str, list[float], float]:
+    """Replays the clip faster than real time, decoding every streamer.min_interval of audio."""
+    from .stream import RealtimeWhisperStreamer, StablePrefixStreamer
+
+    streamer = StablePrefixStreamer(cfg) if mode == "stable" else RealtimeWhisperStreamer(cfg)
+    pcm = _read_pcm16(clip.path)
+    step = 16000 * 2 * STREAM_CHUNK_MS // 1000
+    hop = max(1, int(round(streamer.min_interval * 1000 / STREAM_CHUNK_MS)))
+
+    latencies: list[float] = []
+    committed: list[str] = []
+    text = ""
+    for k, pos in enumerate(range(0, len(pcm), step), 1):
+        streamer.push(pcm[pos : pos + step])
+        if k % hop:
+            continue
+        t0 = time.perf_counter()
+        if mode == "stable":
+            upd = streamer.transcribe_incremental()
+            if upd.committed:
+                committed.append(upd.committed)
+        else:
+            text = streamer.transcribe_cumulative()
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    if mode == "stable":
+        committed.append(streamer.flush().committed)
+        text = " ".join(t for t in committed if t)
+    else:
+        text = streamer.transcribe_cumulative()
+    final = time.perf_counter() - t0
+    latencies.append(final)
+    return text, latencies, final
+
+
+def run_config(clips: list[Clip], cfg: WhisperConfig, mode: str) -> BenchResult:
+    res = BenchResult(config=asdict(cfg), mode=mode)
+    try:
+        res.load_sec = round(_warmup(cfg), 3)
+    except Exception as e:
+        res.errors.append(f"load: {type(e).__name__}: {e}")
+        return res
+
+    latencies: list[float] = []
+    finals: list[float] = []
+    we = rw = ce = rc = 0
+    for clip in clips:
+        if mode != "file" and not clip.native:
+            res.errors.append(f"{clip.name}: streaming modes need 16 kHz mono PCM16")
+            continue
+        try:
+            if mode == "file":
+                text, lat, final = _run_file(clip, cfg)
+            else:
+                text, lat, final = _run_stream(clip, cfg, mode)
+        except Exception as e:
+            res.errors.append(f"{clip.name}: {type(e).__name__}: {e}")
+            continue
+        res.clips += 1
+        res.audio_sec += clip.duration
+        res.decode_sec += sum(lat)
+        latencies.extend(lat)
+        finals.append(final)
+        a, b, c, d = error_counts(clip.reference, text)
+        we, rw, ce, rc = we + a, rw + b, ce + c, rc + d
+
+    if res.clips:
+        res.rtf = round(res.decode_sec / max(1e-9, res.audio_sec), 4)
+        res.latency_p50_ms = round(float(np.percentile(latencies, 50)) * 1000.0, 1)
+        res.latency_p95_ms = round(float(np.percentile(latencies, 95)) * 1000.0, 1)
+        res.final_latency_p50_ms = round(float(np.percentile(finals, 50)) * 1000.0, 1)
+        res.wer = round(we / max(1, rw), 4)
+        res.cer = round(ce / max(1, rc), 4)
+    res.audio_sec = round(res.audio_sec, 2)
+    res.decode_sec = round(res.decode_sec, 3)
+    # ru_maxrss is KB on Linux; process-wide, so use --isolate for per-config numbers
+    res.peak_rss_mb = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+    return res
+
+
+# ---------------- config specs ----------------
+def parse_config(spec: str, base: WhisperConfig | None = None) -> WhisperConfig:
+    """
+    'model_size=medium,beam_size=30,compute_type=int8' (a bare token means model_size).
+    Bias fields take ';'-separated lists: 'hotwords=kitchen;bedroom;humidity'.
+    """
+    cfg = base or WhisperConfig()
+    types = {f.name: type(getattr(cfg, f.name)) for f in fields(cfg)}
+    updates: dict = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        key, _, val = part.partition("=") if "=" in part else ("model_size", "", part)
+        key = key.strip()
+        if key not in types:
+            raise ValueError(f"unknown WhisperConfig field: {key}")
+        val = val.strip()
+        if key == "language":
+            updates[key] = None if val.lower() in ("", "none", "auto") else val
+        elif key in ("initial_prompt", "hotwords"):
+            updates[key] = None if val.lower() in ("", "none") else val.replace(";", ",")  # ',' separates fields here
+        elif types[key] is bool:
+            updates[key] = val.lower() in ("1", "true", "yes", "on")
+        else:
+            updates[key] = types[key](val)
+    return replace(cfg, **updates)
+
+
+def run_benchmark(
+    data_dir: str | Path,
+    configs: list[WhisperConfig],
+    modes: tuple[str, ...] = ("file",),
+    stub: bool = False,
+    isolate: bool = False,
+) -> list[BenchResult]:
+    clips = load_clips(data_dir)
+    if not clips:
+        raise SystemExit(f"no NAME.wav + NAME.txt pairs in {data_dir}")
+    if isolate:
+        return [r for cfg in configs for r in _run_isolated(data_dir, cfg, modes, stub)]
+    if stub:
+        use_stub_models()
+    return [run_config(clips, cfg, mode) for cfg in configs for mode in modes]
+
+
+def _run_isolated(data_dir, cfg: WhisperConfig, modes, stub: bool) -> list[BenchResult]:
+    """One subprocess per config, so peak RSS and model memory are not shared between configs."""
+    spec = ",".join(
+        f"{k}={'none' if v is None else str(v).replace(',', ';')}"  # bias lists: see parse_config
+        for k, v in asdict(cfg).items()
+    )
+    cmd = [sys.executable, "-m", "stt_engine.benchmark", "--data", str(data_dir),
+           "--config", spec, "--mode", ",".join(modes), "--json", "-"]
+    if stub:
+        cmd.append("--stub")
+    p = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    if p.returncode != 0:
+        err = (p.stderr or "").strip().splitlines()[-1:] or ["failed"]
+        return [BenchResult(config=asdict(cfg), mode=m, errors=[f"isolated run: {err[0]}"]) for m in modes]
+    return [BenchResult(**d) for d in json.loads(p.stdout)]
+
+
+def format_table(results: list[BenchResult]) -> str:
+    head = f"{'config':<40} {'mode':<10} {'clips':>5} {'RTF':>7} {'p50ms':>8} {'p95ms':>8} {'final':>8} {'RSS MB':>8} {'WER':>6} {'CER':>6}"
+    rows = [head, "-" * len(head)]
+    for r in results:
+        c = r.config
+        name = f"{c['model_size']}/{c['device']}/{c['compute_type']} b{c['beam_size']}" + (" vad" if c["vad_filter"] else "")
+        if c.get("engine", "faster-whisper") != "faster-whisper":
+            name = f"{c['engine']}:{name}"
+        rows.append(
+            f"{name:<40} {r.mode:<10} {r.clips:>5} {r.rtf:>7.3f} {r.latency_p50_ms:>8.1f} {r.latency_p95_ms:>8.1f} "
+            f"{r.final_latency_p50_ms:>8.1f} {r.peak_rss_mb:>8.1f} {r.wer:>6.3f} {r.cer:>6.3f}"
+        )
+        rows.extend(f"    ! {e}" for e in r.errors[:3])
+    return "\n".join(rows)
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m stt_engine.benchmark", description=__doc__.split("\n\n")[0].strip())
+    ap.add_argument("--data", required=True, help="directory of NAME.wav + NAME.txt pairs")
+    ap.add_argument("--config", action="append", default=[], help="WhisperConfig overrides, repeatable")
+    ap.add_argument("--language", default="en", help="default language for every config (none = detect)")
+    ap.add_argument("--engine", default=WhisperConfig().engine, help="default engine: faster-whisper / whisper.cpp")
+    ap.add_argument("--mode", default="file", help=f"comma list of {','.join(MODES)}")
+    ap.add_argument("--stub", action="store_true", help="fake model, no faster-whisper/GPU needed")
+    ap.add_argument("--isolate", action="store_true", help="run each config in its own process")
+    ap.add_argument("--json", help="write results as JSON to this path ('-' = stdout only)")
+    args = ap.parse_args(argv)
+
+    modes = tuple(m.strip() for m in args.mode.split(",") if m.strip())
+    bad = [m for m in modes if m not in MODES]
+    if bad:
+        ap.error(f"unknown mode(s): {', '.join(bad)}")
+    base = parse_config(f"language={args.language},engine={args.engine}")
+    configs = [parse_config(s, base) for s in (args.config or DEFAULT_CONFIGS)]
+
+    results = run_benchmark(args.data, configs, modes, stub=args.stub, isolate=args.isolate)
+    payload = json.dumps([asdict(r) for r in results], ensure_ascii=False, indent=2)
+    if args.json == "-":
+        print(payload)
+        return 0
+    print(format_table(results))
+    if args.json:
+        Path(args.json).write_text(payload, encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, replace
+from typing import Iterable, TypeVar
+
+STT_BIAS = os.getenv("STT_BIAS", "1").strip().lower() not in ("0", "false", "no", "off")
+BIAS_MAX_TERMS = int(os.getenv("STT_BIAS_MAX_TERMS", "40"))
+BIAS_MAX_CHARS = 400  # faster-whisper keeps at most ~223 prompt tokens for hotwords
+
+_TERM_RE = re.compile(r"\b[\w][\w'\-.]*\w\b|\b\w\b", re.UNICODE)
+
+_C = TypeVar("_C")
+
+
+@dataclass(frozen=True)
+class BiasProfile:
+    """
+    Decoder biasing for one use case: initial_prompt primes style/domain,
+    hotwords lists the vocabulary whisper should prefer. Applied per call via apply().
+    """
+    name: str
+    initial_prompt: str | None = None
+    hotwords: str | None = None
+
+    def apply(self, cfg: _C) -> _C:
+        """Copy of a WhisperConfig/STTConfig (any dataclass with these fields) with the bias set."""
+        if not STT_BIAS:
+            return cfg
+        return replace(cfg, initial_prompt=self.initial_prompt, hotwords=self.hotwords)
+
+
+def _dedupe(terms: Iterable[str]) -> list[str]:
+    seen: set[str] = set()
+    out: list[str] = []
+    for t in terms:
+        t = " ".join((t or "").split())
+        if t and t.lower() not in seen:
+            seen.add(t.lower())
+            out.append(t)
+    return out
+
+
+def build_profile(
+    name: str,
+    terms: Iterable[str],
+    prompt: str | None = None,
+    max_terms: int = BIAS_MAX_TERMS,
+) -> BiasProfile:
+    words = _dedupe(terms)[:max_terms]
+    hotwords = ""
+    for w in words:
+        nxt = f"{hotwords}, {w}" if hotwords else w
+        if len(nxt) > BIAS_MAX_CHARS:
+            break
+        hotwords = nxt
+    prompt = " ".join((prompt or "").split())[:BIAS_MAX_CHARS] or None
+    return BiasProfile(name=name, initial_prompt=prompt, hotwords=hotwords or None)
+
+
+def extract_terms(text: str, max_terms: int = 20, min_count: int = 2) -> list[str]:
+    """
+    Domain terms from earlier transcript text: names, acronyms and tokens with digits
+    (not sentence-initial capitals) that occur at least min_count times, most frequent first.
+    """
+    counts: Counter[str] = Counter()
+    for sentence in re.split(r"[.!?。！？\n]+", text or ""):
+        tokens = _TERM_RE.findall(sentence)
+        for i, tok in enumerate(tokens):
+            if len(tok) < 2:
+                continue
+            acronym = tok.isupper() and any(c.isalpha() for c in tok)
+            named = i > 0 and tok[0].isupper()
+            if acronym or named or (any(c.isdigit() for c in tok) and any(c.isalpha() for c in tok)):
+                counts[tok] += 1
+    return [t for t, n in counts.most_common(max_terms) if n >= min_count]
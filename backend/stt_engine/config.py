@@ -1,15 +1,19 @@
-# stt_engine/config.py
+import os
 from dataclasses import dataclass
 
+# backend for configs that do not name one (see stt_engine/engines)
+STT_ENGINE = (os.getenv("STT_ENGINE") or "faster-whisper").strip()
+
 @dataclass
 class WhisperConfig:
     model_size: str = "tiny"        # small/medium/large-v3
-    device: str = "cuda"             # cuda/cpu
-    compute_type: str = "float16"    # float16/int8_float16/int8
+    device: str = "auto"             # auto/cuda/cpu (auto = cuda if usable, else cpu)
+    compute_type: str = "auto"       # auto/float16/int8_float16/int8 (see hardware.py)
     language: str | None = None      # en/vi/zh or None
     vad_filter: bool = False
-<<<<<<< HEAD
-    beam_size: int = 2.5
-=======
     beam_size: int = 2
->>>>>>> 3bbeab7851a08a59d059c303722c0b4f52657571
+    cpu_threads: int = 0             # 0 = derive from core count
+    num_workers: int = 0             # 0 = derive from core count
+    initial_prompt: str | None = None  # domain/style priming text (see biasing.py)
+    hotwords: str | None = None        # comma-separated vocabulary to prefer
+    engine: str = STT_ENGINE           # faster-whisper / whisper.cpp (see engines/)
@@ -0,0 +1,56 @@
+"""
+STT backends behind one interface (see base.STTEngine), selected per call by WhisperConfig.engine.
+
+    faster-whisper  CTranslate2, CUDA/CPU, batched decoding (default)
+    whisper.cpp     ggml via pywhispercpp, CPU-oriented, quantized models
+"""
+from __future__ import annotations
+
+from .base import EngineCapabilities, EngineInfo, EngineSegment, EngineWord, STTEngine
+from .fasterwhisper import FasterWhisperEngine
+from .whispercpp import WhisperCppEngine
+
+_ENGINES: dict[str, STTEngine] = {e.name: e for e in (FasterWhisperEngine(), WhisperCppEngine())}
+_ALIASES = {
+    "faster_whisper": "faster-whisper",
+    "ctranslate2": "faster-whisper",
+    "whisper_cpp": "whisper.cpp",
+    "whispercpp": "whisper.cpp",
+    "ggml": "whisper.cpp",
+}
+_override: STTEngine | None = None
+
+
+def get_engine(name: str) -> STTEngine:
+    if _override is not None:
+        return _override
+    key = (name or "faster-whisper").strip().lower()
+    try:
+        return _ENGINES[_ALIASES.get(key, key)]
+    except KeyError:
+        raise ValueError(f"unknown STT engine: {name!r} (known: {', '.join(_ENGINES)})") from None
+
+
+def register_engine(engine: STTEngine):
+    """Add a backend without touching stt_engine (e.g. an ONNX Runtime port)."""
+    _ENGINES[engine.name] = engine
+
+
+def set_override(engine: STTEngine | None):
+    """Route every engine name to one backend (benchmark --stub); None restores normal lookup."""
+    global _override
+    _override = engine
+
+
+def describe() -> dict:
+    return {
+        name: {"available": e.available(), "capabilities": e.capabilities.__dict__}
+        for name, e in _ENGINES.items()
+    }
+
+
+__all__ = [
+    "EngineCapabilities", "EngineInfo", "EngineSegment", "EngineWord", "STTEngine",
+    "FasterWhisperEngine", "WhisperCppEngine",
+    "get_engine", "register_engine", "set_override", "describe",
+]
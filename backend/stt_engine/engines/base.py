@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import importlib.util
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Iterator
+
+import numpy as np
+
+from ..config import WhisperConfig
+
+
+@dataclass(frozen=True)
+class EngineCapabilities:
+    devices: tuple[str, ...] = ("cpu",)
+    batched: bool = False             # several clips in one forward pass (transcribe_pcm_batch)
+    word_timestamps: bool = True
+    language_detection: bool = True   # info.language_probability is meaningful
+    confidence: bool = True           # avg_logprob / no_speech_prob are meaningful (cascade, language lock)
+    hotwords: bool = False
+    initial_prompt: bool = True
+
+
+# faster-whisper shaped results: whisper_gpu._to_segment/_to_result read these attributes
+@dataclass
+class EngineWord:
+    start: float
+    end: float
+    word: str
+    probability: float = 0.0
+
+
+@dataclass
+class EngineSegment:
+    start: float
+    end: float
+    text: str
+    avg_logprob: float = 0.0
+    no_speech_prob: float = 0.0
+    words: list[EngineWord] = field(default_factory=list)
+
+
+@dataclass
+class EngineInfo:
+    language: str | None
+    language_probability: float
+    duration: float
+
+
+class STTEngine(ABC):
+    """
+    One speech-to-text backend. load() returns the model object the registry caches;
+    transcribe() returns (lazy iterator of segments, info), segments shaped like
+    faster-whisper's (start/end/text/avg_logprob/no_speech_prob/words).
+    """
+    name: str = ""
+    module: str = ""  # import name of the python binding, for available()
+    capabilities = EngineCapabilities()
+
+    def available(self) -> bool:
+        return importlib.util.find_spec(self.module) is not None
+
+    def resolve_compute_type(self, device: str, requested: str) -> str:
+        """Engines without CTranslate2 compute types keep the request as a label."""
+        return (requested or "auto").strip().lower()
+
+    @abstractmethod
+    def load(self, cfg: WhisperConfig):
+        ...
+
+    @abstractmethod
+    def transcribe(
+        self,
+        model,
+        audio: str | object | np.ndarray,
+        cfg: WhisperConfig,
+        word_timestamps: bool = False,
+    ) -> tuple[Iterator, object]:
+        ...
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import logging
+
+from ..config import WhisperConfig
+from .base import EngineCapabilities, STTEngine
+
+logger = logging.getLogger("stt_engine.whisper")
+
+
+class FasterWhisperEngine(STTEngine):
+    """CTranslate2 whisper (pip install faster-whisper); CUDA or CPU, batched decoding."""
+    name = "faster-whisper"
+    module = "faster_whisper"
+    capabilities = EngineCapabilities(devices=("cuda", "cpu"), batched=True, hotwords=True)
+
+    def resolve_compute_type(self, device: str, requested: str) -> str:
+        from ..hardware import resolve_compute_type
+
+        return resolve_compute_type(device, requested)
+
+    def load(self, cfg: WhisperConfig):
+        from faster_whisper import WhisperModel  # pip install faster-whisper
+        logger.warning(
+            "[stt] loading %s on %s/%s threads=%d workers=%d",
+            cfg.model_size, cfg.device, cfg.compute_type, cfg.cpu_threads, cfg.num_workers,
+        )
+        return WhisperModel(
+            cfg.model_size,
+            device=cfg.device,
+            compute_type=cfg.compute_type,
+            cpu_threads=cfg.cpu_threads,
+            num_workers=max(1, cfg.num_workers),
+        )
+
+    def transcribe(self, model, audio, cfg: WhisperConfig, word_timestamps: bool = False):
+        return model.transcribe(
+            audio,
+            language=cfg.language,                 # "en"/"vi"/"zh" or None
+            vad_filter=cfg.vad_filter,
+            beam_size=max(1, int(cfg.beam_size or 1)),
+            word_timestamps=word_timestamps,
+            initial_prompt=cfg.initial_prompt or None,
+            hotwords=cfg.hotwords or None,
+
+            # IMPORTANT: reduce hallucination / "continue writing"
+            condition_on_previous_text=False,
+
+            # More deterministic
+            temperature=0.0,
+
+            # Guardrails against no-speech / garbage
+            no_speech_threshold=0.6,
+            log_prob_threshold=-1.0,
+            compression_ratio_threshold=2.4,
+        )
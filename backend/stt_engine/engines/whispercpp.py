@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import logging
+import math
+import queue
+import threading
+import wave
+from typing import Iterator
+
+import numpy as np
+
+from ..config import WhisperConfig
+from ..resample import InputFormat, PCMConverter
+from .base import EngineCapabilities, EngineInfo, EngineSegment, EngineWord, STTEngine
+
+logger = logging.getLogger("stt_engine.whispercpp")
+
+SAMPLE_RATE = 16000
+_SENTENCE_END = (".", "?", "!", "。", "？", "！")
+_DONE = object()
+
+
+class _CppModel:
+    """A pywhispercpp Model plus the lock that serializes it (one whisper.cpp context per model)."""
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+
+
+def _load_audio(audio) -> np.ndarray:
+    """whisper.cpp takes 16 kHz mono float32; WAV paths/file-likes are decoded and resampled here."""
+    if isinstance(audio, np.ndarray):
+        return audio.astype(np.float32, copy=False)
+    with wave.open(audio, "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError("whisper.cpp engine reads PCM16 WAV only")
+        fmt = InputFormat(sample_rate=wf.getframerate(), channels=wf.getnchannels())
+        raw = wf.readframes(wf.getnframes())
+    pcm = PCMConverter(fmt)(raw)
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def _segment(t0: int, t1: int, text: str, probability: float | None) -> EngineSegment:
+    # pywhispercpp timestamps are in 10 ms units; no probability = unknown confidence, never "certain"
+    logprob = math.log(max(1e-6, probability)) if probability is not None else -math.inf
+    return EngineSegment(start=t0 / 100.0, end=t1 / 100.0, text=text, avg_logprob=logprob)
+
+
+def _group_words(words: Iterator[EngineSegment]) -> Iterator[EngineSegment]:
+    """split_on_word output (one segment per word) -> sentence segments carrying words."""
+    group: list[EngineSegment] = []
+    for w in words:
+        if not w.text.strip():
+            continue
+        group.append(w)
+        if w.text.rstrip().endswith(_SENTENCE_END):
+            yield _join(group)
+            group = []
+    if group:
+        yield _join(group)
+
+
+def _join(words: list[EngineSegment]) -> EngineSegment:
+    return EngineSegment(
+        start=words[0].start,
+        end=words[-1].end,
+        text="".join(w.text for w in words),
+        avg_logprob=sum(w.avg_logprob for w in words) / len(words),
+        words=[EngineWord(w.start, w.end, w.text, math.exp(w.avg_logprob)) for w in words],
+    )
+
+
+class WhisperCppEngine(STTEngine):
+    """
+    whisper.cpp through pywhispercpp (pip install pywhispercpp): ggml models, CPU-oriented
+    (AVX/NEON, quantized models such as "small-q5_1"). model_size is the ggml model name.
+    hotwords are folded into the initial prompt; no batched decoding and no no_speech_prob.
+    """
+    name = "whisper.cpp"
+    module = "pywhispercpp"
+    capabilities = EngineCapabilities(devices=("cpu",), confidence=False, hotwords=False)
+
+    def resolve_compute_type(self, device: str, requested: str) -> str:
+        return "ggml"  # the precision is part of the model name
+
+    def load(self, cfg: WhisperConfig):
+        from pywhispercpp.model import Model  # pip install pywhispercpp
+
+        logger.warning("[stt] loading whisper.cpp %s threads=%d", cfg.model_size, cfg.cpu_threads)
+        # beam-search sampling; beam_size 1 per call behaves like greedy
+        return _CppModel(Model(
+            cfg.model_size,
+            params_sampling_strategy=1,
+            n_threads=max(1, cfg.cpu_threads),
+            print_progress=False,
+            print_realtime=False,
+        ))
+
+    def transcribe(self, model: _CppModel, audio, cfg: WhisperConfig, word_timestamps: bool = False):
+        samples = _load_audio(audio)
+        duration = samples.size / SAMPLE_RATE
+        with model.lock:
+            language, probability = self._language(model, samples, cfg)
+        prompt = " ".join(p for p in (cfg.initial_prompt, cfg.hotwords) if p)
+        params = {
+            "language": language,
+            "n_threads": max(1, cfg.cpu_threads),
+            "no_context": True,   # condition_on_previous_text=False
+            "temperature": 0.0,
+            "beam_search": {"beam_size": max(1, int(cfg.beam_size or 1)), "patience": -1.0},
+            "initial_prompt": prompt,
+        }
+        if word_timestamps:
+            params.update(token_timestamps=True, max_len=1, split_on_word=True)
+        segments = self._stream(model, samples, params)
+        if word_timestamps:
+            segments = _group_words(segments)
+        return segments, EngineInfo(language=language, language_probability=probability, duration=duration)
+
+    def _language(self, model: _CppModel, samples: np.ndarray, cfg: WhisperConfig) -> tuple[str, float]:
+        if cfg.language:
+            return cfg.language, 1.0
+        (lang, prob), _all = model.model.auto_detect_language(samples, n_threads=max(1, cfg.cpu_threads))
+        return lang, float(prob)
+
+    def _stream(self, model: _CppModel, samples: np.ndarray, params: dict) -> Iterator[EngineSegment]:
+        """Segments as whisper.cpp emits them (new_segment_callback), decoded on a helper thread."""
+        q: queue.Queue = queue.Queue()
+
+        def on_segment(seg):
+            q.put(_segment(seg.t0, seg.t1, seg.text, getattr(seg, "probability", None)))
+
+        def run():
+            try:
+                with model.lock:
+                    model.model.transcribe(samples, new_segment_callback=on_segment, **params)
+                q.put(_DONE)
+            except BaseException as e:
+                q.put(e)
+
+        threading.Thread(target=run, name="whispercpp-decode", daemon=True).start()
+        while (item := q.get()) is not _DONE:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import replace
+from functools import lru_cache
+
+from .config import WhisperConfig
+
+logger = logging.getLogger("stt_engine.hardware")
+
+STT_FORCE_CPU = os.getenv("STT_FORCE_CPU", "0").strip().lower() in ("1", "true", "yes", "on")
+
+# preference order per device; the first one CTranslate2 supports on this box wins
+_COMPUTE_PREFERENCE = {
+    "cuda": ("int8_float16", "float16", "int8", "float32"),
+    "cpu": ("int8", "int8_float32", "float32"),
+}
+_CUDA_ERROR_HINTS = ("cuda", "cublas", "cudnn", "nvrtc", "gpu")
+
+_cuda_unusable_reason: str | None = None
+_cpu_share = 1  # >1 when cores are split between STT worker processes (procpool.py)
+
+
+def cpu_cores() -> int:
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except Exception:
+        return max(1, os.cpu_count() or 1)
+
+
+@lru_cache(maxsize=1)
+def cuda_device_count() -> int:
+    if STT_FORCE_CPU:
+        return 0
+    try:
+        import ctranslate2  # installed with faster-whisper
+
+        return int(ctranslate2.get_cuda_device_count())
+    except Exception:
+        return 0
+
+
+@lru_cache(maxsize=4)
+def supported_compute_types(device: str) -> frozenset[str]:
+    try:
+        import ctranslate2
+
+        return frozenset(ctranslate2.get_supported_compute_types(device))
+    except Exception:
+        return frozenset(("float32",)) if device == "cpu" else frozenset()
+
+
+def set_cpu_share(processes: int):
+    """Derive CPU threads per process as if only cores // processes were available."""
+    global _cpu_share
+    _cpu_share = max(1, int(processes))
+
+
+def cuda_usable() -> bool:
+    return _cuda_unusable_reason is None and cuda_device_count() > 0
+
+
+def mark_cuda_unusable(reason: str):
+    """After a CUDA init/runtime failure every later resolve_config() lands on CPU."""
+    global _cuda_unusable_reason
+    if _cuda_unusable_reason is None:
+        logger.warning("[hw] CUDA disabled for STT, falling back to CPU: %s", reason)
+    _cuda_unusable_reason = reason or "cuda_error"
+
+
+def is_cuda_error(exc: BaseException) -> bool:
+    msg = str(exc).lower()
+    return any(h in msg for h in _CUDA_ERROR_HINTS)
+
+
+def resolve_device(requested: str) -> str:
+    req = (requested or "auto").strip().lower()
+    if req == "cpu":
+        return "cpu"
+    return "cuda" if cuda_usable() else "cpu"
+
+
+def resolve_compute_type(device: str, requested: str) -> str:
+    req = (requested or "auto").strip().lower()
+    supported = supported_compute_types(device)
+    if req != "auto" and (req in supported or not supported):
+        return req
+    for ct in _COMPUTE_PREFERENCE[device]:
+        if ct in supported:
+            return ct
+    return "float32" if device == "cpu" else "float16"
+
+
+def resolve_config(cfg: WhisperConfig) -> WhisperConfig:
+    """
+    Concrete device/compute_type/threads for this box. "auto" (or an unavailable
+    "cuda") resolves to CPU with int8 and threads split from the core count.
+    Idempotent: resolving a resolved config returns it unchanged.
+    """
+    from .engines import get_engine
+
+    engine = get_engine(cfg.engine)
+    device = resolve_device(cfg.device)
+    if device not in engine.capabilities.devices:
+        device = engine.capabilities.devices[0]  # e.g. whisper.cpp builds are CPU-only
+    compute_type = engine.resolve_compute_type(device, cfg.compute_type)
+
+    num_workers = cfg.num_workers
+    cpu_threads = cfg.cpu_threads
+    if device == "cpu":
+        cores = max(1, cpu_cores() // _cpu_share)
+        if num_workers <= 0:
+            num_workers = 2 if cores >= 8 else 1
+        if cpu_threads <= 0:
+            cpu_threads = max(1, cores // num_workers)
+    else:
+        num_workers = max(1, num_workers)
+
+    if (device, compute_type, cpu_threads, num_workers) == (
+        cfg.device, cfg.compute_type, cfg.cpu_threads, cfg.num_workers
+    ):
+        return cfg
+    return replace(cfg, device=device, compute_type=compute_type, cpu_threads=cpu_threads, num_workers=num_workers)
+
+
+def describe() -> dict:
+    return {
+        "cpu_cores": cpu_cores(),
+        "cpu_share": _cpu_share,
+        "cuda_devices": cuda_device_count(),
+        "cuda_usable": cuda_usable(),
+        "cuda_unusable_reason": _cuda_unusable_reason,
+        "compute_types": {d: sorted(supported_compute_types(d)) for d in ("cpu", "cuda")},
+    }
+
+
+def cpu_fallback(cfg: WhisperConfig) -> WhisperConfig:
+    return resolve_config(replace(cfg, device="cpu", compute_type="auto", cpu_threads=0, num_workers=0))
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, replace
+from typing import TypeVar
+
+from .whisper_gpu import TranscriptResult
+
+STT_LANG_LOCK_SEC = float(os.getenv("STT_LANG_LOCK_SEC", "2.0"))          # audio needed before locking
+STT_LANG_LOCK_PROB = float(os.getenv("STT_LANG_LOCK_PROB", "0.7"))        # min detection probability
+STT_LANG_LOCK_AGREE = int(os.getenv("STT_LANG_LOCK_AGREE", "3"))        # ...or this many agreeing decodes
+STT_LANG_RELOCK_LOGPROB = float(os.getenv("STT_LANG_RELOCK_LOGPROB", "-1.0"))  # mean avg_logprob floor
+STT_LANG_RELOCK_AFTER = int(os.getenv("STT_LANG_RELOCK_AFTER", "2"))      # low-confidence decodes in a row
+
+_C = TypeVar("_C")
+
+
+@dataclass
+class LanguageEvent:
+    language: str | None   # None = lock released, detecting again
+    probability: float
+    locked: bool
+
+
+class LanguageLock:
+    """
+    Auto-language session state: a confident detection (probability >= STT_LANG_LOCK_PROB) is
+    locked once it covers STT_LANG_LOCK_SEC of audio or STT_LANG_LOCK_AGREE decodes in a row
+    agree on it (short streaming windows). Later decodes skip detection: no extra encoder
+    pass, no language flips between drafts, and the requests become batchable.
+    The lock is released after STT_LANG_RELOCK_AFTER decodes in a row whose text confidence
+    falls below STT_LANG_RELOCK_LOGPROB, so the next decode detects again. Engines without
+    meaningful confidence (EngineCapabilities.confidence) pass confident=False: no relock scoring.
+    """
+
+    def __init__(self):
+        self.language: str | None = None
+        self.probability = 0.0
+        self._low = 0
+        self._candidate: str | None = None
+        self._agree = 0
+        self._events: list[LanguageEvent] = []
+
+    def apply(self, cfg: _C) -> _C:
+        """cfg with the locked language (cfg untouched while still detecting)."""
+        return replace(cfg, language=self.language) if self.language else cfg
+
+    def observe(self, result: TranscriptResult, audio_sec: float, confident: bool = True) -> LanguageEvent | None:
+        if self.language is None:
+            if not result.language or result.language_probability < STT_LANG_LOCK_PROB:
+                self._candidate, self._agree = None, 0
+                return None
+            self._agree = self._agree + 1 if result.language == self._candidate else 1
+            self._candidate = result.language
+            if audio_sec < STT_LANG_LOCK_SEC and self._agree < STT_LANG_LOCK_AGREE:
+                return None
+            self.language, self.probability, self._low = result.language, result.language_probability, 0
+            return self._emit(LanguageEvent(self.language, round(self.probability, 3), True))
+
+        if not confident:
+            return None  # avg_logprob/no_speech_prob are placeholders for this engine
+        speech = [s for s in result.segments if s.no_speech_prob < 0.5 and s.text.strip()]
+        if not speech:
+            return None  # silence says nothing about the language
+        mean_logprob = sum(s.avg_logprob for s in speech) / len(speech)
+        self._low = self._low + 1 if mean_logprob < STT_LANG_RELOCK_LOGPROB else 0
+        if self._low < STT_LANG_RELOCK_AFTER:
+            return None
+        self.language, self.probability, self._low = None, 0.0, 0
+        self._candidate, self._agree = None, 0
+        return self._emit(LanguageEvent(None, 0.0, False))
+
+    def pop_events(self) -> list[LanguageEvent]:
+        events, self._events = self._events, []
+        return events
+
+    def _emit(self, event: LanguageEvent) -> LanguageEvent:
+        self._events.append(event)
+        return event
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import os
+import time
+
+import numpy as np
+
+PRE_INPUT_GAIN = float(os.getenv("STT_INPUT_GAIN", "1.6"))     # linear gain ceiling for quiet mic
+PRE_TARGET_PEAK = 28000.0                                        # clamp target to avoid clipping
+PRE_TARGET_RMS = float(os.getenv("STT_TARGET_RMS", "3000"))     # used by gain mode "rms"
+PRE_GAIN_MODE = (os.getenv("STT_GAIN_MODE") or "peak").strip().lower()
+PRE_HIGHPASS_HZ = float(os.getenv("STT_HIGHPASS_HZ", "80"))     # 0 disables the high-pass stage
+
+
+class DCRemove:
+    """Subtract a running estimate of the DC offset (cheap per-chunk mean tracking)."""
+    name = "dc"
+
+    def __init__(self, smoothing: float = 0.9):
+        self.smoothing = smoothing
+        self._dc: float | None = None
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        m = float(x.mean())
+        self._dc = m if self._dc is None else self.smoothing * self._dc + (1.0 - self.smoothing) * m
+        x -= self._dc
+        return x
+
+
+class HighPass:
+    """
+    Linear-phase FIR high-pass: x minus a centered moving average (boxcar low-pass).
+    Computed with one cumsum per chunk; the last N-1 input samples are carried over,
+    so chunk boundaries are seamless (fixed delay of (N-1)/2 samples).
+    """
+    name = "highpass"
+
+    def __init__(self, cutoff_hz: float, sample_rate: int = 16000):
+        n = max(3, int(sample_rate / max(1.0, cutoff_hz)))
+        self.taps = n | 1  # odd => integer delay
+        self._tail = np.zeros(self.taps - 1, dtype=np.float32)
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        ext = np.concatenate((self._tail, x))
+        c = np.concatenate(([0.0], np.cumsum(ext, dtype=np.float64)))
+        ma = (c[self.taps :] - c[: -self.taps]) / self.taps   # window ending at each x sample
+        delay = (self.taps - 1) // 2
+        center = ext[self.taps - 1 - delay : ext.size - delay]
+        self._tail = ext[-(self.taps - 1):].copy()
+        return (center - ma).astype(np.float32)
+
+
+class AutoGain:
+    """
+    Boost quiet input up to max_gain. mode="peak" targets target_peak; mode="rms" targets
+    target_rms but is still capped so the peak stays under target_peak. Never attenuates.
+    """
+    name = "gain"
+
+    def __init__(
+        self,
+        max_gain: float = PRE_INPUT_GAIN,
+        mode: str = PRE_GAIN_MODE,
+        target_peak: float = PRE_TARGET_PEAK,
+        target_rms: float = PRE_TARGET_RMS,
+    ):
+        self.max_gain = max(1.0, float(max_gain))
+        self.mode = mode
+        self.target_peak = target_peak
+        self.target_rms = target_rms
+        self.last_gain = 1.0
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        peak = float(np.max(np.abs(x))) or 1.0
+        gain = min(self.max_gain, self.target_peak / peak)
+        if self.mode == "rms":
+            rms = float(np.sqrt(np.mean(x * x))) or 1.0
+            gain = min(gain, self.target_rms / rms)
+        self.last_gain = gain
+        if gain <= 1.02:  # skip tiny changes to save CPU
+            return x
+        x *= gain
+        return x
+
+
+class AudioPreprocessor:
+    """
+    Composable PCM16 preprocessing chain run vectorized over each chunk:
+    int16 -> float32 once, every stage in place on the array, saturating int16 at the end.
+    Per-stage wall time is accumulated in `timings` (seconds) for profiling.
+    """
+
+    def __init__(self, stages: list | None = None):
+        self.stages = list(stages or [])
+        self.timings: dict[str, float] = {s.name: 0.0 for s in self.stages}
+        self.timings["int16"] = 0.0
+        self.calls = 0
+
+    def process(self, pcm16) -> np.ndarray:
+        if isinstance(pcm16, np.ndarray):
+            samples = pcm16.astype(np.int16, copy=False).reshape(-1)
+        else:
+            mv = memoryview(pcm16).cast("B")
+            samples = np.frombuffer(mv[: len(mv) & ~1], dtype=np.int16)
+        if samples.size == 0 or not self.stages:
+            return samples
+
+        self.calls += 1
+        x = samples.astype(np.float32)
+        for stage in self.stages:
+            t0 = time.perf_counter()
+            x = stage(x)
+            self.timings[stage.name] += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        np.rint(x, out=x)
+        np.clip(x, -32768.0, 32767.0, out=x)
+        out = x.astype(np.int16)
+        self.timings["int16"] += time.perf_counter() - t0
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "stages_ms": {k: round(v * 1000.0, 3) for k, v in self.timings.items()},
+        }
+
+
+def make_preprocessor(
+    sample_rate: int = 16000,
+    input_gain: float | None = None,
+    highpass_hz: float = PRE_HIGHPASS_HZ,
+) -> AudioPreprocessor:
+    """
+    Default mic chain shared by virecord and viassistant: DC removal -> high-pass -> auto-gain.
+    """
+    stages: list = [DCRemove()]
+    if highpass_hz > 0:
+        stages.append(HighPass(highpass_hz, sample_rate))
+    stages.append(AutoGain(max_gain=input_gain or PRE_INPUT_GAIN))
+    return AudioPreprocessor(stages)
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from . import hardware
+from .config import WhisperConfig
+from .whisper_gpu import TranscriptResult, transcribe_pcm_batch, transcribe_pcm_segments
+
+logger = logging.getLogger("stt_engine.procpool")
+
+STT_BACKEND = (os.getenv("STT_BACKEND") or "thread").strip().lower()   # thread | process
+STT_PROCESS_WORKERS = int(os.getenv("STT_PROCESS_WORKERS", "0"))       # 0 = one per 4 cores
+
+
+def _default_workers() -> int:
+    return STT_PROCESS_WORKERS if STT_PROCESS_WORKERS > 0 else max(1, hardware.cpu_cores() // 4)
+
+
+def _run_in_worker(
+    shm_name: str,
+    spans: list[tuple[int, int]],
+    cfg: WhisperConfig,
+    word_timestamps: bool,
+) -> list[TranscriptResult]:
+    """
+    Runs inside a worker process: attach to the parent's segment, decode straight from it.
+    Each worker keeps its own whisper_gpu.registry, i.e. its own loaded models.
+    """
+    shm = SharedMemory(name=shm_name)
+    try:
+        flat = np.ndarray((spans[-1][1],), dtype=np.float32, buffer=shm.buf)
+        audios = [flat[a:b] for a, b in spans]
+        if len(audios) == 1:
+            results = [transcribe_pcm_segments(audios[0], cfg, word_timestamps)]
+        else:
+            results = transcribe_pcm_batch(audios, cfg, word_timestamps)
+        del audios, flat
+        return results
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            pass  # a view is still referenced (e.g. by a traceback); freed with the process
+
+
+class ProcessSTTPool:
+    """
+    Optional STT backend (STT_BACKEND=process): decodes run in spawned worker processes,
+    so CPU decoding no longer competes with the ASGI event loop for the GIL.
+    Audio is handed over in one float32 shared-memory segment per call (no pickled PCM);
+    only the small span list, the config and the TranscriptResults cross the pipe.
+    """
+
+    def __init__(self, workers: int | None = None):
+        self.workers = max(1, workers or _default_workers())
+        self._ctx = mp.get_context("spawn")  # fork is unsafe with the scheduler threads running
+        self._lock = threading.Lock()
+        self._pool: ProcessPoolExecutor | None = None
+        self._calls = 0
+        self._failures = 0
+        self._restarts = 0
+        # cpu_threads resolved in this process are per worker, not for the whole box
+        hardware.set_cpu_share(self.workers)
+
+    def run(self, audios: list[np.ndarray], cfg: WhisperConfig, word_timestamps: bool = False) -> list[TranscriptResult]:
+        """Blocking; call from a scheduler worker thread. audios are float32 arrays."""
+        total = sum(a.size for a in audios)
+        if total == 0:
+            return [TranscriptResult(text="") for _ in audios]
+
+        shm = SharedMemory(create=True, size=total * 4)
+        try:
+            flat = np.ndarray((total,), dtype=np.float32, buffer=shm.buf)
+            spans: list[tuple[int, int]] = []
+            pos = 0
+            for a in audios:
+                flat[pos : pos + a.size] = a
+                spans.append((pos, pos + a.size))
+                pos += a.size
+            del flat
+
+            with self._lock:
+                self._calls += 1
+            fut = self._executor().submit(_run_in_worker, shm.name, spans, cfg, word_timestamps)
+            try:
+                return fut.result()
+            except BrokenProcessPool:
+                self._reset()
+                raise
+            except Exception:
+                with self._lock:
+                    self._failures += 1
+                raise
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "calls": self._calls,
+                "failures": self._failures,
+                "restarts": self._restarts,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._ctx)
+                logger.warning("[procpool] started %d STT worker processes", self.workers)
+            return self._pool
+
+    def _reset(self):
+        logger.warning("[procpool] worker process died; restarting pool")
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._failures += 1
+            self._restarts += 1
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: ProcessSTTPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessSTTPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessSTTPool()
+        return _pool
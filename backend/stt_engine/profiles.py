@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import replace
+from functools import lru_cache
+from pathlib import Path
+from typing import TypeVar
+
+logger = logging.getLogger("stt_engine.profiles")
+
+# written by `python -m stt_engine.autotune`; a missing file keeps the hand-picked defaults
+STT_PROFILES = os.getenv("STT_PROFILES") or str(Path(__file__).resolve().parent.parent / "stt_profiles.json")
+
+USE_CASES = ("virecord_live", "viassistant_command", "final_pass")
+# tuned fields; language, bias and thread counts stay per call / per machine
+PROFILE_FIELDS = ("engine", "model_size", "device", "compute_type", "beam_size", "vad_filter")
+
+_C = TypeVar("_C")
+
+
+@lru_cache(maxsize=1)
+def load_profiles(path: str = STT_PROFILES) -> dict[str, dict]:
+    """use case -> tuned config fields; read once per process."""
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("[stt-profiles] ignoring %s: %s", path, e)
+        return {}
+    profiles = {}
+    for use_case, entry in (data.get("profiles") or {}).items():
+        cfg = (entry or {}).get("config") or {}
+        profiles[use_case] = {k: cfg[k] for k in PROFILE_FIELDS if k in cfg}
+    if profiles:
+        logger.warning("[stt-profiles] loaded %s from %s", ", ".join(sorted(profiles)), path)
+    return profiles
+
+
+def profile_overrides(use_case: str) -> dict:
+    """Config fields tuned for use_case (empty when untuned); splat into WhisperConfig/STTConfig."""
+    return dict(load_profiles().get(use_case) or {})
+
+
+def apply_profile(cfg: _C, use_case: str) -> _C:
+    overrides = profile_overrides(use_case)
+    return replace(cfg, **overrides) if overrides else cfg
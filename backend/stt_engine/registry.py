@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+from .config import WhisperConfig
+
+logger = logging.getLogger("stt_engine.registry")
+
+STT_MODEL_BUDGET_MB = float(os.getenv("STT_MODEL_BUDGET_MB", "6000"))   # 0 = unlimited
+STT_MODEL_IDLE_TTL_SEC = float(os.getenv("STT_MODEL_IDLE_TTL_SEC", "900"))  # 0 = never unload idle
+
+# Approximate resident size (MB) of CTranslate2 whisper weights in float16.
+_FP16_SIZE_MB = {
+    "tiny": 80,
+    "base": 150,
+    "small": 500,
+    "medium": 1550,
+    "large-v1": 3100,
+    "large-v2": 3100,
+    "large-v3": 3100,
+    "large": 3100,
+    "large-v3-turbo": 1650,
+    "turbo": 1650,
+    "distil-large-v3": 1550,
+}
+_DTYPE_FACTOR = {"float32": 2.0, "int8": 0.5, "int8_float16": 0.5, "int8_bfloat16": 0.5, "int8_float32": 0.5}
+
+
+_QUANT_SUFFIX_RE = re.compile(r"(\.en)?(-q\d\w*)?$")  # whisper.cpp names: "small.en-q5_1"
+
+
+def model_key(cfg: WhisperConfig) -> tuple[str, str, str, str]:
+    return (cfg.engine, cfg.model_size, cfg.device, cfg.compute_type)
+
+
+def estimate_model_mb(cfg: WhisperConfig) -> float:
+    base = _FP16_SIZE_MB.get(_QUANT_SUFFIX_RE.sub("", cfg.model_size), 1550)
+    if "-q" in cfg.model_size:
+        return base * 0.4  # 4-5 bit ggml weights
+    return base * _DTYPE_FACTOR.get(cfg.compute_type, 1.0)
+
+
+@dataclass
+class _Entry:
+    model: object
+    size_mb: float
+    loaded_at: float
+    last_used: float
+    leases: int = 0
+
+
+class ModelRegistry:
+    """
+    Loaded whisper models, keyed by (engine, model_size, device, compute_type):
+    - memory budget in MB; least-recently-used idle models are evicted to make room
+    - models idle longer than idle_ttl are unloaded by a background reaper
+    - per-key load locks: a cold load of one model never blocks lookups of another
+    - lease() pins a model while a decode is running, so it is never evicted mid-use
+    Every load/evict is recorded in history().
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[WhisperConfig], object],
+        budget_mb: float = STT_MODEL_BUDGET_MB,
+        idle_ttl: float = STT_MODEL_IDLE_TTL_SEC,
+    ):
+        self._loader = loader
+        self.budget_mb = max(0.0, budget_mb)
+        self.idle_ttl = max(0.0, idle_ttl)
+        self._lock = threading.Lock()                  # guards _entries/_key_locks only (never held while loading)
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._key_locks: dict[tuple, threading.Lock] = {}
+        self._history: deque[dict] = deque(maxlen=200)
+        self._reaper: threading.Thread | None = None
+
+    # ---------------- public API ----------------
+    def get(self, cfg: WhisperConfig):
+        with self.lease(cfg) as model:
+            return model
+
+    @contextmanager
+    def lease(self, cfg: WhisperConfig) -> Iterator[object]:
+        key = model_key(cfg)
+        entry = self._acquire(key)
+        if entry is None:
+            entry = self._load(key, cfg)
+        try:
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.leases -= 1
+                entry.last_used = time.monotonic()
+
+    def evict_idle(self) -> int:
+        if self.idle_ttl <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if e.leases == 0 and now - e.last_used >= self.idle_ttl]
+            for k in stale:
+                self._evict_locked(k, "idle_ttl")
+        if stale:
+            gc.collect()
+        return len(stale)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            models = [
+                {
+                    "key": "/".join(k),
+                    "size_mb": round(e.size_mb, 1),
+                    "leases": e.leases,
+                    "idle_sec": round(now - e.last_used, 1),
+                }
+                for k, e in self._entries.items()
+            ]
+            used = sum(e.size_mb for e in self._entries.values())
+        return {"budget_mb": self.budget_mb, "used_mb": round(used, 1), "models": models}
+
+    def history(self) -> list[dict]:
+        with self._lock:
+            return list(self._history)
+
+    # ---------------- internals ----------------
+    def _acquire(self, key: tuple) -> _Entry | None:
+        with self._lock:
+            e = self._entries.get(key)
+            if e is None:
+                return None
+            e.leases += 1
+            e.last_used = time.monotonic()
+            self._entries.move_to_end(key)
+            return e
+
+    def _load(self, key: tuple, cfg: WhisperConfig) -> _Entry:
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # someone else may have finished loading while we waited
+            e = self._acquire(key)
+            if e is not None:
+                return e
+
+            size = estimate_model_mb(cfg)
+            self._make_room(size)
+            t0 = time.monotonic()
+            try:
+                model = self._loader(cfg)
+            except Exception as ex:
+                self._record("load_failed", key, size, error=str(ex))
+                raise
+            load_sec = time.monotonic() - t0
+
+            now = time.monotonic()
+            e = _Entry(model=model, size_mb=size, loaded_at=now, last_used=now, leases=1)
+            with self._lock:
+                self._entries[key] = e
+                self._record("load", key, size, load_sec=round(load_sec, 2))
+            logger.warning("[registry] loaded %s in %.2fs (~%.0f MB)", "/".join(key), load_sec, size)
+            self._start_reaper()
+            return e
+
+    def _make_room(self, size_mb: float):
+        if self.budget_mb <= 0:
+            return
+        evicted = False
+        with self._lock:
+            used = sum(e.size_mb for e in self._entries.values())
+            for k in list(self._entries.keys()):  # LRU first
+                if used + size_mb <= self.budget_mb:
+                    break
+                e = self._entries[k]
+                if e.leases:
+                    continue
+                used -= e.size_mb
+                self._evict_locked(k, "budget")
+                evicted = True
+            if used + size_mb > self.budget_mb:
+                logger.warning(
+                    "[registry] over budget: used=%.0f + new=%.0f > %.0f MB (models in use)",
+                    used, size_mb, self.budget_mb,
+                )
+        if evicted:
+            gc.collect()
+
+    def _evict_locked(self, key: tuple, reason: str):
+        e = self._entries.pop(key)
+        self._record("evict", key, e.size_mb, reason=reason)
+        logger.warning("[registry] evicted %s (%s)", "/".join(key), reason)
+
+    def _record(self, event: str, key: tuple, size_mb: float, **extra):
+        self._history.append({"ts": time.time(), "event": event, "key": "/".join(key), "size_mb": round(size_mb, 1), **extra})
+
+    def _start_reaper(self):
+        with self._lock:
+            if self.idle_ttl <= 0 or self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="stt-model-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        interval = min(60.0, max(1.0, self.idle_ttl / 2))
+        while True:
+            time.sleep(interval)
+            try:
+                self.evict_idle()
+            except Exception:
+                logger.exception("[registry] idle eviction failed")
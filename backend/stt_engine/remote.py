@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, fields
+from typing import Callable
+
+import numpy as np
+
+from .config import WhisperConfig
+from .whisper_gpu import TranscriptResult, TranscriptSegment, TranscriptWord
+
+logger = logging.getLogger("stt_engine.remote")
+
+# "unix:/run/viassistant/stt.sock" or "tcp:10.0.0.5:8765"; empty = decode in this process
+STT_SERVER = (os.getenv("STT_SERVER") or "").strip()
+STT_SERVER_TIMEOUT = float(os.getenv("STT_SERVER_TIMEOUT", "120"))
+STT_CLIENT_CONNECTIONS = int(os.getenv("STT_CLIENT_CONNECTIONS", "4"))
+# shared secret sent as the first frame of every connection; required by servers listening on tcp
+STT_SERVER_TOKEN = (os.getenv("STT_SERVER_TOKEN") or "").strip()
+
+MAX_HEADER_BYTES = 1 << 20
+MAX_PAYLOAD_BYTES = 64 << 20
+FRAME_LEN = struct.Struct(">I")
+
+
+# ---------------- wire format ----------------
+# frame = u32 header_len | JSON header | payload (header["nbytes"] bytes, may be 0)
+def parse_address(addr: str) -> tuple[int, str | tuple[str, int]]:
+    if addr.startswith("unix:"):
+        return socket.AF_UNIX, addr[len("unix:"):]
+    host, _, port = addr.removeprefix("tcp:").rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def send_frame(sock: socket.socket, header: dict, payload: bytes | memoryview = b""):
+    raw = json.dumps(dict(header, nbytes=len(payload)), ensure_ascii=False).encode("utf-8")
+    sock.sendall(FRAME_LEN.pack(len(raw)) + raw)
+    if len(payload):
+        sock.sendall(payload)  # memoryview: no join copy of the audio
+
+
+def encode_audio(audio) -> tuple[str, memoryview]:
+    """int16 stays int16 on the wire (half the bytes of float32); no copy for contiguous input."""
+    if isinstance(audio, np.ndarray):
+        if audio.dtype not in (np.int16, np.float32):
+            audio = audio.astype(np.float32)
+        arr = np.ascontiguousarray(audio.reshape(-1))
+        return ("s16le" if arr.dtype == np.int16 else "f32le"), memoryview(arr).cast("B")
+    mv = memoryview(audio).cast("B")
+    return "s16le", mv[: len(mv) & ~1]
+
+
+def decode_audio(encoding: str, payload: bytes) -> np.ndarray:
+    return np.frombuffer(payload, dtype=np.int16 if encoding == "s16le" else np.float32)
+
+
+def config_from_dict(d: dict) -> WhisperConfig:
+    known = {f.name for f in fields(WhisperConfig)}
+    return WhisperConfig(**{k: v for k, v in (d or {}).items() if k in known})
+
+
+def segment_from_dict(s: dict) -> TranscriptSegment:
+    return TranscriptSegment(**{**s, "words": [TranscriptWord(**w) for w in s.get("words") or []]})
+
+
+def result_from_dict(d: dict) -> TranscriptResult:
+    segs = [segment_from_dict(s) for s in d.get("segments") or []]
+    return TranscriptResult(**{**d, "segments": segs})
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if not k:
+            raise ConnectionError("stt server closed the connection")
+        got += k
+    return bytes(buf)
+
+
+def recv_frame(sock: socket.socket) -> tuple[dict, bytes]:
+    (hlen,) = FRAME_LEN.unpack(_recv_exact(sock, FRAME_LEN.size))
+    if hlen > MAX_HEADER_BYTES:
+        raise ConnectionError(f"stt frame header too large: {hlen}")
+    header = json.loads(_recv_exact(sock, hlen))
+    n = int(header.get("nbytes") or 0)
+    if n > MAX_PAYLOAD_BYTES:
+        raise ConnectionError(f"stt frame payload too large: {n}")
+    return header, (_recv_exact(sock, n) if n else b"")
+
+
+# ---------------- client ----------------
+class RemoteSTTClient:
+    """
+    Drop-in for STTScheduler (submit/transcribe/stats) that sends audio to a shared STT
+    server (python -m stt_engine.server), so web workers do not load their own models.
+    Blocking sockets, pooled per process; a broken connection is retried once on a fresh one.
+    """
+
+    def __init__(self, address: str = STT_SERVER, connections: int = STT_CLIENT_CONNECTIONS):
+        self.address = address
+        self._family, self._target = parse_address(address)
+        self._idle: queue.LifoQueue[socket.socket] = queue.LifoQueue()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, connections), thread_name_prefix="stt-remote")
+
+    # ---------------- scheduler-compatible API ----------------
+    def submit(
+        self,
+        audio,
+        cfg: WhisperConfig,
+        word_timestamps: bool = False,
+        on_segment: Callable[[TranscriptSegment], None] | None = None,
+        priority: str = "final_pass",
+        session: str | None = None,
+    ) -> Future:
+        return self._pool.submit(self.transcribe, audio, cfg, word_timestamps, on_segment, priority, session)
+
+    def transcribe(
+        self,
+        audio,
+        cfg: WhisperConfig,
+        word_timestamps: bool = False,
+        on_segment: Callable[[TranscriptSegment], None] | None = None,
+        priority: str = "final_pass",
+        session: str | None = None,
+    ) -> TranscriptResult:
+        """
+        With on_segment the server streams {"segment": ...} frames before the final result.
+        priority/session are applied by the server's scheduler (see scheduler.PRIORITY_CLASSES).
+        """
+        encoding, payload = encode_audio(audio)
+        header = {
+            "op": "transcribe",
+            "cfg": asdict(cfg),
+            "word_timestamps": word_timestamps,
+            "encoding": encoding,
+            "stream_segments": on_segment is not None,
+            "priority": priority,
+            "session": session,
+        }
+        def on_frame(reply: dict):
+            if on_segment is not None:
+                on_segment(segment_from_dict(reply["segment"]))
+
+        return result_from_dict(self._call(header, payload, on_frame)["result"])
+
+    def transcribe_file(self, data: bytes, cfg: WhisperConfig) -> TranscriptResult:
+        """Any container faster-whisper can decode (wav/mp3/...), decoded on the server."""
+        header = {"op": "transcribe", "cfg": asdict(cfg), "encoding": "file"}
+        return result_from_dict(self._call(header, data)["result"])
+
+    def stats(self) -> dict:
+        try:
+            return {"backend": "remote", "server": self.address, **self._call({"op": "stats"})["stats"]}
+        except Exception as e:
+            return {"backend": "remote", "server": self.address, "error": str(e)}
+
+    # ---------------- internals ----------------
+    def _call(self, header: dict, payload=b"", on_frame: Callable[[dict], None] | None = None) -> dict:
+        for attempt in (0, 1):
+            sock = self._checkout()
+            streamed = False
+            try:
+                send_frame(sock, header, payload)
+                reply, _ = recv_frame(sock)
+                while "segment" in reply:  # intermediate frames of a streamed decode
+                    streamed = True
+                    if on_frame is not None:
+                        on_frame(reply)
+                    reply, _ = recv_frame(sock)
+            except TimeoutError:
+                sock.close()  # the server is still decoding; do not send it twice
+                raise
+            except (OSError, ConnectionError) as e:
+                sock.close()
+                if attempt or streamed:
+                    raise ConnectionError(f"stt server {self.address} unreachable: {e}") from e
+                logger.warning("[stt-remote] connection lost (%s), reconnecting", e)
+                continue
+            self._idle.put(sock)
+            if reply.get("superseded"):
+                from .scheduler import STTSuperseded
+
+                raise STTSuperseded(header.get("session"))
+            if not reply.get("ok"):
+                raise RuntimeError(f"stt server error: {reply.get('error')}")
+            return reply
+        raise AssertionError("unreachable")
+
+    def _checkout(self) -> socket.socket:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        sock = socket.socket(self._family, socket.SOCK_STREAM)
+        sock.settimeout(STT_SERVER_TIMEOUT)
+        if self._family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.connect(self._target)
+        if STT_SERVER_TOKEN:
+            send_frame(sock, {"op": "hello", "token": STT_SERVER_TOKEN})
+            reply, _ = recv_frame(sock)
+            if not reply.get("ok"):
+                sock.close()
+                raise PermissionError(f"stt server {self.address} rejected the token: {reply.get('error')}")
+        return sock
+
+
+_client: RemoteSTTClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_remote_client() -> RemoteSTTClient | None:
+    """Shared client when STT_SERVER is set, else None (decode in-process)."""
+    global _client
+    if not STT_SERVER:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = RemoteSTTClient(STT_SERVER)
+        return _client
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+
+TARGET_RATE = 16000           # whisper / VAD input
+RESAMPLE_ZERO_CROSSINGS = 16  # filter half-length in zero crossings of the lower rate
+RESAMPLE_KAISER_BETA = 8.6    # ~80 dB stopband
+RESAMPLE_ROLLOFF = 0.94       # passband edge as a fraction of the output Nyquist
+RESAMPLE_BLOCK = 1 << 15      # input samples per vectorized step
+
+_ENCODINGS = {
+    "s16le": np.int16, "pcm16": np.int16, "int16": np.int16, "pcm_s16le": np.int16,
+    "f32le": np.float32, "float32": np.float32, "pcm_f32le": np.float32,
+}
+
+
+@dataclass(frozen=True)
+class InputFormat:
+    """What a client declares in its WS init/start message."""
+    sample_rate: int = TARGET_RATE
+    channels: int = 1
+    encoding: str = "s16le"  # s16le / f32le (aliases: pcm16, int16, float32)
+
+    @property
+    def dtype(self):
+        return _ENCODINGS[self.encoding]
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.channels * np.dtype(self.dtype).itemsize
+
+    def is_native(self) -> bool:
+        return self.sample_rate == TARGET_RATE and self.channels == 1 and self.dtype == np.int16
+
+
+def parse_input_format(msg: dict) -> InputFormat:
+    """
+    InputFormat from a client message ("sample_rate", "channels", "format"/"encoding");
+    missing fields mean 16 kHz mono PCM16. Raises ValueError on unsupported values.
+    """
+    rate = int(msg.get("sample_rate") or TARGET_RATE)
+    channels = int(msg.get("channels") or 1)
+    encoding = str(msg.get("format") or msg.get("encoding") or "s16le").strip().lower()
+    if encoding not in _ENCODINGS:
+        raise ValueError(f"unsupported audio format: {encoding}")
+    if not 8000 <= rate <= 192000:
+        raise ValueError(f"unsupported sample_rate: {rate}")
+    if not 1 <= channels <= 8:
+        raise ValueError(f"unsupported channels: {channels}")
+    return InputFormat(rate, channels, encoding)
+
+
+@lru_cache(maxsize=16)
+def _polyphase_filter(up: int, down: int) -> np.ndarray:
+    """
+    Kaiser-windowed sinc low-pass at the upsampled rate, split into `up` phases:
+    row p holds taps h[p], h[p + up], h[p + 2*up], ...
+    """
+    half = RESAMPLE_ZERO_CROSSINGS * max(up, down)
+    t = np.arange(-half, half + 1, dtype=np.float64)
+    cutoff = RESAMPLE_ROLLOFF * 0.5 / max(up, down)  # cycles per upsampled sample
+    h = 2.0 * cutoff * np.sinc(2.0 * cutoff * t) * np.kaiser(t.size, RESAMPLE_KAISER_BETA)
+    h *= up / h.sum()  # unity DC gain after zero-stuffing
+    taps = -(-h.size // up)
+    h = np.concatenate((h, np.zeros(taps * up - h.size)))
+    return h.reshape(taps, up).T.astype(np.float32)  # (up, taps)
+
+
+class Resampler:
+    """
+    Streaming rational resampler (polyphase FIR, up/down = dst/src reduced by gcd).
+    Only the output samples are computed (no zero-stuffed intermediate signal); the last
+    taps-1 input samples are carried over, so chunk boundaries are seamless.
+    """
+
+    def __init__(self, src_rate: int, dst_rate: int = TARGET_RATE):
+        g = gcd(int(src_rate), int(dst_rate))
+        self.up, self.down = dst_rate // g, src_rate // g
+        self.bank = _polyphase_filter(self.up, self.down)
+        self.taps = self.bank.shape[1]
+        self._hist = np.zeros(self.taps - 1, dtype=np.float32)
+        self._consumed = 0  # input samples seen so far (absolute index of the next input)
+        self._next = 0      # next output sample index
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        if x.size > RESAMPLE_BLOCK:  # bound the (outputs x taps) gather matrix
+            return np.concatenate([self(x[i : i + RESAMPLE_BLOCK]) for i in range(0, x.size, RESAMPLE_BLOCK)])
+        ext = np.concatenate((self._hist, x.astype(np.float32, copy=False)))
+        base = self._consumed - self._hist.size      # absolute index of ext[0]
+        end = self._consumed + x.size                # absolute index after the last input
+        # output n uses input k = n*down // up and the taps-1 samples before it
+        last = (end * self.up - 1) // self.down       # largest n with k < end
+        n = np.arange(self._next, last + 1, dtype=np.int64)
+        self._consumed = end
+        self._hist = ext[ext.size - (self.taps - 1):] if self.taps > 1 else ext[:0]
+        if n.size == 0:
+            return np.zeros(0, dtype=np.float32)
+        self._next = int(n[-1]) + 1
+        k = n * self.down // self.up - base
+        phase = (n * self.down) % self.up
+        idx = k[:, None] - np.arange(self.taps)[None, :]   # x[k - j] pairs with tap j
+        return np.einsum("ij,ij->i", ext[idx], self.bank[phase])
+
+
+class PCMConverter:
+    """
+    Client audio (any rate, 1-8 channels, PCM16 or float32, interleaved) -> 16 kHz mono PCM16.
+    Stateful across chunks: odd trailing bytes wait for the next chunk and the resampler keeps
+    its filter history. Native input (16 kHz mono PCM16) is passed through untouched.
+    """
+
+    def __init__(self, fmt: InputFormat):
+        self.fmt = fmt
+        self._rest = b""
+        self._resampler = Resampler(fmt.sample_rate) if fmt.sample_rate != TARGET_RATE else None
+
+    def __call__(self, data: bytes) -> bytes:
+        if self.fmt.is_native():
+            return bytes(data)
+        buf = self._rest + bytes(data)
+        usable = len(buf) - len(buf) % self.fmt.frame_bytes
+        self._rest = buf[usable:]
+        if not usable:
+            return b""
+        x = np.frombuffer(buf[:usable], dtype=self.fmt.dtype).astype(np.float32)
+        if self.fmt.dtype == np.float32:
+            x *= 32767.0
+        if self.fmt.channels > 1:
+            x = x.reshape(-1, self.fmt.channels).mean(axis=1)
+        if self._resampler is not None:
+            x = self._resampler(x)
+        return np.clip(np.rint(x), -32768, 32767).astype(np.int16).tobytes()
+
+
+def to_pcm16_mono(data: bytes, fmt: InputFormat) -> bytes:
+    """One-shot conversion of a whole buffer (see PCMConverter)."""
+    return PCMConverter(fmt)(data)
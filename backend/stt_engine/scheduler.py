@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable
+
+import numpy as np
+
+from .config import WhisperConfig
+from .engines import get_engine
+from .hardware import resolve_config
+from .procpool import STT_BACKEND, get_process_pool
+from .whisper_gpu import (
+    SAMPLE_RATE,
+    TranscriptResult,
+    TranscriptSegment,
+    pcm_to_float32,
+    transcribe_pcm_batch,
+    transcribe_pcm_segments,
+)
+
+logger = logging.getLogger("stt_engine.scheduler")
+
+STT_BATCH_WINDOW_MS = float(os.getenv("STT_BATCH_WINDOW_MS", "30"))  # how long to gather a batch
+STT_MAX_BATCH = int(os.getenv("STT_MAX_BATCH", "8"))
+STT_SCHEDULER_WORKERS = int(os.getenv("STT_SCHEDULER_WORKERS", "2"))  # batches of different models in parallel
+STT_BATCH_MAX_SEC = 30.0  # one whisper window; longer requests are decoded on their own
+STT_PRIORITY_AGING_SEC = float(os.getenv("STT_PRIORITY_AGING_SEC", "2.0"))  # waiting this long = one class up
+
+# admission classes, most urgent first
+INTERACTIVE_COMMAND = "interactive_command"  # viassistant voice turns
+FINAL_PASS = "final_pass"                    # utterance/segment closing decodes
+LIVE_DRAFT = "live_draft"                    # virecord re-decodes, superseded per session
+PRIORITY_CLASSES = (INTERACTIVE_COMMAND, FINAL_PASS, LIVE_DRAFT)
+
+
+class STTSuperseded(Exception):
+    """A queued live draft was replaced by a newer draft of the same session."""
+
+
+@dataclass
+class STTRequest:
+    audio: np.ndarray
+    cfg: WhisperConfig
+    word_timestamps: bool = False
+    on_segment: Callable[[TranscriptSegment], None] | None = None  # streamed, never batched
+    priority: str = FINAL_PASS
+    session: str | None = None
+    future: Future = field(default_factory=Future)
+    enqueued: float = field(default_factory=time.monotonic)
+
+    def rank(self, now: float) -> float:
+        """Lower runs first; every STT_PRIORITY_AGING_SEC of waiting lifts a request one class."""
+        base = PRIORITY_CLASSES.index(self.priority)
+        if STT_PRIORITY_AGING_SEC <= 0:
+            return base
+        return base - (now - self.enqueued) / STT_PRIORITY_AGING_SEC
+
+    def model_key(self) -> str:
+        return f"{self.cfg.engine}/{self.cfg.model_size}/{self.cfg.device}/{self.cfg.compute_type}"
+
+    def batch_key(self) -> tuple | None:
+        """Requests with equal keys can share one batched forward pass; None = decode alone."""
+        if self.cfg.language is None or self.cfg.vad_filter:
+            return None  # needs per-request language detection / VAD
+        if not get_engine(self.cfg.engine).capabilities.batched:
+            return None
+        if self.on_segment is not None:
+            return None  # batched decodes only return whole results
+        if self.audio.size > STT_BATCH_MAX_SEC * SAMPLE_RATE:
+            return None
+        return (
+            self.model_key(), self.cfg.language, int(self.cfg.beam_size or 1), self.word_timestamps,
+            self.cfg.initial_prompt, self.cfg.hotwords,
+        )
+
+
+class STTScheduler:
+    """
+    Central STT admission point shared by every consumer in the process.
+    Requests are collected for a short window (STT_BATCH_WINDOW_MS); whenever a decode
+    worker is free, the most urgent request (priority class, aged by waiting time) is
+    dispatched together with every pending request that can share its batch.
+    A new live draft supersedes the queued draft of the same session.
+    With STT_BACKEND=process the batches run in worker processes (procpool.py).
+    """
+
+    def __init__(
+        self,
+        window_ms: float = STT_BATCH_WINDOW_MS,
+        max_batch: int = STT_MAX_BATCH,
+        workers: int = STT_SCHEDULER_WORKERS,
+        backend: str = STT_BACKEND,
+    ):
+        self.backend = "process" if backend == "process" else "thread"
+        self._procs = get_process_pool() if self.backend == "process" else None
+        if self._procs is not None:
+            workers = max(workers, self._procs.workers)  # keep every worker process busy
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.workers = max(1, workers)
+        self._cv = threading.Condition()
+        self._pending: list[STTRequest] = []
+        self._free = threading.Semaphore(self.workers)  # decode slots; held from dispatch to completion
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stt-batch")
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: dict[str, Counter] = {}
+        self._waits: dict[str, deque[float]] = {c: deque(maxlen=500) for c in PRIORITY_CLASSES}
+        self._class_counts: dict[str, Counter] = {c: Counter() for c in PRIORITY_CLASSES}
+        self._in_flight = 0
+        self._thread = threading.Thread(target=self._collect_loop, name="stt-scheduler", daemon=True)
+        self._thread.start()
+
+    # ---------------- public API ----------------
+    def submit(
+        self,
+        audio,
+        cfg: WhisperConfig,
+        word_timestamps: bool = False,
+        on_segment: Callable[[TranscriptSegment], None] | None = None,
+        priority: str = FINAL_PASS,
+        session: str | None = None,
+    ) -> Future:
+        """
+        on_segment (called from a decode thread) gets each segment as soon as it is decoded.
+        priority is one of PRIORITY_CLASSES; a LIVE_DRAFT with a session replaces that
+        session's still-queued draft (its future fails with STTSuperseded) and takes over
+        its queue position, so redrafting never pushes a session to the back.
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"unknown STT priority class: {priority}")
+        # resolve "auto" up front so equivalent requests share a batch key
+        req = STTRequest(
+            audio=pcm_to_float32(audio),
+            cfg=resolve_config(cfg),
+            word_timestamps=word_timestamps,
+            on_segment=on_segment,
+            priority=priority,
+            session=session,
+        )
+        superseded: list[STTRequest] = []
+        with self._cv:
+            if priority == LIVE_DRAFT and session is not None:
+                superseded = [r for r in self._pending if r.priority == LIVE_DRAFT and r.session == session]
+                if superseded:
+                    dropped = set(map(id, superseded))  # by identity: dataclass eq would compare audio arrays
+                    self._pending = [r for r in self._pending if id(r) not in dropped]
+                    req.enqueued = min(r.enqueued for r in superseded)
+            self._pending.append(req)
+            self._cv.notify()
+        with self._stats_lock:
+            self._class_counts[priority]["submitted"] += 1
+            self._class_counts[priority]["superseded"] += len(superseded)
+        for r in superseded:
+            if r.future.set_running_or_notify_cancel():
+                r.future.set_exception(STTSuperseded(session))
+        return req.future
+
+    def transcribe(
+        self,
+        audio,
+        cfg: WhisperConfig,
+        word_timestamps: bool = False,
+        on_segment: Callable[[TranscriptSegment], None] | None = None,
+        priority: str = FINAL_PASS,
+        session: str | None = None,
+    ) -> TranscriptResult:
+        """Blocking helper for code already running in a worker thread."""
+        return self.submit(audio, cfg, word_timestamps, on_segment, priority, session).result()
+
+    def stats(self) -> dict:
+        with self._cv:
+            depth = len(self._pending)
+            depth_by_class = Counter(r.priority for r in self._pending)
+        with self._stats_lock:
+            per_model = {}
+            for key, hist in self._batch_sizes.items():
+                batches = sum(hist.values())
+                requests = sum(size * n for size, n in hist.items())
+                per_model[key] = {
+                    "batches": batches,
+                    "requests": requests,
+                    "avg_batch_size": round(requests / batches, 2) if batches else 0.0,
+                    "max_batch_size": max(hist) if hist else 0,
+                    "batch_size_hist": dict(sorted(hist.items())),
+                }
+            classes = {}
+            for cls in PRIORITY_CLASSES:
+                waits = np.asarray(self._waits[cls], dtype=np.float64) * 1000.0
+                classes[cls] = {
+                    "queued": depth_by_class.get(cls, 0),
+                    "submitted": self._class_counts[cls]["submitted"],
+                    "superseded": self._class_counts[cls]["superseded"],
+                    "wait_p50_ms": round(float(np.percentile(waits, 50)), 1) if waits.size else 0.0,
+                    "wait_p95_ms": round(float(np.percentile(waits, 95)), 1) if waits.size else 0.0,
+                    "wait_max_ms": round(float(waits.max()), 1) if waits.size else 0.0,
+                }
+            in_flight = self._in_flight
+        out = {
+            "backend": self.backend,
+            "queue_depth": depth,
+            "in_flight": in_flight,
+            "classes": classes,
+            "per_model": per_model,
+        }
+        if self._procs is not None:
+            out["processes"] = self._procs.stats()
+        return out
+
+    # ---------------- internals ----------------
+    def _collect_loop(self):
+        while True:
+            with self._cv:
+                while not self._pending:
+                    self._cv.wait()
+                # give concurrent sessions a short window (from the oldest arrival) to join this batch
+                deadline = min(r.enqueued for r in self._pending) + self.window
+                while len(self._pending) < self.max_batch:
+                    remain = deadline - time.monotonic()
+                    if remain <= 0:
+                        break
+                    self._cv.wait(remain)
+
+            # pick only once a decode slot is free, so urgent requests that arrive
+            # while every worker is busy still overtake queued drafts
+            self._free.acquire()
+            with self._cv:
+                group = self._pick()
+            if not group:
+                self._free.release()
+                continue
+            with self._stats_lock:
+                self._in_flight += len(group)
+            self._pool.submit(self._run_group, group)
+
+    def _pick(self) -> list[STTRequest]:
+        now = time.monotonic()
+        # drop requests whose caller cancelled them
+        self._pending = [r for r in self._pending if not r.future.cancelled()]
+        if not self._pending:
+            return []
+        ordered = sorted(self._pending, key=lambda r: (r.rank(now), r.enqueued))
+        head = ordered[0]
+        key = head.batch_key()
+        if key is None:
+            group = [head]
+        else:
+            group = [r for r in ordered if r.batch_key() == key][: self.max_batch]
+        taken = set(map(id, group))
+        self._pending = [r for r in self._pending if id(r) not in taken]
+
+        started = [r for r in group if r.future.set_running_or_notify_cancel()]
+        with self._stats_lock:
+            for r in started:
+                self._waits[r.priority].append(now - r.enqueued)
+        return started
+
+    def _run_group(self, group: list[STTRequest]):
+        head = group[0]
+        t0 = time.monotonic()
+        try:
+            if head.on_segment is not None:
+                # streamed in this process (segments cannot cross the worker-process pool)
+                results = [transcribe_pcm_segments(head.audio, head.cfg, head.word_timestamps, head.on_segment)]
+            elif self._procs is not None:
+                results = self._procs.run([r.audio for r in group], head.cfg, head.word_timestamps)
+            elif len(group) == 1:
+                results = [transcribe_pcm_segments(head.audio, head.cfg, head.word_timestamps)]
+            else:
+                results = transcribe_pcm_batch([r.audio for r in group], head.cfg, head.word_timestamps)
+        except Exception as e:
+            logger.exception("[stt] batch failed model=%s size=%d", head.model_key(), len(group))
+            for r in group:
+                r.future.set_exception(e)
+            return
+        finally:
+            self._free.release()
+            with self._stats_lock:
+                self._in_flight -= len(group)
+                self._batch_sizes.setdefault(head.model_key(), Counter())[len(group)] += 1
+
+        for r, res in zip(group, results):
+            r.future.set_result(res)
+        logger.debug(
+            "[stt] batch model=%s size=%d class=%s wait=%.3fs decode=%.3fs",
+            head.model_key(),
+            len(group),
+            head.priority,
+            t0 - min(r.enqueued for r in group),
+            time.monotonic() - t0,
+        )
+
+
+_scheduler: STTScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+async def aiter_segments(
+    audio,
+    cfg: WhisperConfig,
+    word_timestamps: bool = False,
+    priority: str = FINAL_PASS,
+) -> AsyncIterator[TranscriptSegment]:
+    """
+    Async iterator over segments as they are decoded, through the shared scheduler
+    (or the STT server). The decode runs in a worker thread; the event loop is never blocked.
+    """
+    q: asyncio.Queue[TranscriptSegment | None] = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+
+    def on_segment(seg: TranscriptSegment):
+        loop.call_soon_threadsafe(q.put_nowait, seg)
+
+    fut = asyncio.wrap_future(get_scheduler().submit(audio, cfg, word_timestamps, on_segment, priority))
+    # completion is delivered via call_soon_threadsafe too, i.e. after every queued segment
+    fut.add_done_callback(lambda _f: q.put_nowait(None))
+    while True:
+        seg = await q.get()
+        if seg is None:
+            break
+        yield seg
+    await fut  # re-raise decode errors
+
+
+def get_local_scheduler() -> STTScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = STTScheduler()
+        return _scheduler
+
+
+def get_scheduler():
+    """
+    STT entry point for consumers: the shared STT server's client when STT_SERVER is set
+    (models live in that process), else this process's scheduler.
+    """
+    from .remote import get_remote_client
+
+    return get_remote_client() or get_local_scheduler()
@@ -0,0 +1,193 @@
+"""
+Shared STT service: owns the models (registry) and the batch scheduler for every web worker.
+
+    python -m stt_engine.server --listen unix:/run/viassistant/stt.sock
+    STT_SERVER_TOKEN=<secret> python -m stt_engine.server --listen tcp:0.0.0.0:8765
+
+Web workers started with STT_SERVER=<same address> (and the same STT_SERVER_TOKEN) send audio
+here instead of loading models. A non-loopback tcp listener requires the token. Clients pick
+language, bias, beam and profile fields, but only models from the allow-list are loaded.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hmac
+import io
+import json
+import logging
+import os
+from dataclasses import asdict, replace
+
+from . import hardware
+from .remote import (
+    FRAME_LEN,
+    MAX_HEADER_BYTES,
+    MAX_PAYLOAD_BYTES,
+    STT_SERVER_TOKEN,
+    config_from_dict,
+    decode_audio,
+    parse_address,
+)
+from .config import WhisperConfig
+from .engines import get_engine
+from .profiles import load_profiles
+from .registry import _FP16_SIZE_MB, _QUANT_SUFFIX_RE
+from .scheduler import FINAL_PASS, STTSuperseded, get_local_scheduler
+from .whisper_gpu import registry, transcribe_wav_segments
+
+logger = logging.getLogger("stt_engine.server")
+
+STT_SERVER_LISTEN = (os.getenv("STT_SERVER_LISTEN") or "unix:/tmp/viassistant-stt.sock").strip()
+# extra model names clients may request, comma-separated ("large-v3" or "whisper.cpp/small-q5_1");
+# the stock whisper sizes and the models in this server's stt_profiles.json are always allowed
+STT_SERVER_MODELS = {m.strip() for m in (os.getenv("STT_SERVER_MODELS") or "").split(",") if m.strip()}
+
+
+def _model_allowed(cfg: WhisperConfig) -> bool:
+    if _QUANT_SUFFIX_RE.sub("", cfg.model_size) in _FP16_SIZE_MB:
+        return True  # stock name, no repo id or path
+    if cfg.model_size in STT_SERVER_MODELS or f"{cfg.engine}/{cfg.model_size}" in STT_SERVER_MODELS:
+        return True
+    return any(p.get("model_size") == cfg.model_size for p in load_profiles().values())
+
+
+def _admit_config(d: dict) -> WhisperConfig:
+    """Client config limited to what the server allows; thread counts stay the server's."""
+    cfg = replace(config_from_dict(d), cpu_threads=0, num_workers=0)
+    get_engine(cfg.engine)  # ValueError on unknown engines
+    if not _model_allowed(cfg):
+        raise PermissionError(f"model not allowed on this server: {cfg.engine}/{cfg.model_size}")
+    return cfg
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> tuple[dict, bytes]:
+    (hlen,) = FRAME_LEN.unpack(await reader.readexactly(FRAME_LEN.size))
+    if hlen > MAX_HEADER_BYTES:
+        raise ValueError(f"header too large: {hlen}")
+    header = json.loads(await reader.readexactly(hlen))
+    n = int(header.get("nbytes") or 0)
+    if n > MAX_PAYLOAD_BYTES:
+        raise ValueError(f"payload too large: {n}")
+    return header, (await reader.readexactly(n) if n else b"")
+
+
+async def _write_frame(writer: asyncio.StreamWriter, header: dict):
+    raw = json.dumps(dict(header, nbytes=0), ensure_ascii=False).encode("utf-8")
+    writer.write(FRAME_LEN.pack(len(raw)) + raw)
+    await writer.drain()
+
+
+async def _handle_request(header: dict, payload: bytes, send) -> dict:
+    op = header.get("op")
+    if op == "stats":
+        return {
+            "ok": True,
+            "stats": {
+                "scheduler": get_local_scheduler().stats(),
+                "models": registry.stats(),
+                "hardware": hardware.describe(),
+            },
+        }
+    if op == "hello":
+        return {"ok": True}  # token already checked (or none configured)
+    if op != "transcribe":
+        return {"ok": False, "error": f"unknown op: {op}"}
+
+    try:
+        cfg = _admit_config(header.get("cfg") or {})
+    except (PermissionError, ValueError) as e:
+        logger.warning("[stt-server] rejected config: %s", e)
+        return {"ok": False, "error": str(e)}
+    if header.get("encoding") == "file":
+        result = await asyncio.to_thread(transcribe_wav_segments, io.BytesIO(payload), cfg)
+    else:
+        audio = decode_audio(header.get("encoding") or "s16le", payload)
+        word_timestamps = bool(header.get("word_timestamps"))
+        admission = {"priority": header.get("priority") or FINAL_PASS, "session": header.get("session")}
+        try:
+            if header.get("stream_segments"):
+                result = await _stream_segments(audio, cfg, word_timestamps, admission, send)
+            else:
+                fut = get_local_scheduler().submit(audio, cfg, word_timestamps, **admission)
+                result = await asyncio.wrap_future(fut)
+        except STTSuperseded:
+            return {"ok": False, "superseded": True, "error": "superseded"}
+    return {"ok": True, "result": asdict(result)}
+
+
+async def _stream_segments(audio, cfg, word_timestamps: bool, admission: dict, send):
+    """Forward each decoded segment as its own frame, then return the full result."""
+    q: asyncio.Queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+    fut = asyncio.wrap_future(get_local_scheduler().submit(
+        audio, cfg, word_timestamps, lambda seg: loop.call_soon_threadsafe(q.put_nowait, seg), **admission,
+    ))
+    fut.add_done_callback(lambda _f: q.put_nowait(None))
+    while (seg := await q.get()) is not None:
+        await send({"ok": True, "segment": asdict(seg)})
+    return await fut
+
+
+def _token_ok(header: dict) -> bool:
+    token = str(header.get("token") or "")
+    return header.get("op") == "hello" and hmac.compare_digest(token.encode(), STT_SERVER_TOKEN.encode())
+
+
+async def _serve_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    peer = writer.get_extra_info("peername") or "unix"
+    try:
+        if STT_SERVER_TOKEN:
+            # the first frame must carry the shared secret, before any payload is decoded
+            header, _ = await _read_frame(reader)
+            if not _token_ok(header):
+                logger.warning("[stt-server] unauthorized peer=%s", peer)
+                await _write_frame(writer, {"ok": False, "error": "unauthorized"})
+                return
+            await _write_frame(writer, {"ok": True})
+        while True:
+            try:
+                header, payload = await _read_frame(reader)
+            except asyncio.IncompleteReadError:
+                return  # client closed
+            try:
+                reply = await _handle_request(header, payload, lambda h: _write_frame(writer, h))
+            except Exception as e:
+                logger.exception("[stt-server] request failed peer=%s", peer)
+                reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            await _write_frame(writer, reply)
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError) as e:
+        logger.warning("[stt-server] dropping peer=%s: %s", peer, e)
+    finally:
+        writer.close()
+
+
+async def serve(listen: str = STT_SERVER_LISTEN):
+    family, target = parse_address(listen)
+    if isinstance(target, str):
+        if os.path.exists(target):
+            os.unlink(target)  # stale socket from a previous run
+        server = await asyncio.start_unix_server(_serve_connection, path=target)
+    else:
+        if not STT_SERVER_TOKEN and target[0] not in ("127.0.0.1", "localhost", "::1"):
+            raise RuntimeError(f"refusing to listen on {listen} without STT_SERVER_TOKEN")
+        server = await asyncio.start_server(_serve_connection, host=target[0], port=target[1])
+    logger.warning("[stt-server] listening on %s hw=%s", listen, hardware.describe())
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m stt_engine.server", description=__doc__.split("\n\n")[0].strip())
+    ap.add_argument("--listen", default=STT_SERVER_LISTEN, help="unix:/path.sock or tcp:host:port")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(serve(args.listen))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,17 +2,60 @@
 from __future__ import annotations
 
 import os
+import re
 import time
-import wave
-import tempfile
-import array
+import uuid
+from concurrent.futures import Future
 from dataclasses import dataclass
+from typing import Callable
 
+from .audio_buffer import PCMRingBuffer
+from .biasing import BiasProfile
 from .config import WhisperConfig
-from .whisper_gpu import transcribe_wav
+from .engines import get_engine
+from .language import LanguageEvent, LanguageLock
+from .preprocess import AudioPreprocessor, make_preprocessor
+from .profiles import apply_profile
+from .registry import model_key
+from .vad import FrameVAD, VADEvent
+from .scheduler import FINAL_PASS, LIVE_DRAFT, STTSuperseded, get_scheduler
+from .whisper_gpu import TranscriptSegment, TranscriptWord
+
+STREAM_MAX_WINDOW_SEC = float(os.getenv("STT_STREAM_MAX_WINDOW_SEC", "12"))  # force commit past this
+STREAM_KEEP_SEC = 2.0        # audio kept undecided when a commit is forced
+STREAM_VAD = os.getenv("STT_VAD", "1").strip().lower() not in ("0", "false", "no", "off")
+STREAM_LATENCY_SEC = float(os.getenv("STT_STREAM_LATENCY_SEC", "1.5"))  # target decode latency per draft
+STREAM_MAX_INTERVAL = 3.0    # slowest re-decode cadence when the box cannot keep up
+STREAM_DUTY = 0.7            # max share of wall time one stream may spend decoding
+STREAM_EWMA = 0.3            # weight of the newest decode in the speed estimate
+
+_WORD_STRIP_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+@dataclass
+class StreamStatus:
+    rtf: float            # smoothed decode time / decoded audio time
+    decode_ms: float      # smoothed wall time per decode
+    interval_sec: float   # current re-decode interval
+    window_sec: float     # current max decode window (stable-prefix only, else 0)
+    backlog_sec: float    # buffered audio not covered by the last decode
+    lagging: bool
+
+
+@dataclass
+class LiveDraft:
+    """A submitted live-draft decode (StablePrefixStreamer.submit_draft); apply with finish_draft()."""
+    future: Future
+    samples: int     # window length sent to STT
+    started: float   # perf_counter at submit
+    gen: int         # streamer buffer generation; flush() makes older drafts stale
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def queued(self) -> bool:
+        """Not picked by a decode worker yet, so a newer draft of the session still replaces it."""
+        return not self.future.running() and not self.future.done()
 
-STREAM_INPUT_GAIN = float(os.getenv("STT_INPUT_GAIN", "1.6"))  # linear gain ceiling for quiet mic
-STREAM_TARGET_PEAK = 28000  # clamp target to avoid clipping (int16 max is 32767)
 
 @dataclass
 class AudioFormat:
@@ -23,86 +66,358 @@ class AudioFormat:
 class RealtimeWhisperStreamer:
     """
     Practical streaming:
-    - buffer PCM16
-    - every ~0.8s transcribe full buffer -> cumulative text
+    - vectorized preprocessing (DC removal, high-pass, auto-gain) on every pushed chunk
+    - buffer PCM16 in a preallocated ring buffer
+    - optional VAD: only speech (+ pre-roll/hangover) is buffered, silence never reaches whisper
+    - every ~0.4s transcribe the buffered window in memory -> cumulative text
+    - the cadence adapts to measured decode speed: the interval grows when decodes are slow,
+      and each decode covers everything received meanwhile (intermediate drafts are skipped)
     """
-    def __init__(self, cfg: WhisperConfig, fmt: AudioFormat | None = None, input_gain: float | None = None):
+    def __init__(
+        self,
+        cfg: WhisperConfig,
+        fmt: AudioFormat | None = None,
+        input_gain: float | None = None,
+        vad: FrameVAD | None = None,
+        pre: AudioPreprocessor | None = None,
+    ):
         self.cfg = cfg
         self.fmt = fmt or AudioFormat()
-        self.buf = bytearray()
         self.last_ts = 0.0
         # shorter interval => faster commit/translation start
         self.min_interval = 0.4  # seconds
         self.max_sec = 300.0     # cap buffer to ~5 minutes to avoid drift and RAM blow-up
         self.trim_sec = 300.0     # keep only last N seconds when transcribing
-        self.input_gain = max(1.0, float(input_gain or STREAM_INPUT_GAIN))
-        self._target_peak = STREAM_TARGET_PEAK
+        self.buf = PCMRingBuffer(self._samples(self.max_sec))
+        self.pre = pre or make_preprocessor(self.fmt.sample_rate, input_gain=input_gain)
+        self.vad = vad
+        self._vad_events: list[VADEvent] = []
+        self._dirty = False  # audio appended since the last decode
+        self.latency_target = STREAM_LATENCY_SEC
+        self._rtf: float | None = None
+        self._decode_sec: float | None = None
+        self._appended = 0       # samples ever appended to buf
+        self._decoded_mark = 0   # _appended when the last decode started
+        self.session = f"stream-{uuid.uuid4().hex}"  # a newer draft replaces this stream's queued one
+        self._last_text = ""
+        # language=None: detect once, then reuse (see language.py)
+        self.lang_lock = LanguageLock() if cfg.language is None else None
 
     def push(self, pcm16: bytes):
-        pcm16 = pcm16 or b""
+        samples = self.pre.process(pcm16 or b"")
+
+        if self.vad is not None and samples.size:
+            samples, events = self.vad.process(samples)
+            self._vad_events.extend(events)
+
+        n = self.buf.append(samples)
+        if n:
+            self._dirty = True
+            self._appended += n
+
+    def pop_vad_events(self) -> list[VADEvent]:
+        events, self._vad_events = self._vad_events, []
+        return events
+
+    def pop_language_events(self) -> list[LanguageEvent]:
+        return self.lang_lock.pop_events() if self.lang_lock is not None else []
+
+    def _decode_cfg(self, cfg: WhisperConfig) -> WhisperConfig:
+        return self.lang_lock.apply(cfg) if self.lang_lock is not None else cfg
 
-        # Apply simple auto-gain for quiet mic input
-        if self.input_gain > 1.01 and pcm16:
-            pcm16 = self._apply_gain(pcm16)
+    def _observe_language(self, result, samples: int, cfg: WhisperConfig | None = None):
+        if self.lang_lock is not None:
+            confident = get_engine((cfg or self.cfg).engine).capabilities.confidence
+            self.lang_lock.observe(result, samples / float(self.fmt.sample_rate * self.fmt.channels), confident)
 
-        self.buf.extend(pcm16)
-        max_bytes = int(self.max_sec * self.fmt.sample_rate * self.fmt.channels * self.fmt.sampwidth)
-        if len(self.buf) > max_bytes:
-            self.buf = self.buf[-max_bytes:]
+    def interval_sec(self) -> float:
+        if self._decode_sec is None:
+            return self.min_interval
+        return min(STREAM_MAX_INTERVAL, max(self.min_interval, self._decode_sec / STREAM_DUTY))
+
+    def backlog_sec(self) -> float:
+        return (self._appended - self._decoded_mark) / float(self.fmt.sample_rate * self.fmt.channels)
+
+    def lagging(self) -> bool:
+        if self._decode_sec is not None and self._decode_sec > self.latency_target:
+            return True
+        return self.backlog_sec() > 2.0 * max(self.latency_target, self.interval_sec())
+
+    def status(self) -> StreamStatus:
+        return StreamStatus(
+            rtf=round(self._rtf or 0.0, 3),
+            decode_ms=round((self._decode_sec or 0.0) * 1000.0, 1),
+            interval_sec=round(self.interval_sec(), 2),
+            window_sec=0.0,
+            backlog_sec=round(self.backlog_sec(), 2),
+            lagging=self.lagging(),
+        )
 
     def ready(self) -> bool:
-        return (time.time() - self.last_ts) >= self.min_interval and len(self.buf) > 0
+        if len(self.buf) == 0 or (time.time() - self.last_ts) < self.interval_sec():
+            return False
+        # with VAD, a buffer that stopped growing is closed by speech_end, not re-decoded
+        return self._dirty or self.vad is None
 
     def transcribe_cumulative(self) -> str:
         self.last_ts = time.time()
+        self._dirty = False
 
         # Trim buffer to recent window to avoid ever-growing latency
-        window_bytes = int(self.trim_sec * self.fmt.sample_rate * self.fmt.channels * self.fmt.sampwidth)
-        if window_bytes > 0 and len(self.buf) > window_bytes:
-            self.buf = self.buf[-window_bytes:]
+        window = self._samples(self.trim_sec)
+        if window > 0:
+            self.buf.keep_last(window)
 
-        fd, path = tempfile.mkstemp(suffix=".wav")
-        os.close(fd)
+        # int16 view of the ring buffer, no temp WAV; decoded via the shared batch scheduler
+        t0 = self._decode_started()
         try:
-            self._write_wav(path, bytes(self.buf))
-            return transcribe_wav(path, self.cfg)
-        finally:
-            try:
-                os.remove(path)
-            except Exception:
-                pass
-
-    def _write_wav(self, path: str, pcm: bytes):
-        with wave.open(path, "wb") as wf:
-            wf.setnchannels(self.fmt.channels)
-            wf.setsampwidth(self.fmt.sampwidth)
-            wf.setframerate(self.fmt.sample_rate)
-            wf.writeframes(pcm)
-
-    def _apply_gain(self, pcm: bytes) -> bytes:
+            result = get_scheduler().transcribe(
+                self.buf.view(), self._decode_cfg(self.cfg), priority=LIVE_DRAFT, session=self.session,
+            )
+        except STTSuperseded:
+            self._dirty = True
+            return self._last_text
+        self._decode_done(t0, len(self.buf))
+        self._observe_language(result, len(self.buf))
+        self._last_text = result.text
+        return result.text
+
+    def _decode_started(self) -> float:
+        self._decoded_mark = self._appended
+        return time.perf_counter()
+
+    def _decode_done(self, t0: float, samples: int):
+        dt = time.perf_counter() - t0
+        audio = samples / float(self.fmt.sample_rate * self.fmt.channels)
+        a = STREAM_EWMA
+        self._decode_sec = dt if self._decode_sec is None else (1 - a) * self._decode_sec + a * dt
+        if audio > 0.2:  # very short windows say little about speed
+            rtf = dt / audio
+            self._rtf = rtf if self._rtf is None else (1 - a) * self._rtf + a * rtf
+
+    def _samples(self, sec: float) -> int:
+        return int(sec * self.fmt.sample_rate * self.fmt.channels)
+
+
+@dataclass
+class StreamUpdate:
+    committed: str = ""   # newly confirmed text, final (never revised)
+    tentative: str = ""   # current unconfirmed tail, replaced by the next update
+
+
+def _norm_word(w: TranscriptWord) -> str:
+    return _WORD_STRIP_RE.sub("", (w.text or "").lower())
+
+
+def _join_words(words: list[TranscriptWord]) -> str:
+    # whisper word tokens carry their own leading space (none for zh)
+    return "".join(w.text for w in words).strip()
+
+
+class StablePrefixStreamer(RealtimeWhisperStreamer):
+    """
+    Sliding-window streaming (local agreement):
+    - only the uncommitted audio tail is decoded, with word timestamps
+    - the word prefix on which two consecutive hypotheses agree is committed
+      and its audio dropped from the buffer
+    - the rest of the hypothesis is returned as tentative text
+    Decode cost stays bounded by the tail length instead of growing with talk time;
+    on slow hardware the forced-commit window shrinks so one decode fits STREAM_LATENCY_SEC.
+    """
+    def __init__(
+        self,
+        cfg: WhisperConfig,
+        fmt: AudioFormat | None = None,
+        input_gain: float | None = None,
+        vad: FrameVAD | None = None,
+        pre: AudioPreprocessor | None = None,
+        max_window_sec: float = STREAM_MAX_WINDOW_SEC,
+        final_cfg: WhisperConfig | None = None,
+    ):
+        super().__init__(cfg, fmt, input_gain, vad, pre)
+        self.final_cfg = final_cfg or cfg  # flush(): last decode, latency no longer matters
+        self._final_warm: Future | None = None  # background load of final_cfg's model, if it differs
+        if model_key(self.final_cfg) != model_key(cfg):
+            # 0.5 s of silence loads the model now, so the stop-time flush never pays a cold load
+            self._final_warm = get_scheduler().submit(bytes(self._samples(0.5) * 2), self.final_cfg, priority=LIVE_DRAFT)
+        self.max_window_sec = max(STREAM_KEEP_SEC * 2, float(max_window_sec))
+        self._offset_sec = 0.0                        # stream time of buffer start
+        self._prev: list[TranscriptWord] = []         # last uncommitted hypothesis (stream time)
+        self._committed_tail: list[str] = []          # last committed words, for overlap stripping
+        self._gen = 0                                 # bumped by flush(): drafts of older audio are stale
+        self.redrafts = 0                             # queued drafts replaced by a fresher window
+        self._draft: LiveDraft | None = None          # last submitted live draft
+
+    def window_sec(self) -> float:
+        return len(self.buf) / float(self.fmt.sample_rate * self.fmt.channels)
+
+    def max_window(self) -> float:
+        """Window that decodes within latency_target at the measured RTF (never above max_window_sec)."""
+        if not self._rtf:
+            return self.max_window_sec
+        return max(STREAM_KEEP_SEC * 2, min(self.max_window_sec, self.latency_target / self._rtf))
+
+    def status(self) -> StreamStatus:
+        st = super().status()
+        st.window_sec = round(self.max_window(), 2)
+        return st
+
+    def transcribe_incremental(self, on_partial: Callable[[str], None] | None = None) -> StreamUpdate:
         """
-        Lightweight peak-based gain: boost up to input_gain but cap at target peak to avoid clipping.
+        Blocking submit_draft() + finish_draft().
+        on_partial (called from the decode thread) gets the decoded-so-far tail text after each
+        segment, so a draft can be shown before the whole window is decoded.
         """
-        arr = array.array("h")
-        arr.frombytes(pcm)
-        if not arr:
-            return pcm
+        draft = self.submit_draft(on_partial)
+        draft.future.exception()  # wait
+        return self.finish_draft(draft)
+
+    def submit_draft(self, on_partial: Callable[[str], None] | None = None) -> LiveDraft:
+        """
+        Queue a decode of the current window without waiting. Submitting again while the
+        previous draft is still queued replaces it in the scheduler (same session, it keeps
+        its queue position), so a congested queue decodes the newest audio instead of a backlog.
+        """
+        self.last_ts = time.time()
+        self._dirty = False
+        if self._draft is not None and self._draft.queued():
+            self.redrafts += 1
+        t0 = self._decode_started()
+        window = self.buf.view().copy()  # the view is invalidated by the next push
+        self._draft = LiveDraft(
+            future=get_scheduler().submit(
+                window, self._decode_cfg(self.cfg), word_timestamps=True,
+                on_segment=self._partial_cb(on_partial), priority=LIVE_DRAFT, session=self.session,
+            ),
+            samples=len(window),
+            started=t0,
+            gen=self._gen,
+        )
+        return self._draft
+
+    def finish_draft(self, draft: LiveDraft) -> StreamUpdate:
+        """Apply a finished draft: commit the agreed prefix, return the rest as tentative."""
+        try:
+            result = draft.future.result()
+        except STTSuperseded:
+            result = None
+        if result is None or draft.gen != self._gen:
+            self._dirty = True
+            return StreamUpdate(committed="", tentative=_join_words(self._prev))
+        self._decode_done(draft.started, draft.samples)
+        self._observe_language(result, draft.samples)
+        hyp = self._to_stream_words(result.segments)
+
+        n = 0
+        while n < min(len(hyp), len(self._prev)) and _norm_word(hyp[n]) == _norm_word(self._prev[n]):
+            n += 1
+        committed = hyp[:n]
 
-        max_abs = max(abs(v) for v in arr) or 1
-        target = self._target_peak
-        gain = min(self.input_gain, target / max_abs)
-        if gain <= 1.02:  # skip tiny changes to save CPU
-            return pcm
+        if not committed and self.window_sec() > self.max_window():
+            # no agreement for too long (noise, run-on speech): force out the older words
+            cutoff = self._offset_sec + self.window_sec() - STREAM_KEEP_SEC
+            while n < len(hyp) and hyp[n].end <= cutoff:
+                n += 1
+            committed = hyp[:n]
+            if not committed:
+                self._drop_until(cutoff)
 
-        for i, v in enumerate(arr):
-            nv = int(v * gain)
-            if nv > 32767:
-                nv = 32767
-            elif nv < -32768:
-                nv = -32768
-            arr[i] = nv
+        tentative = hyp[n:]
+        self._prev = tentative
+        if committed:
+            self._commit(committed)
+        return StreamUpdate(committed=_join_words(committed), tentative=_join_words(tentative))
 
-        return arr.tobytes()
+    def flush(self) -> StreamUpdate:
+        """Final decode of the remaining tail; everything heard is committed."""
+        self.last_ts = time.time()
+        self._dirty = False
+        hyp = self._hypothesis(priority=FINAL_PASS, cfg=self._flush_cfg()) if len(self.buf) else []
+        self.buf.clear()
+        self._gen += 1
+        self._offset_sec = 0.0
+        self._prev = []
+        self._committed_tail = []
+        return StreamUpdate(committed=_join_words(hyp), tentative="")
+
+    def _flush_cfg(self) -> WhisperConfig:
+        """final_cfg once its model is resident; until then the live model, which is already loaded."""
+        warm = self._final_warm
+        if warm is None or (warm.done() and warm.exception() is None):
+            return self.final_cfg
+        return self.cfg
+
+    def _partial_cb(self, on_partial: Callable[[str], None] | None):
+        if on_partial is None:
+            return None
+        partial: list[TranscriptSegment] = []
+
+        def on_segment(seg: TranscriptSegment):
+            partial.append(seg)
+            on_partial(_join_words(self._to_stream_words(partial)))
+
+        return on_segment
+
+    def _hypothesis(
+        self,
+        on_partial: Callable[[str], None] | None = None,
+        priority: str = LIVE_DRAFT,
+        cfg: WhisperConfig | None = None,
+    ) -> list[TranscriptWord]:
+        t0 = self._decode_started()
+        result = get_scheduler().transcribe(
+            self.buf.view(), self._decode_cfg(cfg or self.cfg), word_timestamps=True,
+            on_segment=self._partial_cb(on_partial), priority=priority, session=self.session,
+        )
+        self._decode_done(t0, len(self.buf))
+        self._observe_language(result, len(self.buf), cfg)
+        return self._to_stream_words(result.segments)
+
+    def _to_stream_words(self, segments: list[TranscriptSegment]) -> list[TranscriptWord]:
+        words = [
+            TranscriptWord(w.start + self._offset_sec, w.end + self._offset_sec, w.text, w.probability)
+            for seg in segments
+            for w in seg.words
+        ]
+        # the audio cut is at a word end, but whisper may re-emit the committed word(s)
+        for k in range(min(5, len(self._committed_tail), len(words)), 0, -1):
+            if [_norm_word(w) for w in words[:k]] == self._committed_tail[-k:]:
+                return words[k:]
+        return words
+
+    def _commit(self, words: list[TranscriptWord]):
+        self._committed_tail = (self._committed_tail + [_norm_word(w) for w in words])[-5:]
+        self._drop_until(words[-1].end)
+
+    def _drop_until(self, t_sec: float):
+        drop = self._samples(max(0.0, t_sec - self._offset_sec))
+        drop = min(drop, len(self.buf))
+        self.buf.drop_first(drop)
+        self._offset_sec += drop / float(self.fmt.sample_rate * self.fmt.channels)
+
+
+def make_stable_prefix_streamer(
+    language: str | None = None,
+    vad: bool = STREAM_VAD,
+    bias: BiasProfile | None = None,
+) -> StablePrefixStreamer:
+    """
+    Factory for virecord line-1 STT (committed + tentative updates, VAD speech events).
+    Window decodes use the autotuned "virecord_live" profile, the stop-time tail decode the
+    "final_pass" one (see stt_engine.autotune); bias is applied to both. A different final
+    model is loaded in the background at session start; flush() uses it only once resident.
+    """
+    fmt = AudioFormat()
+    live = apply_profile(WhisperConfig(language=language), "virecord_live")
+    final = apply_profile(WhisperConfig(language=language), "final_pass")
+    if bias is not None:
+        live, final = bias.apply(live), bias.apply(final)
+    return StablePrefixStreamer(
+        live,
+        fmt,
+        vad=FrameVAD(sample_rate=fmt.sample_rate) if vad else None,
+        final_cfg=final,
+    )
 
 
 def make_realtime_streamer(language: str | None = None) -> RealtimeWhisperStreamer:
@@ -110,4 +425,4 @@ def make_realtime_streamer(language: str | None = None) -> RealtimeWhisperStream
     Factory for virecord line-1 STT.
     Keeps virecord code slim; adjust defaults in stt_engine/config.py.
     """
-    return RealtimeWhisperStreamer(WhisperConfig(language=language))
+    return RealtimeWhisperStreamer(apply_profile(WhisperConfig(language=language), "virecord_live"))
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import os
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+VAD_FRAME_MS = 30
+VAD_SPEECH_DB = float(os.getenv("STT_VAD_SPEECH_DB", "9"))         # dB above noise floor
+VAD_MIN_DBFS = float(os.getenv("STT_VAD_MIN_DBFS", "-50"))          # never speech below this
+VAD_MIN_SPEECH_MS = int(os.getenv("STT_VAD_MIN_SPEECH_MS", "90"))   # debounce speech start
+VAD_HANGOVER_MS = int(os.getenv("STT_VAD_HANGOVER_MS", "500"))      # silence that ends speech
+VAD_PREROLL_MS = int(os.getenv("STT_VAD_PREROLL_MS", "300"))        # audio kept before speech start
+
+
+@dataclass
+class VADEvent:
+    kind: str     # "speech_start" | "speech_end"
+    t: float      # stream time (s) of the input audio
+
+
+class FrameVAD:
+    """
+    Lightweight energy VAD over fixed frames of PCM16 mono:
+    - frame levels are computed vectorized (one reshape + mean per chunk)
+    - adaptive noise floor (fast fall, slow rise), speech = floor + VAD_SPEECH_DB
+    - debounced start, hangover end, pre-roll so the first syllable is not clipped
+    process() returns only the audio worth decoding (speech + pre-roll + hangover).
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = VAD_FRAME_MS,
+        speech_db: float = VAD_SPEECH_DB,
+        min_dbfs: float = VAD_MIN_DBFS,
+        min_speech_ms: int = VAD_MIN_SPEECH_MS,
+        hangover_ms: int = VAD_HANGOVER_MS,
+        preroll_ms: int = VAD_PREROLL_MS,
+    ):
+        self.sample_rate = sample_rate
+        self.frame = max(1, sample_rate * frame_ms // 1000)
+        self.speech_db = speech_db
+        self.min_dbfs = min_dbfs
+        self._start_frames = max(1, min_speech_ms // frame_ms)
+        self._end_frames = max(1, hangover_ms // frame_ms)
+        self._preroll: deque[np.ndarray] = deque(maxlen=max(1, preroll_ms // frame_ms) + self._start_frames)
+
+        self._rest = np.zeros(0, dtype=np.int16)
+        self._noise_db = -60.0
+        self._frames_seen = 0
+        self._speech_run = 0
+        self._silence_run = 0
+        self.in_speech = False
+
+    def reset(self):
+        self._rest = np.zeros(0, dtype=np.int16)
+        self._preroll.clear()
+        self._speech_run = 0
+        self._silence_run = 0
+        self.in_speech = False
+
+    def process(self, samples: np.ndarray) -> tuple[np.ndarray, list[VADEvent]]:
+        x = np.concatenate((self._rest, samples)) if self._rest.size else samples
+        n = x.size // self.frame
+        self._rest = x[n * self.frame:].copy()
+        if n == 0:
+            return np.zeros(0, dtype=np.int16), []
+
+        frames = x[: n * self.frame].reshape(n, self.frame)
+        f = frames.astype(np.float32)
+        rms = np.sqrt(np.mean(f * f, axis=1)) / 32768.0
+        levels = 20.0 * np.log10(rms + 1e-10)
+
+        keep: list[np.ndarray] = []
+        events: list[VADEvent] = []
+        for i in range(n):
+            db = float(levels[i])
+            is_speech = db >= max(self._noise_db + self.speech_db, self.min_dbfs)
+            t = (self._frames_seen + i) * self.frame / float(self.sample_rate)
+
+            # fast fall, slow rise (very slow during speech, so a new steady noise is learnt)
+            if db < self._noise_db:
+                rate = 0.2
+            else:
+                rate = 0.002 if is_speech else 0.01
+            self._noise_db = max(-90.0, self._noise_db + rate * (db - self._noise_db))
+
+            if self.in_speech:
+                keep.append(frames[i])
+                self._silence_run = 0 if is_speech else self._silence_run + 1
+                if self._silence_run >= self._end_frames:
+                    self.in_speech = False
+                    self._speech_run = 0
+                    end_t = t - (self._end_frames - 1) * self.frame / float(self.sample_rate)
+                    events.append(VADEvent("speech_end", end_t))
+                continue
+
+            self._preroll.append(frames[i].copy())
+            self._speech_run = self._speech_run + 1 if is_speech else 0
+            if self._speech_run >= self._start_frames:
+                self.in_speech = True
+                self._silence_run = 0
+                start_t = t - (self._start_frames - 1) * self.frame / float(self.sample_rate)
+                events.append(VADEvent("speech_start", start_t))
+                keep.extend(self._preroll)
+                self._preroll.clear()
+
+        self._frames_seen += n
+        out = np.concatenate(keep) if keep else np.zeros(0, dtype=np.int16)
+        return out, events
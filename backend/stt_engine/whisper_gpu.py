@@ -1,63 +1,297 @@
-# stt_engine/whisper_gpu.py
 from __future__ import annotations
 
-import threading
+import logging
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Iterator
+
+import numpy as np
+
 from .config import WhisperConfig
+from .engines import get_engine
+from .hardware import cpu_fallback, is_cuda_error, mark_cuda_unusable, resolve_config
+from .registry import ModelRegistry
+
+logger = logging.getLogger("stt_engine.whisper")
+
+SAMPLE_RATE = 16000  # faster-whisper expects 16 kHz mono float32
+
+@dataclass
+class TranscriptWord:
+    start: float  # seconds, relative to the decoded audio
+    end: float
+    text: str     # raw whisper token text (keeps its leading space)
+    probability: float = 0.0
+
+
+@dataclass
+class TranscriptSegment:
+    start: float
+    end: float
+    text: str
+    avg_logprob: float = 0.0
+    no_speech_prob: float = 0.0
+    words: list[TranscriptWord] = field(default_factory=list)
 
-_model_lock = threading.Lock()
-_cached: dict[tuple[str, str, str], object] = {}
+
+@dataclass
+class TranscriptResult:
+    text: str
+    segments: list[TranscriptSegment] = field(default_factory=list)
+    language: str | None = None
+    language_probability: float = 0.0
+    duration: float = 0.0
 
 
 def _load_model(cfg: WhisperConfig):
-    from faster_whisper import WhisperModel  # pip install faster-whisper
-    return WhisperModel(
-        cfg.model_size,
-        device=cfg.device,
-        compute_type=cfg.compute_type,
-    )
+    cfg = resolve_config(cfg)
+    return get_engine(cfg.engine).load(cfg)
+
+
+# budgeted LRU cache of loaded models (see registry.py)
+registry = ModelRegistry(loader=_load_model)
 
 
 def get_model(cfg: WhisperConfig):
-    key = (cfg.model_size, cfg.device, cfg.compute_type)
-    with _model_lock:
-        m = _cached.get(key)
-        if m is not None:
-            return m
-        m = _load_model(cfg)
-        _cached[key] = m
-        return m
+    return registry.get(resolve_config(cfg))
 
 
-def transcribe_wav(wav_path: str, cfg: WhisperConfig) -> str:
+def _on_cuda_failure(exc: Exception, cfg: WhisperConfig) -> WhisperConfig | None:
+    """CPU profile to retry with if exc is a CUDA init/runtime failure, else None."""
+    if cfg.device != "cuda" or not is_cuda_error(exc):
+        return None
+    mark_cuda_unusable(f"{type(exc).__name__}: {exc}")
+    return cpu_fallback(cfg)
+
+
+def pcm_to_float32(audio) -> np.ndarray:
+    """
+    PCM16 bytes-like (bytes/bytearray/memoryview) or int16/float32 array -> float32 in [-1, 1].
+    Bytes-likes are read through a memoryview (no intermediate bytes copy); float32 input is
+    passed through untouched.
+    """
+    if isinstance(audio, np.ndarray):
+        if audio.dtype == np.float32:
+            return audio
+        if audio.dtype != np.int16:
+            return audio.astype(np.float32)
+        samples = audio
+    else:
+        mv = memoryview(audio).cast("B")
+        samples = np.frombuffer(mv[: len(mv) & ~1], dtype=np.int16)
+
+    out = samples.astype(np.float32)
+    out *= 1.0 / 32768.0
+    return out
+
+
+def _transcribe(
+    audio: str | BinaryIO | np.ndarray,
+    cfg: WhisperConfig,
+    word_timestamps: bool = False,
+    on_segment: Callable[[TranscriptSegment], None] | None = None,
+) -> TranscriptResult:
     """
-    Stable transcription for file-based wav.
     NOTE: don't strip/collapse spaces too early; return raw joined text.
+    on_segment is called with each segment as soon as faster-whisper yields it.
+    A CUDA failure (missing driver/cuBLAS, OOM at init) retries once on the CPU profile,
+    unless segments already reached on_segment (a retry would deliver them twice).
+    """
+    cfg = resolve_config(cfg)
+    emitted = False
+
+    def emit(seg: TranscriptSegment):
+        nonlocal emitted
+        emitted = True
+        on_segment(seg)
+
+    try:
+        return _transcribe_on(audio, cfg, word_timestamps, emit if on_segment is not None else None)
+    except Exception as e:
+        fallback = None if emitted else _on_cuda_failure(e, cfg)
+        if fallback is None:
+            raise
+        if hasattr(audio, "seek"):
+            audio.seek(0)
+        return _transcribe_on(audio, fallback, word_timestamps, on_segment)
+
+
+def _model_transcribe(model, audio, cfg: WhisperConfig, word_timestamps: bool):
+    """Lazy (segments, info) from cfg.engine; decoding options live in engines/."""
+    return get_engine(cfg.engine).transcribe(model, audio, cfg, word_timestamps)
+
+
+def _transcribe_on(audio, cfg: WhisperConfig, word_timestamps: bool, on_segment=None) -> TranscriptResult:
+    with registry.lease(cfg) as model:
+        segments, info = _model_transcribe(model, audio, cfg, word_timestamps)
+        # segments is a lazy generator: decode while the model is leased
+        segs: list[TranscriptSegment] = []
+        for s in segments:
+            seg = _to_segment(s)
+            segs.append(seg)
+            if on_segment is not None:
+                on_segment(seg)
+
+    return _to_result(segs, info)
+
+
+def iter_segments(
+    audio: str | BinaryIO | np.ndarray,
+    cfg: WhisperConfig,
+    word_timestamps: bool = False,
+) -> Iterator[TranscriptSegment]:
+    """
+    Generator variant of transcribe_wav/transcribe_pcm_segments: yields each segment as it
+    is decoded (timestamps, avg_logprob, no_speech_prob). Runs in the caller's thread, outside
+    the scheduler; the model stays leased until the generator is exhausted or closed.
     """
-    model = get_model(cfg)
+    if not isinstance(audio, str) and not hasattr(audio, "read"):
+        audio = pcm_to_float32(audio)  # PCM16 bytes-like / int16 / float32 array
+    cfg = resolve_config(cfg)
+    started = False
+    try:
+        for seg in _iter_on(audio, cfg, word_timestamps):
+            started = True
+            yield seg
+    except Exception as e:
+        fallback = None if started else _on_cuda_failure(e, cfg)
+        if fallback is None:
+            raise
+        if hasattr(audio, "seek"):
+            audio.seek(0)
+        yield from _iter_on(audio, fallback, word_timestamps)
 
-    segments, _info = model.transcribe(
-        wav_path,
-        language=cfg.language,                 # "en"/"vi"/"zh" or None
-        vad_filter=cfg.vad_filter,
-        beam_size=max(1, int(cfg.beam_size or 1)),
 
-        # IMPORTANT: reduce hallucination / "continue writing"
-        condition_on_previous_text=False,
+def _iter_on(audio, cfg: WhisperConfig, word_timestamps: bool) -> Iterator[TranscriptSegment]:
+    with registry.lease(cfg) as model:
+        segments, _info = _model_transcribe(model, audio, cfg, word_timestamps)
+        for s in segments:
+            yield _to_segment(s)
 
-        # More deterministic
-        temperature=0.0,
 
-        # Guardrails against no-speech / garbage
-        no_speech_threshold=0.6,
-        log_prob_threshold=-1.0,
-        compression_ratio_threshold=2.4,
+def _to_segment(s, offset: float = 0.0) -> TranscriptSegment:
+    return TranscriptSegment(
+        start=float(s.start) - offset,
+        end=float(s.end) - offset,
+        text=s.text or "",
+        avg_logprob=float(s.avg_logprob),
+        no_speech_prob=float(s.no_speech_prob),
+        words=[
+            TranscriptWord(float(w.start) - offset, float(w.end) - offset, w.word, float(w.probability))
+            for w in (s.words or [])
+        ],
     )
 
-    out: list[str] = []
-    for s in segments:
-        t = (s.text or "")
-        if t:
-            # keep internal spaces; only strip ends
-            out.append(t.strip())
 
-    return " ".join(out)
+def _to_result(segs: list[TranscriptSegment], info, duration: float | None = None) -> TranscriptResult:
+    # keep internal spaces; only strip ends
+    out = [seg.text.strip() for seg in segs if seg.text]
+    return TranscriptResult(
+        text=" ".join(out),
+        segments=segs,
+        language=getattr(info, "language", None),
+        language_probability=float(getattr(info, "language_probability", 0.0) or 0.0),
+        duration=float(duration if duration is not None else getattr(info, "duration", 0.0) or 0.0),
+    )
+
+
+def transcribe_wav(wav_path: str | BinaryIO, cfg: WhisperConfig) -> str:
+    """
+    Stable transcription for file-based wav (path or file-like object).
+    """
+    return transcribe_wav_segments(wav_path, cfg).text
+
+
+def transcribe_wav_segments(wav_path: str | BinaryIO, cfg: WhisperConfig) -> TranscriptResult:
+    return _transcribe(wav_path, cfg)
+
+
+def transcribe_pcm(audio, cfg: WhisperConfig) -> str:
+    """
+    In-memory transcription: 16 kHz mono PCM16 (bytes-like / int16 array) or float32 array.
+    No temp WAV, no header round-trip; the buffer goes straight to faster-whisper.
+    """
+    return transcribe_pcm_segments(audio, cfg).text
+
+
+def transcribe_pcm_segments(
+    audio,
+    cfg: WhisperConfig,
+    word_timestamps: bool = False,
+    on_segment: Callable[[TranscriptSegment], None] | None = None,
+) -> TranscriptResult:
+    """
+    Same input as transcribe_pcm, but keeps segment timing/confidence (and words if asked).
+    on_segment receives each segment as soon as it is decoded.
+    """
+    samples = pcm_to_float32(audio)
+    if samples.size == 0:
+        return TranscriptResult(text="")
+    return _transcribe(samples, cfg, word_timestamps=word_timestamps, on_segment=on_segment)
+
+
+def transcribe_pcm_batch(audios: list, cfg: WhisperConfig, word_timestamps: bool = False) -> list[TranscriptResult]:
+    """
+    Decode several independent clips (each <= 30 s, same cfg) in one batched forward pass.
+    The clips are concatenated and handed to faster-whisper's BatchedInferencePipeline as
+    clip_timestamps, so each clip becomes one row of the encoder/decoder batch; segments
+    are mapped back to their clip by start time.
+    """
+    cfg = resolve_config(cfg)
+    samples = [pcm_to_float32(a) for a in audios]
+    live = [i for i, x in enumerate(samples) if x.size]
+    results = [TranscriptResult(text="") for _ in samples]
+    if len(live) == 1:
+        results[live[0]] = _transcribe(samples[live[0]], cfg, word_timestamps=word_timestamps)
+    if len(live) <= 1:
+        return results
+    if not get_engine(cfg.engine).capabilities.batched:
+        for i in live:
+            results[i] = _transcribe(samples[i], cfg, word_timestamps=word_timestamps)
+        return results
+
+    try:
+        per_clip, info, starts = _batch_on(samples, live, cfg, word_timestamps)
+    except Exception as e:
+        fallback = _on_cuda_failure(e, cfg)
+        if fallback is None:
+            raise
+        per_clip, info, starts = _batch_on(samples, live, fallback, word_timestamps)
+
+    for k, i in enumerate(live):
+        results[i] = _to_result(per_clip[k], info, duration=samples[i].size / SAMPLE_RATE)
+    return results
+
+
+def _batch_on(samples: list[np.ndarray], live: list[int], cfg: WhisperConfig, word_timestamps: bool):
+    from faster_whisper import BatchedInferencePipeline
+
+    starts: list[float] = []
+    clips: list[dict] = []
+    pos = 0
+    for i in live:
+        n = samples[i].size
+        starts.append(pos / SAMPLE_RATE)
+        clips.append({"start": pos / SAMPLE_RATE, "end": (pos + n) / SAMPLE_RATE})
+        pos += n
+
+    per_clip: list[list[TranscriptSegment]] = [[] for _ in live]
+    with registry.lease(cfg) as model:
+        segments, info = BatchedInferencePipeline(model).transcribe(
+            np.concatenate([samples[i] for i in live]),
+            language=cfg.language,
+            beam_size=max(1, int(cfg.beam_size or 1)),
+            batch_size=len(live),
+            clip_timestamps=clips,
+            word_timestamps=word_timestamps,
+            initial_prompt=cfg.initial_prompt or None,
+            hotwords=cfg.hotwords or None,
+            temperature=0.0,
+            no_speech_threshold=0.6,
+            log_prob_threshold=-1.0,
+            compression_ratio_threshold=2.4,
+        )
+        for s in segments:
+            k = max(0, bisect_right(starts, float(s.start) + 1e-3) - 1)
+            per_clip[k].append(_to_segment(s, offset=starts[k]))
+    return per_clip, info, starts
@@ -1,16 +1,62 @@
 """
 Django app configuration for Viassistant
-Initializes Bluetooth speaker connection on startup
+Initializes Bluetooth speaker connection on startup;
+the server entrypoint also starts the esplight state poller
+and pre-renders the canned device replies into the TTS cache
 """
 
 import logging
 import django.apps
 import asyncio
 import os
+import threading
+import time
 
 logger = logging.getLogger("viassistant.apps")
 
 BLUETOOTH_SPEAKER_NAME = os.getenv("VI_BLUETOOTH_SPEAKER_NAME", "MAP140")
+TTS_PREWARM = (os.getenv("VI_TTS_PREWARM") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _prewarm_canned_replies():
+    """Device/ack replies answered from the TTS cache with zero synthesis."""
+    try:
+        from .assistant_logic import _canned_replies
+        from .voice_pipeline import prewarm_tts
+
+        t0 = time.time()
+        rendered = prewarm_tts(_canned_replies())
+        logger.warning("[app] tts prewarm rendered=%d (%.1fs)", rendered, time.time() - t0)
+    except Exception as e:
+        logger.warning("[app] tts prewarm failed, replies render on demand: %s", e)
+
+
+_services_lock = threading.Lock()
+_services_started = False
+
+
+def start_background_services():
+    """
+    Server-only background work, started from config/asgi.py (once per process). Not from
+    ready(): that also runs for every manage.py command and in runserver's autoreload parent.
+    """
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+
+    try:
+        from .assistant_logic import _poll_esp_status
+        from .device_state import start_poller
+
+        start_poller(_poll_esp_status)
+    except Exception as e:
+        logger.warning("[app] device poller not started, live ESP requests only: %s", e)
+
+    if TTS_PREWARM:
+        # background: edge-tts round trips must not delay startup; cached phrases are skipped
+        threading.Thread(target=_prewarm_canned_replies, name="tts-prewarm", daemon=True).start()
 
 
 class ViassistantConfig(django.apps.AppConfig):
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import io
+import logging
+import subprocess
+import threading
+import wave
+
+import numpy as np
+
+from stt_engine.resample import TARGET_RATE, InputFormat, PCMConverter
+
+logger = logging.getLogger("viassistant.codec")
+
+try:  # PyAV ships with faster-whisper; in-process decoding needs no ffmpeg binary
+    import av  # type: ignore
+except ImportError:  # pragma: no cover - fallback below
+    av = None
+
+
+class _PyAVDecoder:
+    """
+    Incremental in-process decode: MP3 bytes are parsed into packets as they arrive,
+    decoded frames go through the stt_engine resampler to 16 kHz mono PCM16.
+    """
+
+    def __init__(self, codec: str = "mp3"):
+        self._codec = av.CodecContext.create(codec, "r")
+        self._convert: PCMConverter | None = None
+
+    def feed(self, data: bytes) -> bytes:
+        return self._decode(self._codec.parse(bytes(data)))
+
+    def flush(self) -> bytes:
+        out = self._decode(self._codec.parse(None))
+        return out + self._decode([None])  # drain the decoder
+
+    def close(self) -> None:
+        pass  # nothing outside this process to release
+
+    def _decode(self, packets) -> bytes:
+        out = bytearray()
+        for packet in packets:
+            for frame in self._codec.decode(packet):
+                out += self._frame_pcm(frame)
+        return bytes(out)
+
+    def _frame_pcm(self, frame) -> bytes:
+        channels = len(frame.layout.channels)
+        x = frame.to_ndarray()
+        # planar -> (channels, samples), packed -> (1, samples*channels); interleave both
+        x = x.T.reshape(-1) if frame.format.is_planar else x.reshape(-1)
+        if x.dtype.kind in "iu":
+            x = x.astype(np.float32) / float(np.iinfo(x.dtype).max + 1)
+        if self._convert is None:
+            self._convert = PCMConverter(InputFormat(frame.sample_rate, channels, "f32le"))
+        return self._convert(x.astype(np.float32, copy=False).tobytes())
+
+
+class _FfmpegDecoder:
+    """
+    Fallback without PyAV: one ffmpeg process per stream, fed chunk by chunk
+    (raw s16le out, no WAV container) with a reader thread draining stdout.
+    """
+
+    def __init__(self, codec: str = "mp3"):
+        cmd = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", codec, "-i", "pipe:0",
+            "-ac", "1", "-ar", str(TARGET_RATE), "-f", "s16le", "pipe:1",
+        ]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._out = bytearray()
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, name="ffmpeg-decode", daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        while chunk := self._proc.stdout.read1(65536):
+            with self._lock:
+                self._out += chunk
+
+    def _take(self) -> bytes:
+        with self._lock:
+            out = bytes(self._out)
+            self._out.clear()
+        return out
+
+    def feed(self, data: bytes) -> bytes:
+        self._proc.stdin.write(data)
+        self._proc.stdin.flush()
+        return self._take()
+
+    def flush(self) -> bytes:
+        self._proc.stdin.close()
+        self._reader.join()
+        err = self._proc.stderr.read().decode("utf-8", errors="ignore").strip()
+        if self._proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg convert failed rc={self._proc.returncode}: {err}")
+        return self._take()
+
+    def close(self) -> None:
+        """Kill ffmpeg if the stream was abandoned before flush(), reap it and release its pipes."""
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.wait()
+        self._reader.join()
+        for pipe in (self._proc.stdin, self._proc.stdout, self._proc.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass  # stdin: pending data to a killed process
+
+
+def make_decoder(codec: str = "mp3"):
+    """
+    Incremental decoder: feed(bytes) -> PCM16 so far, flush() -> the rest (16 kHz mono).
+    Always close() it (try/finally): the ffmpeg fallback holds a process and pipes.
+    """
+    return _PyAVDecoder(codec) if av is not None else _FfmpegDecoder(codec)
+
+
+def decode_to_pcm16(data: bytes, codec: str = "mp3") -> bytes:
+    """Whole compressed buffer -> 16 kHz mono PCM16."""
+    if not data:
+        return b""
+    dec = make_decoder(codec)
+    try:
+        return dec.feed(data) + dec.flush()
+    finally:
+        dec.close()
+
+
+def pcm16_to_wav_bytes(pcm: bytes, sample_rate: int = TARGET_RATE) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    return buf.getvalue()
+
+
+def mp3_to_wav_bytes(mp3_bytes: bytes) -> bytes:
+    """MP3 -> 16 kHz mono PCM16 WAV, same output as the old per-reply ffmpeg pipe."""
+    if not mp3_bytes:
+        return b""
+    return pcm16_to_wav_bytes(decode_to_pcm16(mp3_bytes))
@@ -4,6 +4,7 @@ import base64
 import os
 import tempfile
 from collections import deque
+from dataclasses import asdict, dataclass, field
 import json
 import asyncio
 import logging
@@ -13,18 +14,35 @@ import io
 import platform
 import shutil
 import subprocess
+import time
 from pathlib import Path
 from typing import Optional
 
 from channels.generic.websocket import AsyncWebsocketConsumer
 
-from .voice_pipeline import STTConfig, stt_wav_to_text, tts_text_to_wav_bytes, _ffmpeg_mp3_to_wav_bytes
+from stt_engine.language import LanguageLock
+from stt_engine.resample import InputFormat, PCMConverter, parse_input_format
+
+from .voice_pipeline import (
+    STT_COMMAND_PROFILE,
+    STTConfig,
+    stt_pcm_to_text,
+    tts_sentence_stream,
+    tts_text_to_wav_bytes,
+    turn_latency,
+)
+from .audio_codec import mp3_to_wav_bytes
+from .stage_graph import STAGE_TIMEOUTS, StageGraph
 from .assistant_logic import (
+    _AI_STREAM,
     _call_ai,
+    _call_ai_stream,
     _call_esp_relay,
     _call_esp_sensor,
     _detect_device_command,
     _detect_sensor_query,
+    _is_command_text,
+    _stt_bias,
     _format_device_reply,
     _format_sensor_reply,
     _detect_music_request,
@@ -43,14 +61,18 @@ MAX_CONVERSATION_TURNS = 10
 HISTORY_FILE_PATH = Path(__file__).resolve().parent / "ai_history.json"
 HISTORY_FILE_MAX_ENTRIES = int(os.getenv("VI_HISTORY_FILE_MAX_ENTRIES", "1000"))
 HISTORY_FILE_LOCK = threading.Lock()
+AI_FALLBACK_REPLY = "Sorry, I could not answer that right now."
 
 
-def _write_wav(path: str, pcm: bytes, sample_rate: int = 16000, channels: int = 1, sampwidth: int = 2):
-    with wave.open(path, "wb") as wf:
-        wf.setnchannels(channels)
-        wf.setsampwidth(sampwidth)
-        wf.setframerate(sample_rate)
-        wf.writeframes(pcm)
+@dataclass
+class _StreamedReply:
+    """
+    Shared by the ai_stream (generate + TTS) and speak (playback) stages of one turn; lives
+    outside both, so what was already spoken survives either stage timing out.
+    """
+    sentences: asyncio.Queue = field(default_factory=asyncio.Queue)  # (text, wav), None = done
+    parts: list[str] = field(default_factory=list)                   # sentences played so far
+    first_audio: float | None = None                                  # seconds from turn start
 
 
 def _play_wav_bytes_local(wav_bytes: bytes) -> None:
@@ -231,8 +253,10 @@ class ViAssistantConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self._pcm = bytearray()
         self._prebuf = bytearray()  # capture early audio before "start" processed
+        self._convert: PCMConverter | None = None  # client audio -> 16 kHz mono PCM16 (None = native)
         self._started = False
         self._language = "en"
+        self._lang_lock: LanguageLock | None = None  # language "auto": detected once, kept across turns
         self._client = "generic"
         self._finalize_task: asyncio.Task | None = None
         self._history = deque(
@@ -253,17 +277,27 @@ class ViAssistantConsumer(AsyncWebsocketConsumer):
             t = (msg.get("type") or "").strip().lower()
             logger.warning("[ws] receive text_data type=%s json=%s", t, text_data[:100])
             if t == "start":
+                try:
+                    fmt = parse_input_format(msg)
+                except ValueError as e:
+                    await self.send(text_data=json.dumps({"type": "error", "error": f"bad_audio_format: {e}"}))
+                    return
+                self._convert = None if fmt.is_native() else PCMConverter(fmt)
                 if self._prebuf:
                     # keep early audio that may have arrived before start frame
-                    self._pcm = bytearray(self._prebuf)
+                    self._pcm = bytearray(self._convert(self._prebuf) if self._convert else self._prebuf)
                 else:
                     self._pcm.clear()
                 self._prebuf.clear()
                 self._started = True
                 self._cancel_token = False
                 self._language = (msg.get("language") or "en").strip() or "en"
+                if self._language.lower() == "auto":
+                    self._lang_lock = self._lang_lock or LanguageLock()
+                else:
+                    self._lang_lock = None
                 self._client = (msg.get("client") or "generic").strip().lower() or "generic"
-                logger.warning("[ws] start language=%s", self._language)
+                logger.warning("[ws] start language=%s audio=%s", self._language, fmt)
                 await self.send(text_data=json.dumps({"type": "ack", "status": "started"}))
                 return
 
@@ -283,7 +317,7 @@ class ViAssistantConsumer(AsyncWebsocketConsumer):
                 # buffer until we receive a start frame to avoid clipping the first syllable
                 self._prebuf.extend(bytes_data)
                 return
-            self._pcm.extend(bytes_data)
+            self._pcm.extend(self._convert(bytes_data) if self._convert else bytes_data)
 
     async def _finalize_and_reply(self):
         try:
@@ -299,96 +333,244 @@ class ViAssistantConsumer(AsyncWebsocketConsumer):
             self._finalize_task = None
 
     async def _do_finalize_and_reply(self):
+        turn_t0 = time.monotonic()  # end of user speech: first-audio latency is measured from here
         if not self._pcm and self._prebuf:
             self._pcm = bytearray(self._prebuf)
         if not self._pcm:
             await self.send(text_data=json.dumps({"type": "result", "ok": False, "error": "empty_audio"}))
             return
 
-        fd, path = tempfile.mkstemp(suffix=".wav")
-        os.close(fd)
-        try:
-            _write_wav(path, bytes(self._pcm))
-            stt_cfg = STTConfig(language=self._language)
-            stt_text = await asyncio.to_thread(stt_wav_to_text, path, stt_cfg)
-            logger.warning("[ws] stt done text_len=%d text=%s", len(stt_text or ""), stt_text)
-        finally:
-            try:
-                os.remove(path)
-            except Exception:
-                pass
-
-        device_action = _detect_device_command(stt_text)
-        sensor_query = _detect_sensor_query(stt_text)
-        music_query = _detect_music_request(stt_text)
-        device_target = None
-        device_result = None
-        sensor_result = None
-        music_result = None
-        music_audio_bytes: bytes | None = None
-        if device_action:
-            device_target = device_action.get("rooms") or device_action.get("room")
-            try:
-                device_result = await asyncio.to_thread(
-                    _call_esp_relay, device_target, device_action["state"]
-                )
-            except Exception as e:
-                device_result = {"ok": False, "error": str(e)}
-        logger.warning("[ws] device action=%s", device_action)
-
-        reply_source = "ai"
-        history_snapshot = list(self._history)
-        if device_action:
-            reply_source = "device"
-            ai_text = _format_device_reply(device_target, device_action["state"], device_result)
-        elif sensor_query:
-            reply_source = "sensor"
-            try:
-                sensor_result = await asyncio.to_thread(_call_esp_sensor)
-            except Exception as e:
-                logger.exception("[ws] sensor error: %s", e)
-                sensor_result = {"ok": False, "error": str(e)}
-            ai_text = _format_sensor_reply(
-                sensor_result,
-                sensor_query["temperature"],
-                sensor_query["humidity"],
+        # Hand the turn buffer to STT as-is (no copy, no temp WAV). Swap in a fresh
+        # bytearray first: late frames must not resize a buffer that is being read.
+        pcm = self._pcm
+        self._pcm = bytearray()
+        stt_language = None if self._lang_lock is not None else self._language
+        stt_cfg = STTConfig(language=stt_language, **STT_COMMAND_PROFILE)
+        if (bias := _stt_bias(stt_language or self._lang_lock.language)) is not None:
+            stt_cfg = bias.apply(stt_cfg)  # room/sensor vocabulary as initial_prompt + hotwords
+        loop = asyncio.get_running_loop()
+        sensor_prefetch: asyncio.Future | None = None
+
+        def on_early_text(text: str):
+            # first segments are in: start read-only work now, device relays wait for the final text
+            nonlocal sensor_prefetch
+            if sensor_prefetch is None and _detect_sensor_query(text):
+                logger.warning("[ws] early intent sensor text=%s", text)
+                sensor_prefetch = asyncio.ensure_future(asyncio.to_thread(_call_esp_sensor))
+                sensor_prefetch.add_done_callback(lambda f: f.cancelled() or f.exception())  # unused => no warning
+            elif _detect_device_command(text):
+                logger.warning("[ws] early intent device text=%s", text)
+
+        def on_segment(seg):
+            loop.call_soon_threadsafe(on_early_text, seg.text)
+
+        graph = StageGraph(turn_t0)
+        esp = self._client == "esp32"
+
+        async def stt_stage():
+            text = await asyncio.to_thread(
+                stt_pcm_to_text, pcm, stt_cfg, _is_command_text, on_segment, self._lang_lock
             )
-            logger.warning("[ws] sensor query=%s", sensor_query)
-        elif music_query:
-            reply_source = "music"
-            try:
-                music_result = await asyncio.to_thread(_jamendo_search_track, music_query)
-            except Exception as e:
-                logger.exception("[ws] jamendo search failed: %s", e)
-                music_result = {"ok": False, "error": str(e)}
+            logger.warning("[ws] stt done text_len=%d text=%s", len(text or ""), text)
+            if self._lang_lock is not None:
+                for ev in self._lang_lock.pop_events():
+                    logger.warning("[ws] stt language %s p=%.2f", ev.language or "released", ev.probability)
+                    await self.send(text_data=json.dumps({"type": "stt.language", **asdict(ev)}))
+            return text
+
+        try:
+            stt_text = await graph.add("stt", stt_stage, fallback="")
+            device_action = _detect_device_command(stt_text)
+            sensor_query = _detect_sensor_query(stt_text)
+            music_query = _detect_music_request(stt_text)
+            logger.warning("[ws] device action=%s", device_action)
+
+            # every branch ends in a "reply" stage -> (text, result fields, audio to play instead of TTS);
+            # stages after "stt" receive the transcript as their argument
+            streamed = False
+            tts_after: tuple[str, ...] = ("reply",)
+            if device_action:
+                reply_source = "device"
+                device_target = device_action.get("rooms") or device_action.get("room")
+                state = device_action["state"]
+
+                async def relay_stage(_stt_text):
+                    try:
+                        return await asyncio.to_thread(_call_esp_relay, device_target, state)
+                    except Exception as e:
+                        return {"ok": False, "error": str(e)}
+
+                async def tts_guess_stage(_stt_text):
+                    # the ack only changes when the relay answers "already": synthesize it while the ESP works
+                    text = _format_device_reply(device_target, state)
+                    return text, await asyncio.to_thread(tts_text_to_wav_bytes, self._tts_text(text))
+
+                async def device_reply_stage(device_result):
+                    text = _format_device_reply(device_target, state, device_result)
+                    return text, {"device_result": device_result}, None
 
-            if music_result and music_result.get("ok") and music_result.get("audio_url"):
+                graph.add("relay", relay_stage, after=("stt",), fallback={"ok": False, "error": "relay_timeout"})
+                graph.add("tts_guess", tts_guess_stage, after=("stt",), timeout=STAGE_TIMEOUTS["tts"], fallback=(None, b""))
+                graph.add("reply", device_reply_stage, after=("relay",))
+                tts_after = ("reply", "tts_guess")
+            elif sensor_query:
+                reply_source = "sensor"
+
+                async def sensor_stage(_stt_text):
+                    try:
+                        if sensor_prefetch is not None:
+                            return await sensor_prefetch
+                        return await asyncio.to_thread(_call_esp_sensor)
+                    except Exception as e:
+                        logger.exception("[ws] sensor error: %s", e)
+                        return {"ok": False, "error": str(e)}
+
+                async def sensor_reply_stage(sensor_result):
+                    logger.warning("[ws] sensor query=%s", sensor_query)
+                    text = _format_sensor_reply(sensor_result, sensor_query["temperature"], sensor_query["humidity"])
+                    return text, {"sensor_result": sensor_result}, None
+
+                graph.add("sensor", sensor_stage, after=("stt",), fallback={"ok": False, "error": "sensor_timeout"})
+                graph.add("reply", sensor_reply_stage, after=("sensor",))
+            elif music_query:
+                reply_source = "music"
+                graph.add(
+                    "music", lambda _stt_text: self._fetch_music(music_query), after=("stt",),
+                    fallback=({"ok": False, "error": "music_timeout"}, None),
+                )
+                graph.add("reply", lambda fetched: self._music_reply(music_query, fetched), after=("music",))
+            elif _AI_STREAM:
+                # AI text + TTS and playback run side by side, sentence by sentence, each with its own timeout
+                reply_source = "ai_stream"
+                streamed = True
+                history_snapshot = list(self._history)
+                spoken = _StreamedReply()
+
+                async def generate_stage(_stt_text):
+                    await self._generate_streamed(stt_text, history_snapshot, spoken)
+
+                async def speak_stage(_stt_text):
+                    await self._play_streamed(spoken, turn_t0)
+
+                async def streamed_reply_stage(_generated, _played):
+                    return " ".join(spoken.parts), {}, None
+
+                graph.add("ai_stream", generate_stage, after=("stt",), timeout=STAGE_TIMEOUTS["ai"])
+                graph.add("speak", speak_stage, after=("stt",))
+                graph.add("reply", streamed_reply_stage, after=("ai_stream", "speak"))
+            else:
+                reply_source = "ai"
+                history_snapshot = list(self._history)
+
+                async def ai_stage(_stt_text):
+                    return await asyncio.to_thread(_call_ai, stt_text, history_snapshot)
+
+                async def ai_reply_stage(ai_text):
+                    return ai_text, {}, None
+
+                graph.add("ai", ai_stage, after=("stt",), fallback=AI_FALLBACK_REPLY)
+                graph.add("reply", ai_reply_stage, after=("ai",))
+
+            async def history_stage(reply):
+                await self._remember_turn(stt_text, reply[0])
+                logger.warning("[ws] reply done source=%s text_len=%d", reply_source, len(reply[0] or ""))
+
+            async def tts_stage(reply, guess=(None, b"")):
+                text, _fields, audio = reply
+                if audio:
+                    raw = audio
+                    logger.warning("[ws] music audio bytes=%d", len(raw))
+                elif guess[1] and guess[0] == text:
+                    raw = guess[1]
+                    logger.warning("[ws] tts guessed reply used")
+                else:
+                    spoken = self._tts_text(text)
+                    raw = await asyncio.to_thread(tts_text_to_wav_bytes, spoken) if spoken else b""
+                return _add_leading_silence(_normalize_wav_header(raw), TTS_LEAD_SIL_MS) if raw else b""
+
+            async def playback_stage(wav):
+                if esp:
+                    # ESP chỉ cần tín hiệu UI, không nhận audio/text
+                    await self.send(text_data=json.dumps({"type": "speak_start"}))
                 try:
-                    mp3_bytes = await asyncio.to_thread(_jamendo_download_audio, music_result["audio_url"])
-                    music_audio_bytes = await asyncio.to_thread(_ffmpeg_mp3_to_wav_bytes, mp3_bytes)
-                    logger.warning(
-                        "[ws] jamendo audio ok id=%s title=%s bytes=%d",
-                        music_result.get("id"),
-                        music_result.get("title"),
-                        len(music_audio_bytes or b""),
-                    )
-                    if not music_audio_bytes:
-                        music_result = {"ok": False, "error": "empty_audio_bytes"}
+                    if wav:
+                        # Phát cục bộ (winsound/ffplay), ESP chỉ hiển thị UI.
+                        await asyncio.to_thread(_play_wav_bytes_local, wav)
                 except Exception as e:
-                    logger.exception("[ws] jamendo audio fetch failed: %s", e)
-                    music_result = {"ok": False, "error": f"audio_download_failed: {e}"}
+                    logger.warning("[ws] local playback failed: %s", e)
+                finally:
+                    if esp:
+                        await self.send(text_data=json.dumps({"type": "speak_end"}))
+
+            async def result_stage(reply, wav=b""):
+                text, fields, _audio = reply
+                payload = {
+                    "type": "result",
+                    "ok": True,
+                    "stt_text": stt_text,
+                    "ai_text": text,
+                    "device_action": device_action,
+                    "device_result": None,
+                    "sensor_query": sensor_query,
+                    "sensor_result": None,
+                    "music_query": music_query,
+                    "music_result": None,
+                    **fields,
+                    # streamed replies already went out as tts.sentence messages
+                    "audio_b64": base64.b64encode(wav).decode("ascii") if wav else "",
+                    "audio_mime": "audio/wav",
+                }
+                if streamed:
+                    payload["streamed"] = True
+                await self.send(text_data=json.dumps(payload))
+
+            graph.add("history", history_stage, after=("reply",))
+            if not streamed:
+                graph.add("tts", tts_stage, after=tts_after, fallback=b"")
+                graph.add("playback", playback_stage, after=("tts",))
+            if not esp:
+                graph.add("result", result_stage, after=("reply",) if streamed else ("reply", "tts"))
+            await graph.wait()
+        finally:
+            graph.cancel()  # turn cancelled: do not leave stages running
 
-            if music_result and music_result.get("ok"):
-                title = music_result.get("title") or "music"
-                artist = music_result.get("artist") or "Unknown artist"
-                ai_text = f"Playing {title} by {artist} on Jamendo."
-            else:
-                ai_text = f"Sorry, I could not find music for \"{music_query}\" right now."
+        if streamed:
+            first_audio = spoken.first_audio
         else:
-            ai_text = await asyncio.to_thread(_call_ai, stt_text, history_snapshot)
+            first_audio = graph.runs["tts"].end - turn_t0
+        report = graph.report()
+        logger.warning(
+            "[ws] turn source=%s first_audio=%s total=%.0fms critical=%s",
+            reply_source,
+            f"{first_audio:.2f}s" if first_audio is not None else "-",
+            report["total_ms"],
+            ">".join(report["critical_path"]),
+        )
+        if first_audio is not None:
+            turn_latency.record(reply_source, first_audio, report["total_ms"] / 1000.0, report["bottleneck"])
+        if not esp:
+            await self.send(text_data=json.dumps({"type": "turn.report", "source": reply_source, **report}))
+
+        # reset
+        self._pcm.clear()
+        self._prebuf.clear()
+        self._started = False
+
+    def _tts_text(self, text: str) -> str:
+        if self._client != "esp32":
+            return (text or "").strip()
+        esp_tts_text = _shorten_tts_text(text, ESP_INLINE_TTS_MAX_CHARS)
+        if esp_tts_text != (text or "").strip():
+            logger.warning(
+                "[ws] esp tts shortened chars=%d->%d",
+                len((text or "").strip()),
+                len(esp_tts_text),
+            )
+        return esp_tts_text or ""
 
-        user_text = (stt_text or "").strip()
-        assistant_text = (ai_text or "").strip()
+    async def _remember_turn(self, user_text: str, assistant_text: str):
+        user_text = (user_text or "").strip()
+        assistant_text = (assistant_text or "").strip()
         if assistant_text:
             logger.info("[ws] ai_text: %s", assistant_text)
         if user_text and assistant_text:
@@ -404,75 +586,128 @@ class ViAssistantConsumer(AsyncWebsocketConsumer):
                 len(user_text),
                 len(assistant_text),
             )
-        logger.warning("[ws] reply done source=%s text_len=%d", reply_source, len(ai_text or ""))
-
-        result_payload = {
-            "type": "result",
-            "ok": True,
-            "stt_text": stt_text,
-            "ai_text": ai_text,
-            "device_action": device_action,
-            "device_result": device_result,
-            "sensor_query": sensor_query,
-            "sensor_result": sensor_result,
-            "music_query": music_query,
-            "music_result": music_result,
-        }
-
-        tts_bytes = b""
-        if self._client == "esp32":
-            if music_audio_bytes:
-                tts_bytes = _add_leading_silence(_normalize_wav_header(music_audio_bytes), TTS_LEAD_SIL_MS)
-            else:
-                esp_tts_text = _shorten_tts_text(ai_text, ESP_INLINE_TTS_MAX_CHARS)
-                if esp_tts_text != (ai_text or "").strip():
-                    logger.warning(
-                        "[ws] esp tts shortened chars=%d->%d",
-                        len((ai_text or "").strip()),
-                        len(esp_tts_text),
-                    )
-
-                esp_tts_full = esp_tts_text or ""
-                tts_raw = await asyncio.to_thread(tts_text_to_wav_bytes, esp_tts_full) if esp_tts_full else b""
-                tts_bytes = _add_leading_silence(_normalize_wav_header(tts_raw), TTS_LEAD_SIL_MS)
-
-            # ESP chỉ cần tín hiệu UI, không nhận audio/text
-            await self.send(text_data=json.dumps({"type": "speak_start"}))
+
+    async def _fetch_music(self, music_query: str):
+        """Jamendo search + download + decode -> (music_result, wav bytes or None)."""
+        try:
+            music_result = await asyncio.to_thread(_jamendo_search_track, music_query)
+        except Exception as e:
+            logger.exception("[ws] jamendo search failed: %s", e)
+            return {"ok": False, "error": str(e)}, None
+
+        if not (music_result and music_result.get("ok") and music_result.get("audio_url")):
+            return music_result, None
+        try:
+            mp3_bytes = await asyncio.to_thread(_jamendo_download_audio, music_result["audio_url"])
+            music_audio_bytes = await asyncio.to_thread(mp3_to_wav_bytes, mp3_bytes)
+            logger.warning(
+                "[ws] jamendo audio ok id=%s title=%s bytes=%d",
+                music_result.get("id"),
+                music_result.get("title"),
+                len(music_audio_bytes or b""),
+            )
+            if not music_audio_bytes:
+                return {"ok": False, "error": "empty_audio_bytes"}, None
+            return music_result, music_audio_bytes
+        except Exception as e:
+            logger.exception("[ws] jamendo audio fetch failed: %s", e)
+            return {"ok": False, "error": f"audio_download_failed: {e}"}, None
+
+    async def _music_reply(self, music_query: str, fetched):
+        music_result, music_audio_bytes = fetched
+        if music_result and music_result.get("ok"):
+            title = music_result.get("title") or "music"
+            artist = music_result.get("artist") or "Unknown artist"
+            text = f"Playing {title} by {artist} on Jamendo."
+        else:
+            text = f"Sorry, I could not find music for \"{music_query}\" right now."
+        return text, {"music_result": music_result}, music_audio_bytes
+
+    async def _generate_streamed(self, stt_text: str, history: list[dict[str, str]], spoken: _StreamedReply):
+        """
+        AI reply rendered while Ollama is still generating: each sentence goes to TTS as soon as
+        it is complete and is queued for _play_streamed in order. The queue is always closed,
+        also on timeout, so playback ends with what was rendered.
+        """
+        loop = asyncio.get_running_loop()
+        sentences: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def produce():
             try:
-                if tts_bytes:
-                    try:
-                        # Phát cục bộ (winsound/ffplay), ESP chỉ hiển thị UI.
-                        await asyncio.to_thread(_play_wav_bytes_local, tts_bytes)
-                    except Exception as e:
-                        logger.warning("[ws] local playback failed: %s", e)
+                for sentence in _call_ai_stream(stt_text, history):
+                    if stop.is_set():
+                        break  # closes the Ollama request
+                    loop.call_soon_threadsafe(sentences.put_nowait, sentence)
             finally:
-                await self.send(text_data=json.dumps({"type": "speak_end"}))
-        else:
-            if music_audio_bytes:
-                tts_bytes = _add_leading_silence(_normalize_wav_header(music_audio_bytes), TTS_LEAD_SIL_MS)
-                logger.warning("[ws] music audio bytes=%d", len(tts_bytes or b""))
-            else:
-                tts_full = (ai_text or "").strip()
-                tts_raw = await asyncio.to_thread(tts_text_to_wav_bytes, tts_full)
-                tts_bytes = _add_leading_silence(_normalize_wav_header(tts_raw), TTS_LEAD_SIL_MS)
-                logger.warning("[ws] tts done bytes=%d", len(tts_bytes or b""))
-            
-            if tts_bytes:
-                # Phát thẳng ra loa cục bộ (winsound/ffplay)
+                loop.call_soon_threadsafe(sentences.put_nowait, None)
+
+        async def source():
+            producer = asyncio.ensure_future(asyncio.to_thread(produce))
+            try:
+                while (sentence := await sentences.get()) is not None:
+                    yield sentence
+                await producer
+            finally:
+                stop.set()
+
+        rendered = 0
+        stream = tts_sentence_stream(source())
+        try:
+            async for item in stream:
+                spoken.sentences.put_nowait(item)
+                rendered += 1
+        finally:
+            spoken.sentences.put_nowait(None)
+            await stream.aclose()  # stops the Ollama request and pending syntheses
+            logger.warning("[ws] streamed reply rendered sentences=%d", rendered)
+
+    async def _play_streamed(self, spoken: _StreamedReply, turn_t0: float):
+        """
+        Plays queued sentences (and sends them to web clients as tts.sentence) in order. When
+        nothing was rendered (Ollama down or timed out before its first sentence) the turn
+        speaks the same fallback as the non-streamed path instead of ending silent.
+        """
+        esp = self._client == "esp32"
+        try:
+            while (item := await spoken.sentences.get()) is not None:
+                await self._play_sentence(spoken, *item, turn_t0, esp)
+            if not spoken.parts:
+                logger.warning("[ws] streamed reply empty, speaking fallback")
                 try:
-                    await asyncio.to_thread(_play_wav_bytes_local, tts_bytes)
+                    wav = await asyncio.to_thread(tts_text_to_wav_bytes, self._tts_text(AI_FALLBACK_REPLY))
                 except Exception as e:
-                    logger.warning("[ws] local playback failed: %s", e)
-            
-            audio_b64 = base64.b64encode(tts_bytes).decode("ascii") if tts_bytes else ""
-            payload = dict(result_payload)
-            payload.update({"audio_b64": audio_b64, "audio_mime": "audio/wav"})
-            await self.send(text_data=json.dumps(payload))
-
-        # reset
-        self._pcm.clear()
-        self._prebuf.clear()
-        self._started = False
+                    logger.warning("[ws] fallback tts failed: %s", e)
+                    wav = b""
+                await self._play_sentence(spoken, AI_FALLBACK_REPLY, wav, turn_t0, esp)
+        finally:
+            if esp and spoken.first_audio is not None:
+                await self.send(text_data=json.dumps({"type": "speak_end"}))
+        logger.warning("[ws] streamed reply sentences=%d", len(spoken.parts))
+
+    async def _play_sentence(self, spoken: _StreamedReply, text: str, wav: bytes, turn_t0: float, esp: bool):
+        spoken.parts.append(text)
+        if not wav:
+            return  # still recorded as the reply text; nothing to play
+        wav = _normalize_wav_header(wav)
+        if spoken.first_audio is None:
+            wav = _add_leading_silence(wav, TTS_LEAD_SIL_MS)
+            spoken.first_audio = time.monotonic() - turn_t0
+            logger.warning("[ws] first audio after %.2fs", spoken.first_audio)
+            if esp:
+                await self.send(text_data=json.dumps({"type": "speak_start"}))
+        if not esp:
+            await self.send(text_data=json.dumps({
+                "type": "tts.sentence",
+                "index": len(spoken.parts) - 1,
+                "text": text,
+                "audio_b64": base64.b64encode(wav).decode("ascii"),
+                "audio_mime": "audio/wav",
+            }))
+        try:
+            await asyncio.to_thread(_play_wav_bytes_local, wav)
+        except Exception as e:
+            logger.warning("[ws] local playback failed: %s", e)
 
     async def _play_with_cancel_check(self, wav_bytes: bytes) -> bool:
         # Deprecated: Bluetooth playback removed; keep stub for compatibility.
@@ -543,29 +778,13 @@ class ViAssistantConsumer(AsyncWebsocketConsumer):
 
     @staticmethod
     def _wav_to_pcm16_mono(wav_bytes: bytes) -> bytes:
+        """Any-rate/any-channel PCM16 WAV -> 16 kHz mono PCM16 (what tts_start announces)."""
         with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
             channels = wf.getnchannels()
             sampwidth = wf.getsampwidth()
-            nframes = wf.getnframes()
-            raw = wf.readframes(nframes)
+            rate = wf.getframerate()
+            raw = wf.readframes(wf.getnframes())
 
         if sampwidth != 2:
             raise ValueError(f"unsupported sample width: {sampwidth}")
-
-        if channels == 1:
-            return raw
-
-        # Downmix multi-channel 16-bit PCM to mono (simple average).
-        import array
-
-        src = array.array("h")
-        src.frombytes(raw)
-        frame_count = len(src) // channels
-        out = array.array("h", [0] * frame_count)
-        for i in range(frame_count):
-            acc = 0
-            base = i * channels
-            for c in range(channels):
-                acc += src[base + c]
-            out[i] = int(acc / channels)
-        return out.tobytes()
+        return PCMConverter(InputFormat(sample_rate=rate, channels=channels))(raw)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger("viassistant.device_state")
+
+DEVICE_POLL_SEC = float(os.getenv("VI_DEVICE_POLL_SEC", "5"))        # background /status poll; 0 = off
+DEVICE_RELAY_TTL = float(os.getenv("VI_DEVICE_RELAY_TTL", "15"))    # relay states trusted this long
+DEVICE_SENSOR_TTL = float(os.getenv("VI_DEVICE_SENSOR_TTL", "30"))  # DHT reading trusted this long
+DEVICE_POLL_MAX_BACKOFF = 60.0
+
+
+class DeviceState:
+    """
+    Last known esplight state: relay levels and the DHT reading, each with the time it was
+    seen (poller, pushed update, or a relay call made by us), plus the sensor path that
+    answered last. Readers pass a max age, so stale entries fall back to a live request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._relays: dict[str, tuple[int, float]] = {}
+        self._sensor: tuple[dict, float] | None = None
+        self.sensor_path: str | None = None
+        self.batch_relay: bool | None = None  # firmware has GET /relays (None = not tried yet)
+        self.source = ""  # poll / push / relay / request: who wrote last
+
+    def update_relays(self, states: dict[str, int], source: str = "poll", at: float | None = None) -> None:
+        at = time.time() if at is None else at
+        with self._lock:
+            for room, level in states.items():
+                self._relays[room] = (int(level), at)
+            self.source = source
+
+    def update_sensor(self, temperature_c: float, humidity: float, source: str = "poll", at: float | None = None) -> None:
+        reading = {"ok": True, "temperature_c": float(temperature_c), "humidity": float(humidity)}
+        with self._lock:
+            self._sensor = (reading, time.time() if at is None else at)
+            self.source = source
+
+    def relay_states(self, rooms: list[str], max_age: float = DEVICE_RELAY_TTL) -> dict[str, int] | None:
+        """Levels for rooms when every one of them is fresh, else None."""
+        now = time.time()
+        with self._lock:
+            entries = [self._relays.get(room) for room in rooms]
+        if any(e is None or now - e[1] > max_age for e in entries):
+            return None
+        return {room: e[0] for room, e in zip(rooms, entries)}
+
+    def sensor(self, max_age: float = DEVICE_SENSOR_TTL) -> dict | None:
+        with self._lock:
+            if self._sensor is None or time.time() - self._sensor[1] > max_age:
+                return None
+            reading, at = self._sensor
+        return {**reading, "age_sec": round(time.time() - at, 1)}
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "relays": {room: {"state": level, "age_sec": round(now - at, 1)} for room, (level, at) in self._relays.items()},
+                "sensor": {**self._sensor[0], "age_sec": round(now - self._sensor[1], 1)} if self._sensor else None,
+                "sensor_path": self.sensor_path,
+                "batch_relay": self.batch_relay,
+                "source": self.source,
+            }
+
+
+device_state = DeviceState()
+
+
+class DevicePoller:
+    """Daemon thread calling poll() every DEVICE_POLL_SEC; failures back off up to a minute."""
+
+    def __init__(self, poll: Callable[[], None], interval: float = DEVICE_POLL_SEC):
+        self.poll = poll
+        self.interval = interval
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="device-poller", daemon=True)
+
+    def start(self) -> "DevicePoller":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+                if self.failures:
+                    logger.warning("[device] poll recovered after %d failures", self.failures)
+                self.failures = 0
+            except Exception as e:
+                self.failures += 1
+                if self.failures in (1, 10) or self.failures % 100 == 0:
+                    logger.warning("[device] poll failed (%d): %s", self.failures, e)
+            delay = min(DEVICE_POLL_MAX_BACKOFF, self.interval * (2 ** min(self.failures, 4)))
+            self._stop.wait(delay if self.failures else self.interval)
+
+
+_poller: DevicePoller | None = None
+
+
+def start_poller(poll: Callable[[], None], interval: float = DEVICE_POLL_SEC) -> DevicePoller | None:
+    """One poller per process; interval <= 0 leaves the cache to pushes and live requests."""
+    global _poller
+    if interval <= 0 or _poller is not None:
+        return _poller
+    _poller = DevicePoller(poll, interval).start()
+    logger.warning("[device] polling every %.1fs", interval)
+    return _poller
@@ -0,0 +1,114 @@
+"""
+Local stand-in for the esplight node (Viassistantesp/esplight/esplight.ino): same routes and
+reply formats, so the backend can be exercised without hardware.
+
+    python -m viassistant.esp_simulator --port 8081            # current firmware (/relays batch)
+    python -m viassistant.esp_simulator --port 8081 --legacy   # old firmware: per-room /relay only
+
+Point the backend at it with ESP_BASE_URL = "http://127.0.0.1:8081" in settings.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOMS = ("living", "kitchen", "bed", "bathroom", "garden")
+
+
+class SimulatedESP:
+    """Relay pins and a DHT22 that drifts slowly; one request is served at a time like the ESP32 WebServer."""
+
+    def __init__(self, latency: float = 0.05, legacy: bool = False):
+        self.latency = latency
+        self.legacy = legacy
+        self.relays = {room: 0 for room in ROOMS}
+        self.temperature_c = 26.0
+        self.humidity = 60.0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def status_line(self) -> str:
+        return " ".join(f"{room}={self.relays[room]}" for room in ROOMS)
+
+    def handle(self, path: str, query: dict[str, str]) -> tuple[int, str, str]:
+        """(status, content type, body) for one request."""
+        with self._lock:
+            self.requests += 1
+            time.sleep(self.latency)  # WiFi + single-threaded server
+            if path == "/":
+                return 200, "text/plain", "ViAssistant ESP32 is online\nTry: /ping\n"
+            if path == "/ping":
+                return 200, "text/plain", "pong"
+            if path == "/status":
+                self._drift()
+                body = f"{self.status_line()} temp_c={self.temperature_c:.1f} humidity={self.humidity:.1f}"
+                return 200, "text/plain", body
+            if path == "/relay":
+                room, state = query.get("room", ""), query.get("state", "")
+                if room not in self.relays or state not in ("on", "off"):
+                    return 400, "text/plain", "bad_payload"
+                self.relays[room] = 1 if state == "on" else 0
+                return 200, "text/plain", f"ok room={room} state={state}"
+            if path == "/relays" and not self.legacy:
+                pairs = [p.split(":", 1) for p in query.get("set", "").split(",") if p]
+                if not pairs or any(len(p) != 2 or p[0] not in self.relays or p[1] not in ("on", "off") for p in pairs):
+                    return 400, "text/plain", "bad_payload"
+                for room, state in pairs:
+                    self.relays[room] = 1 if state == "on" else 0
+                return 200, "text/plain", self.status_line()
+            if path in ("/dht", "/sensor"):
+                self._drift()
+                body = {"ok": True, "temperature_c": round(self.temperature_c, 1), "humidity": round(self.humidity, 1)}
+                return 200, "application/json", json.dumps(body)
+            return 404, "text/plain", f"Not found: {path}"
+
+    def _drift(self):
+        self.temperature_c = min(35.0, max(18.0, self.temperature_c + random.uniform(-0.1, 0.1)))
+        self.humidity = min(90.0, max(30.0, self.humidity + random.uniform(-0.3, 0.3)))
+
+
+def make_server(device: SimulatedESP, host: str = "127.0.0.1", port: int = 8081) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            status, content_type, body = device.handle(url.path, query)
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            print(f"[esp-sim] {self.address_string()} {fmt % args}")
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m viassistant.esp_simulator", description=__doc__.split("\n\n")[0].strip())
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency", type=float, default=0.05, help="seconds added to every request")
+    ap.add_argument("--legacy", action="store_true", help="no /relays batch endpoint (old firmware)")
+    args = ap.parse_args(argv)
+
+    server = make_server(SimulatedESP(args.latency, args.legacy), args.host, args.port)
+    print(f"[esp-sim] http://{args.host}:{args.port} legacy={args.legacy} latency={args.latency}s")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger("viassistant.stages")
+
+
+def _env_timeout(name: str, default: float) -> float | None:
+    value = float(os.getenv(name, str(default)))
+    return value if value > 0 else None  # 0 = no limit
+
+
+# per-stage limits (seconds) for the voice turn
+STAGE_TIMEOUTS = {
+    "stt": _env_timeout("VI_STAGE_TIMEOUT_STT", 60),
+    "relay": _env_timeout("VI_STAGE_TIMEOUT_RELAY", 10),
+    "sensor": _env_timeout("VI_STAGE_TIMEOUT_SENSOR", 10),
+    "music": _env_timeout("VI_STAGE_TIMEOUT_MUSIC", 45),
+    "ai": _env_timeout("VI_STAGE_TIMEOUT_AI", 150),
+    "speak": _env_timeout("VI_STAGE_TIMEOUT_SPEAK", 180),  # streamed reply playback, sentence by sentence
+    "tts": _env_timeout("VI_STAGE_TIMEOUT_TTS", 20),
+    "history": _env_timeout("VI_STAGE_TIMEOUT_HISTORY", 5),
+    "result": _env_timeout("VI_STAGE_TIMEOUT_RESULT", 10),
+    "playback": _env_timeout("VI_STAGE_TIMEOUT_PLAYBACK", 0),  # music can be minutes long
+}
+
+
+@dataclass
+class StageRun:
+    name: str
+    after: tuple[str, ...]
+    timeout: float | None
+    start: float | None = None
+    end: float | None = None
+    status: str = "pending"  # ok / timeout / error / cancelled
+    error: str = ""
+
+
+class StageGraph:
+    """
+    One voice turn as a small DAG of async stages. A stage starts as soon as every stage
+    in `after` has finished (whatever its outcome) and gets their results as arguments,
+    so independent I/O overlaps. Each stage has its own timeout; on timeout or error it
+    yields `fallback` instead of failing the turn. report() gives per-stage timings and
+    the critical path: the chain of stages that gated the end of the turn.
+    """
+
+    def __init__(self, t0: float | None = None):
+        self.t0 = time.monotonic() if t0 is None else t0
+        self.runs: dict[str, StageRun] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[..., Awaitable[Any]],
+        after: tuple[str, ...] = (),
+        timeout: float | None = None,
+        fallback: Any = None,
+    ) -> asyncio.Task:
+        """Schedule fn(*results of `after`); timeout defaults to STAGE_TIMEOUTS[name]."""
+        if name in self.runs:
+            raise ValueError(f"duplicate stage: {name}")
+        for dep in after:
+            if dep not in self._tasks:
+                raise KeyError(f"unknown stage: {dep}")
+        run = StageRun(name, tuple(after), timeout if timeout is not None else STAGE_TIMEOUTS.get(name))
+        self.runs[name] = run
+        self._tasks[name] = asyncio.ensure_future(self._run(run, fn, fallback))
+        return self._tasks[name]
+
+    async def _run(self, run: StageRun, fn, fallback):
+        args = [await self._tasks[dep] for dep in run.after]
+        run.start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(*args), run.timeout)
+            run.status = "ok"
+            return result
+        except asyncio.TimeoutError:
+            run.status = "timeout"
+            logger.warning("[stage] %s timed out after %.1fs", run.name, run.timeout)
+            return fallback
+        except asyncio.CancelledError:
+            run.status = "cancelled"
+            raise
+        except Exception as e:
+            run.status, run.error = "error", str(e)
+            logger.exception("[stage] %s failed", run.name)
+            return fallback
+        finally:
+            run.end = time.monotonic()
+
+    async def result(self, name: str):
+        return await self._tasks[name]
+
+    async def wait(self) -> None:
+        await asyncio.gather(*self._tasks.values())
+
+    def cancel(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+
+    def critical_path(self) -> list[StageRun]:
+        done = [r for r in self.runs.values() if r.end is not None]
+        if not done:
+            return []
+        run = max(done, key=lambda r: r.end)
+        path = [run]
+        while run.after:
+            run = max((self.runs[d] for d in run.after), key=lambda r: r.end or 0.0)
+            path.append(run)
+        return path[::-1]
+
+    def report(self) -> dict:
+        def ms(a: float | None, b: float | None) -> float | None:
+            return round((b - a) * 1000.0, 1) if a is not None and b is not None else None
+
+        path = self.critical_path()
+        bottleneck = max(path, key=lambda r: r.end - r.start, default=None)
+        return {
+            "total_ms": ms(self.t0, path[-1].end) if path else 0.0,
+            "critical_path": [r.name for r in path],
+            "bottleneck": bottleneck.name if bottleneck else None,
+            "stages": {
+                r.name: {
+                    "start_ms": ms(self.t0, r.start),
+                    "ms": ms(r.start, r.end),
+                    "status": r.status,
+                    **({"error": r.error} if r.error else {}),
+                }
+                for r in self.runs.values()
+            },
+        }
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger("viassistant.tts_cache")
+
+TTS_CACHE_DIR = Path(os.getenv("VI_TTS_CACHE_DIR") or Path(__file__).resolve().parent / "tts_cache")
+TTS_CACHE_MEM_MB = float(os.getenv("VI_TTS_CACHE_MEM_MB", "32"))
+TTS_CACHE_DISK_MB = float(os.getenv("VI_TTS_CACHE_DISK_MB", "256"))  # 0 = memory only
+
+
+def cache_key(voice: str, rate: str, pitch: str, volume: str, text: str) -> str:
+    """Content address of one rendering: every field that changes the audio."""
+    raw = json.dumps([voice, rate, pitch, volume, text], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Rendered WAV bytes by cache_key: an in-memory LRU in front of an on-disk LRU
+    (one <key>.wav per entry, file mtime = last use). Both are bounded in bytes.
+    """
+
+    def __init__(self, directory: Path = TTS_CACHE_DIR, mem_mb: float = TTS_CACHE_MEM_MB, disk_mb: float = TTS_CACHE_DISK_MB):
+        self.directory = Path(directory)
+        self.mem_limit = int(mem_mb * 1024 * 1024)
+        self.disk_limit = int(disk_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._mem: OrderedDict[str, bytes] = OrderedDict()
+        self._mem_bytes = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()  # key -> size, least recently used first
+        self._disk_bytes = 0
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        if self.disk_limit > 0:
+            self._scan()
+
+    def _scan(self):
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = sorted(self.directory.glob("*.wav"), key=lambda p: p.stat().st_mtime)
+        except OSError as e:
+            logger.warning("[tts-cache] disk cache disabled: %s", e)
+            self.disk_limit = 0
+            return
+        for path in files:
+            size = path.stat().st_size
+            self._disk[path.stem] = size
+            self._disk_bytes += size
+        self._unlink(self._trim_disk())  # limit lowered since the last run
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.wav"
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            if (wav := self._mem.get(key)) is not None:
+                self._mem.move_to_end(key)
+                self.hits["memory"] += 1
+                return wav
+            on_disk = key in self._disk
+        if on_disk:
+            try:
+                wav = self._path(key).read_bytes()
+                os.utime(self._path(key))
+            except OSError:
+                wav = None
+            if wav:
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self.hits["disk"] += 1
+                    self._remember(key, wav)
+                return wav
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, wav: bytes) -> None:
+        if not wav:
+            return
+        with self._lock:
+            self._remember(key, wav)
+            if self.disk_limit <= 0 or key in self._disk or len(wav) > self.disk_limit:
+                return
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        try:
+            tmp.write_bytes(wav)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("[tts-cache] write failed %s: %s", path.name, e)
+            return
+        with self._lock:
+            self._disk[key] = len(wav)
+            self._disk_bytes += len(wav)
+            evicted = self._trim_disk()
+        self._unlink(evicted)
+
+    def _trim_disk(self) -> list[str]:
+        evicted = []
+        while self._disk_bytes > self.disk_limit and len(self._disk) > 1:
+            old, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            evicted.append(old)
+        return evicted
+
+    def _unlink(self, keys: list[str]) -> None:
+        for key in keys:
+            self._path(key).unlink(missing_ok=True)
+
+    def _remember(self, key: str, wav: bytes) -> None:
+        if len(wav) > self.mem_limit:
+            return
+        if key in self._mem:
+            self._mem.move_to_end(key)
+            return
+        self._mem[key] = wav
+        self._mem_bytes += len(wav)
+        while self._mem_bytes > self.mem_limit:
+            _, old = self._mem.popitem(last=False)
+            self._mem_bytes -= len(old)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._mem or key in self._disk
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "memory_entries": len(self._mem),
+                "memory_mb": round(self._mem_bytes / 1024 / 1024, 2),
+                "disk_entries": len(self._disk),
+                "disk_mb": round(self._disk_bytes / 1024 / 1024, 2),
+            }
+
+
+tts_cache = TTSCache()
@@ -4,4 +4,6 @@ from . import views
 urlpatterns = [
     path("api/voice", views.voice),
     path("api/voice/", views.voice),
+    path("api/voice/stats", views.voice_stats),
+    path("api/device/state", views.device_state_view),
 ]
@@ -1,39 +1,61 @@
 from __future__ import annotations
 
 import base64
-import os
-import tempfile
+import io
+import json
 import wave
 import time
 import logging
 
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 
 from .assistant_logic import (
+    _apply_device_push,
     _call_ai,
     _call_esp_relay,
     _call_esp_sensor,
     _detect_device_command,
     _detect_sensor_query,
+    _is_command_text,
+    _stt_bias,
     _format_device_reply,
     _format_sensor_reply,
 )
-from .voice_pipeline import STTConfig, stt_wav_to_text, tts_text_to_wav_bytes
+from .voice_pipeline import (
+    STT_COMMAND_PROFILE,
+    STTConfig,
+    stt_pcm_to_text,
+    stt_wav_to_text,
+    tts_text_to_wav_bytes,
+    turn_latency,
+)
+from .device_state import device_state
+from .tts_cache import tts_cache
 
 logger = logging.getLogger("viassistant")
 
 
-def _read_wav_info(path: str) -> dict:
-    with wave.open(path, "rb") as wf:
-        return {
+def _read_wav(data: bytes) -> tuple[dict, bytes]:
+    with wave.open(io.BytesIO(data), "rb") as wf:
+        info = {
             "channels": wf.getnchannels(),
             "sample_width": wf.getsampwidth(),
             "sample_rate": wf.getframerate(),
             "frames": wf.getnframes(),
             "duration_sec": wf.getnframes() / float(wf.getframerate() or 1),
         }
+        frames = wf.readframes(wf.getnframes())
+    return info, frames
+
+
+def _is_whisper_native(wav_info: dict) -> bool:
+    return (
+        wav_info["channels"] == 1
+        and wav_info["sample_width"] == 2
+        and wav_info["sample_rate"] == 16000
+    )
 
 
 @csrf_exempt
@@ -48,103 +70,127 @@ def voice(request):
     if not audio:
         return JsonResponse({"ok": False, "error": "missing_audio"}, status=400)
 
-    tmp_path = None
+    data = audio.read()
     try:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-            tmp_path = tmp.name
-            for chunk in audio.chunks():
-                tmp.write(chunk)
+        wav_info, frames = _read_wav(data)
+    except (wave.Error, EOFError) as e:
+        return JsonResponse({"ok": False, "error": f"bad_wav: {e}"}, status=400)
+
+    t0 = time.time()
+    logger.warning("[voice] start request")
+
+    cfg = STTConfig(language=language, **STT_COMMAND_PROFILE)
+    if (bias := _stt_bias(language)) is not None:
+        cfg = bias.apply(cfg)
+    if _is_whisper_native(wav_info):
+        # 16 kHz mono PCM16: feed the frames straight to whisper, no temp file
+        stt_text = stt_pcm_to_text(frames, cfg, _is_command_text)
+    else:
+        # other layouts: let faster-whisper decode/resample the in-memory file
+        stt_text = stt_wav_to_text(io.BytesIO(data), cfg)
+    logger.warning("[voice] stt done (%.2fs)", time.time() - t0)
+    if not stt_text:
+        return JsonResponse(
+            {"ok": False, "error": "stt_empty", "wav_info": wav_info},
+            status=200,
+        )
 
+    device_action = _detect_device_command(stt_text)
+    sensor_query = _detect_sensor_query(stt_text)
+    device_target = None
+    device_result = None
+    sensor_result = None
+    if device_action:
+        device_target = device_action.get("rooms") or device_action.get("room")
         try:
-            wav_info = _read_wav_info(tmp_path)
-        except wave.Error as e:
-            return JsonResponse({"ok": False, "error": f"bad_wav: {e}"}, status=400)
-
-        t0 = time.time()
-        logger.warning("[voice] start request")
-
-        cfg = STTConfig(language=language)
-        stt_text = stt_wav_to_text(tmp_path, cfg)
-        logger.warning("[voice] stt done (%.2fs)", time.time() - t0)
-        if not stt_text:
+            device_result = _call_esp_relay(device_target, device_action["state"])
+        except Exception as e:
+            device_result = {"ok": False, "error": str(e)}
+    logger.warning("[voice] device done (%.2fs)", time.time() - t0)
+
+    reply_source = "ai"
+    if device_action:
+        reply_source = "device"
+        ai_text = _format_device_reply(device_target, device_action["state"])
+    elif sensor_query:
+        reply_source = "sensor"
+        try:
+            sensor_result = _call_esp_sensor()
+        except Exception as e:
+            logger.exception("[voice] sensor error: %s", e)
+            sensor_result = {"ok": False, "error": str(e)}
+        ai_text = _format_sensor_reply(
+            sensor_result,
+            sensor_query["temperature"],
+            sensor_query["humidity"],
+        )
+        logger.warning("[voice] sensor done (%.2fs)", time.time() - t0)
+    else:
+        try:
+            ai_text = _call_ai(stt_text)
+        except Exception as e:
+            logger.exception("[voice] ai error: %s", e)
             return JsonResponse(
-                {"ok": False, "error": "stt_empty", "wav_info": wav_info},
+                {
+                    "ok": False,
+                    "error": "ai_error",
+                    "detail": str(e),
+                    "stt_text": stt_text,
+                    "device_action": device_action,
+                    "device_result": device_result,
+                    "sensor_query": sensor_query,
+                    "sensor_result": sensor_result,
+                },
                 status=200,
             )
+    logger.warning("[voice] reply done source=%s (%.2fs)", reply_source, time.time() - t0)
+
+    tts_bytes = tts_text_to_wav_bytes(ai_text)
+    logger.warning("[voice] tts done (%.2fs)", time.time() - t0)
+    # HTTP replies arrive in one piece: first audio == whole turn
+    turn_latency.record(f"http_{reply_source}", time.time() - t0, time.time() - t0)
+
+    audio_b64 = base64.b64encode(tts_bytes).decode("ascii") if tts_bytes else ""
+
+    return JsonResponse(
+        {
+            "ok": True,
+            "stt_text": stt_text,
+            "ai_text": ai_text,
+            "audio_b64": audio_b64,
+            "audio_mime": "audio/wav",
+            "wav_info": wav_info,
+            "device_action": device_action,
+            "device_result": device_result,
+            "sensor_query": sensor_query,
+            "sensor_result": sensor_result,
+        },
+        status=200,
+    )
+
+
+@require_GET
+def voice_stats(request):
+    """Time-to-first-audio per reply source (ai_stream, ai, device, sensor, music, http_*) and TTS cache hits."""
+    return JsonResponse({"turn_latency": turn_latency.stats(), "tts_cache": tts_cache.stats()})
 
-        device_action = _detect_device_command(stt_text)
-        sensor_query = _detect_sensor_query(stt_text)
-        device_target = None
-        device_result = None
-        sensor_result = None
-        if device_action:
-            device_target = device_action.get("rooms") or device_action.get("room")
-            try:
-                device_result = _call_esp_relay(device_target, device_action["state"])
-            except Exception as e:
-                device_result = {"ok": False, "error": str(e)}
-        logger.warning("[voice] device done (%.2fs)", time.time() - t0)
-
-        reply_source = "ai"
-        if device_action:
-            reply_source = "device"
-            ai_text = _format_device_reply(device_target, device_action["state"])
-        elif sensor_query:
-            reply_source = "sensor"
-            try:
-                sensor_result = _call_esp_sensor()
-            except Exception as e:
-                logger.exception("[voice] sensor error: %s", e)
-                sensor_result = {"ok": False, "error": str(e)}
-            ai_text = _format_sensor_reply(
-                sensor_result,
-                sensor_query["temperature"],
-                sensor_query["humidity"],
-            )
-            logger.warning("[voice] sensor done (%.2fs)", time.time() - t0)
-        else:
-            try:
-                ai_text = _call_ai(stt_text)
-            except Exception as e:
-                logger.exception("[voice] ai error: %s", e)
-                return JsonResponse(
-                    {
-                        "ok": False,
-                        "error": "ai_error",
-                        "detail": str(e),
-                        "stt_text": stt_text,
-                        "device_action": device_action,
-                        "device_result": device_result,
-                        "sensor_query": sensor_query,
-                        "sensor_result": sensor_result,
-                    },
-                    status=200,
-                )
-        logger.warning("[voice] reply done source=%s (%.2fs)", reply_source, time.time() - t0)
-
-        tts_bytes = tts_text_to_wav_bytes(ai_text)
-        logger.warning("[voice] tts done (%.2fs)", time.time() - t0)
-
-        audio_b64 = base64.b64encode(tts_bytes).decode("ascii") if tts_bytes else ""
 
-        return JsonResponse(
-            {
-                "ok": True,
-                "stt_text": stt_text,
-                "ai_text": ai_text,
-                "audio_b64": audio_b64,
-                "audio_mime": "audio/wav",
-                "wav_info": wav_info,
-                "device_action": device_action,
-                "device_result": device_result,
-                "sensor_query": sensor_query,
-                "sensor_result": sensor_result,
-            },
-            status=200,
-        )
-    finally:
-        if tmp_path:
-            try:
-                os.remove(tmp_path)
-            except Exception:
-                pass
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def device_state_view(request):
+    """
+    GET: cached esplight state (relays, DHT reading, ages). POST: push an update, either
+    JSON ({"status": "<GET /status text>"} or {"living": 1, "temp_c": 24.5, ...}) or form fields.
+    """
+    if request.method == "POST":
+        try:
+            payload = json.loads(request.body or b"{}") if request.content_type == "application/json" else request.POST.dict()
+        except ValueError:
+            return JsonResponse({"ok": False, "error": "bad_json"}, status=400)
+        if not isinstance(payload, dict):
+            return JsonResponse({"ok": False, "error": "bad_payload"}, status=400)
+        taken = _apply_device_push(payload)
+        if not taken["relays"] and not taken["sensor"]:
+            return JsonResponse({"ok": False, "error": "no_state_fields"}, status=400)
+        return JsonResponse({"ok": True, **taken})
+    return JsonResponse({"ok": True, **device_state.snapshot()})
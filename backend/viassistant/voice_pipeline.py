@@ -1,26 +1,72 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import Counter, deque
+from dataclasses import dataclass, replace
+from typing import AsyncIterator, Callable
 
 import asyncio
 import logging
 import os
-import subprocess
+import re
+import threading
+import time
 
-from stt_engine.config import WhisperConfig
-from stt_engine.whisper_gpu import transcribe_wav
+import numpy as np
+
+from stt_engine.config import STT_ENGINE, WhisperConfig
+from stt_engine.engines import get_engine
+from stt_engine.language import STT_LANG_LOCK_PROB, LanguageLock
+from stt_engine.preprocess import make_preprocessor
+from stt_engine.profiles import profile_overrides
+from stt_engine.remote import get_remote_client
+from stt_engine.scheduler import INTERACTIVE_COMMAND, get_scheduler
+from stt_engine.whisper_gpu import TranscriptResult, TranscriptSegment, transcribe_wav
+
+from .audio_codec import make_decoder, pcm16_to_wav_bytes
+from .tts_cache import cache_key, tts_cache
 
 logger = logging.getLogger("viassistant.tts")
 
+# Two-tier command STT: a fast greedy pass first, the accurate pass only when needed
+STT_CASCADE = (os.getenv("VI_STT_CASCADE") or "1").strip().lower() not in ("0", "false", "no", "off")
+STT_FAST_MODEL = (os.getenv("VI_STT_FAST_MODEL") or "small").strip()
+STT_FAST_MIN_LOGPROB = float(os.getenv("VI_STT_FAST_MIN_LOGPROB", "-0.5"))   # worst segment avg_logprob
+STT_FAST_MAX_NO_SPEECH = float(os.getenv("VI_STT_FAST_MAX_NO_SPEECH", "0.3"))
+# with the command vocabulary biased in (initial_prompt/hotwords) a narrow beam is enough
+STT_BEAM_SIZE = int(os.getenv("VI_STT_BEAM_SIZE", "2"))
+# autotuned fields for voice turns (python -m stt_engine.autotune); {} = STTConfig defaults
+STT_COMMAND_PROFILE = profile_overrides("viassistant_command")
+# concurrent sentence syntheses for streamed replies
+TTS_STREAM_PARALLEL = int(os.getenv("VI_TTS_STREAM_PARALLEL", "2"))
+
 
 @dataclass
 class STTConfig:
+    engine: str = STT_ENGINE      # faster-whisper / whisper.cpp (stt_engine/engines)
     model_size: str = "medium"
-    device: str = "cuda"
-    compute_type: str = "float16"
+    device: str = "auto"          # auto = cuda if usable, else cpu (stt_engine/hardware.py)
+    compute_type: str = "auto"
     language: str | None = "en"
     vad_filter: bool = False
-    beam_size: int = 30
+    beam_size: int = STT_BEAM_SIZE
+    cpu_threads: int = 0          # 0 = derive from core count
+    num_workers: int = 0
+    initial_prompt: str | None = None  # set via stt_engine.biasing.BiasProfile.apply
+    hotwords: str | None = None
+    preprocess: bool = True  # DC removal / high-pass / auto-gain before whisper
+    cascade: bool = STT_CASCADE
+    fast_model_size: str = STT_FAST_MODEL
+    fast_beam_size: int = 1  # greedy
+
+
+@dataclass
+class STTOutcome:
+    text: str
+    tier: str                # "fast" | "accurate"
+    reason: str = ""         # why the fast result was accepted / escalated
+    fast_text: str = ""
+    fast_sec: float = 0.0
+    accurate_sec: float = 0.0
 
 
 @dataclass
@@ -30,10 +76,12 @@ class TTSConfig:
     edge_pitch: str = (os.getenv("VI_EDGE_TTS_PITCH") or "+0Hz").strip()
     edge_volume: str = (os.getenv("VI_EDGE_TTS_VOLUME") or "+0%").strip()
 
-async def _edge_tts_to_mp3_bytes(text: str, cfg: TTSConfig) -> bytes:
+async def tts_text_to_pcm_stream(text: str, cfg: TTSConfig | None = None) -> AsyncIterator[bytes]:
+    """edge-tts MP3 decoded while it downloads: 16 kHz mono PCM16 chunks as frames come out."""
     # Lazy import so server can still start even if edge_tts is missing.
     import edge_tts  # type: ignore
 
+    cfg = cfg or TTSConfig()
     communicate = edge_tts.Communicate(
         text=text,
         voice=cfg.edge_voice,
@@ -42,64 +90,182 @@ async def _edge_tts_to_mp3_bytes(text: str, cfg: TTSConfig) -> bytes:
         pitch=cfg.edge_pitch,
     )
 
-    out = bytearray()
-    async for chunk in communicate.stream():
-        if chunk.get("type") == "audio":
-            out.extend(chunk["data"])
-    return bytes(out)
-
+    decoder = make_decoder("mp3")
+    try:
+        async for chunk in communicate.stream():
+            if chunk.get("type") == "audio" and (pcm := decoder.feed(chunk["data"])):
+                yield pcm
+        if pcm := decoder.flush():
+            yield pcm
+    finally:
+        decoder.close()  # also when edge-tts fails or the consumer stops iterating
 
-def _ffmpeg_mp3_to_wav_bytes(mp3_bytes: bytes) -> bytes:
-    if not mp3_bytes:
-        return b""
 
-    cmd = [
-        "ffmpeg",
-        "-hide_banner",
-        "-loglevel",
-        "error",
-        "-f",
-        "mp3",
-        "-i",
-        "pipe:0",
-        "-ac",
-        "1",
-        "-ar",
-        "16000",
-        "-c:a",
-        "pcm_s16le",
-        "-f",
-        "wav",
-        "pipe:1",
-    ]
-    p = subprocess.run(
-        cmd,
-        input=mp3_bytes,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        check=False,
-    )
-    if p.returncode != 0:
-        err = (p.stderr or b"").decode("utf-8", errors="ignore").strip()
-        raise RuntimeError(f"ffmpeg convert failed rc={p.returncode}: {err}")
-    return p.stdout
+async def _edge_tts_to_pcm_bytes(text: str, cfg: TTSConfig) -> bytes:
+    out = bytearray()
+    async for pcm in tts_text_to_pcm_stream(text, cfg):
+        out.extend(pcm)
+    return bytes(out)
 
 
 def _tts_text_to_wav_bytes_edge(text: str, cfg: TTSConfig) -> bytes:
-    mp3_bytes = asyncio.run(_edge_tts_to_mp3_bytes(text, cfg))
-    return _ffmpeg_mp3_to_wav_bytes(mp3_bytes)
+    return pcm16_to_wav_bytes(asyncio.run(_edge_tts_to_pcm_bytes(text, cfg)))
 
 
-def stt_wav_to_text(wav_path: str, cfg: STTConfig) -> str:
-    whisper_cfg = WhisperConfig(
+def _whisper_cfg(cfg: STTConfig) -> WhisperConfig:
+    return WhisperConfig(
+        engine=cfg.engine,
         model_size=cfg.model_size,
         device=cfg.device,
         compute_type=cfg.compute_type,
         language=cfg.language,
         vad_filter=cfg.vad_filter,
         beam_size=cfg.beam_size,
+        cpu_threads=cfg.cpu_threads,
+        num_workers=cfg.num_workers,
+        initial_prompt=cfg.initial_prompt,
+        hotwords=cfg.hotwords,
     )
-    return (transcribe_wav(wav_path, whisper_cfg) or "").strip()
+
+
+def stt_wav_to_text(wav_path, cfg: STTConfig) -> str:
+    remote = get_remote_client()
+    if remote is not None:
+        # decoded by the shared STT server; this worker never loads a model
+        if isinstance(wav_path, (str, os.PathLike)):
+            with open(wav_path, "rb") as f:
+                data = f.read()
+        else:
+            data = wav_path.read()
+        return (remote.transcribe_file(data, _whisper_cfg(cfg)).text or "").strip()
+    return (transcribe_wav(wav_path, _whisper_cfg(cfg)) or "").strip()
+
+
+def _preprocess(pcm, cfg: STTConfig):
+    if cfg.preprocess and getattr(pcm, "dtype", None) != "float32":
+        pre = make_preprocessor()
+        pcm = pre.process(pcm)
+        logger.debug("[stt] preprocess %s", pre.stats())
+    return pcm
+
+
+_PROMPT_NORM_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def _norm_prompt_text(text: str | None) -> str:
+    return " ".join(_PROMPT_NORM_RE.sub(" ", (text or "").lower()).split())
+
+
+def _echoes_prompt(text: str, cfg: WhisperConfig) -> bool:
+    """Whisper repeating its initial_prompt/hotwords (typical on silence or noise)."""
+    norm = _norm_prompt_text(text)
+    return bool(norm) and any(norm in _norm_prompt_text(p) for p in (cfg.initial_prompt, cfg.hotwords) if p)
+
+
+def _fast_pass_verdict(
+    result: TranscriptResult, text: str, accept: Callable[[str], bool], cfg: WhisperConfig
+) -> str | None:
+    """Reason the fast result can be kept, or None to escalate."""
+    if not text or not result.segments:
+        return None
+    if _echoes_prompt(text, cfg):
+        return None
+    if not get_engine(cfg.engine).capabilities.confidence:
+        return None  # e.g. whisper.cpp: no no_speech_prob, logprob often missing -> cannot vouch for it
+    worst_logprob = min(seg.avg_logprob for seg in result.segments)
+    worst_no_speech = max(seg.no_speech_prob for seg in result.segments)
+    if worst_logprob < STT_FAST_MIN_LOGPROB or worst_no_speech > STT_FAST_MAX_NO_SPEECH:
+        return None
+    if not accept(text):
+        return None
+    return f"intent logprob={worst_logprob:.2f} no_speech={worst_no_speech:.2f}"
+
+
+def _locked(cfg: WhisperConfig, lang_lock: LanguageLock | None) -> WhisperConfig:
+    return lang_lock.apply(cfg) if lang_lock is not None and cfg.language is None else cfg
+
+
+def _observe_language(lang_lock: LanguageLock | None, result: TranscriptResult, cfg: WhisperConfig):
+    if lang_lock is not None:
+        lang_lock.observe(result, result.duration, get_engine(cfg.engine).capabilities.confidence)
+
+
+def stt_pcm_cascade(
+    pcm,
+    cfg: STTConfig,
+    accept: Callable[[str], bool],
+    on_segment: Callable[[TranscriptSegment], None] | None = None,
+    lang_lock: LanguageLock | None = None,
+) -> STTOutcome:
+    """
+    Fast greedy pass (fast_model_size, beam fast_beam_size); its text is kept when accept(text)
+    (e.g. it parses as a device/sensor command) and every segment is confident.
+    Otherwise the configured accurate model runs on the same audio.
+    on_segment sees the segments of both passes as they are decoded.
+    With language=None the accurate pass reuses the language the fast pass detected on this
+    same audio when it is confident (no duration/agreement gate, unlike the session lang_lock).
+    """
+    pcm = _preprocess(pcm, cfg)
+    sched = get_scheduler()
+    whisper_cfg = _whisper_cfg(cfg)
+
+    t0 = time.perf_counter()
+    fast_cfg = replace(whisper_cfg, model_size=cfg.fast_model_size, beam_size=max(1, cfg.fast_beam_size))
+    fast = sched.transcribe(pcm, _locked(fast_cfg, lang_lock), on_segment=on_segment, priority=INTERACTIVE_COMMAND)
+    _observe_language(lang_lock, fast, fast_cfg)
+    fast_text = (fast.text or "").strip()
+    fast_sec = time.perf_counter() - t0
+
+    reason = _fast_pass_verdict(fast, fast_text, accept, fast_cfg)
+    if reason:
+        return STTOutcome(text=fast_text, tier="fast", reason=reason, fast_text=fast_text, fast_sec=fast_sec)
+
+    t1 = time.perf_counter()
+    accurate_cfg = _locked(whisper_cfg, lang_lock)
+    if accurate_cfg.language is None and fast.language and fast.language_probability >= STT_LANG_LOCK_PROB:
+        accurate_cfg = replace(accurate_cfg, language=fast.language)  # skip detecting again
+    result = sched.transcribe(pcm, accurate_cfg, on_segment=on_segment, priority=INTERACTIVE_COMMAND)
+    _observe_language(lang_lock, result, accurate_cfg)
+    return STTOutcome(
+        text=(result.text or "").strip(),
+        tier="accurate",
+        reason="escalated",
+        fast_text=fast_text,
+        fast_sec=fast_sec,
+        accurate_sec=time.perf_counter() - t1,
+    )
+
+
+def stt_pcm_to_text(
+    pcm,
+    cfg: STTConfig,
+    accept: Callable[[str], bool] | None = None,
+    on_segment: Callable[[TranscriptSegment], None] | None = None,
+    lang_lock: LanguageLock | None = None,
+) -> str:
+    """
+    16 kHz mono PCM16 (bytes-like) or float32 array -> text, fully in memory.
+    With accept (and cfg.cascade), runs the two-tier cascade, see stt_pcm_cascade.
+    on_segment (called from the decode thread) gets each segment as soon as it is decoded.
+    lang_lock (language=None only) carries the detected language across a session's turns.
+    """
+    if accept is not None and cfg.cascade and cfg.fast_model_size != cfg.model_size:
+        out = stt_pcm_cascade(pcm, cfg, accept, on_segment, lang_lock)
+        logger.warning(
+            "[stt] cascade tier=%s %s fast=%.2fs accurate=%.2fs",
+            out.tier, out.reason, out.fast_sec, out.accurate_sec,
+        )
+        return out.text
+    whisper_cfg = _locked(_whisper_cfg(cfg), lang_lock)
+    result = get_scheduler().transcribe(
+        _preprocess(pcm, cfg), whisper_cfg, on_segment=on_segment, priority=INTERACTIVE_COMMAND,
+    )
+    _observe_language(lang_lock, result, whisper_cfg)
+    return (result.text or "").strip()
+
+
+def _tts_key(text: str, cfg: TTSConfig) -> str:
+    return cache_key(cfg.edge_voice, cfg.edge_rate, cfg.edge_pitch, cfg.edge_volume, text)
 
 
 def tts_text_to_wav_bytes(text: str, cfg: TTSConfig | None = None) -> bytes:
@@ -108,11 +274,114 @@ def tts_text_to_wav_bytes(text: str, cfg: TTSConfig | None = None) -> bytes:
     if not text:
         return b""
 
+    key = _tts_key(text, cfg)
+    if (wav := tts_cache.get(key)) is not None:
+        return wav
     try:
-        return _tts_text_to_wav_bytes_edge(text, cfg)
+        wav = _tts_text_to_wav_bytes_edge(text, cfg)
     except Exception as e:
         logger.exception("[tts] edge-tts failed: %s", e)
         raise
+    tts_cache.put(key, wav)
+    return wav
+
+
+def prewarm_tts(texts, cfg: TTSConfig | None = None) -> int:
+    """Render every text not cached yet (canned replies at startup); returns how many were rendered."""
+    cfg = cfg or TTSConfig()
+    rendered = 0
+    for text in dict.fromkeys(t.strip() for t in texts if t and t.strip()):
+        if _tts_key(text, cfg) in tts_cache:
+            continue
+        try:
+            tts_text_to_wav_bytes(text, cfg)
+            rendered += 1
+        except Exception as e:
+            logger.warning("[tts] prewarm stopped after %d: %s", rendered, e)
+            break
+    return rendered
+
+
+async def tts_sentence_stream(
+    sentences: AsyncIterator[str], cfg: TTSConfig | None = None
+) -> AsyncIterator[tuple[str, bytes]]:
+    """
+    (sentence, wav) in order. Synthesis starts as soon as a sentence arrives (at most
+    TTS_STREAM_PARALLEL at once), so sentence n+1 is rendered while sentence n plays and
+    the LLM is still generating n+2.
+    """
+    cfg = cfg or TTSConfig()
+    pending: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max(1, TTS_STREAM_PARALLEL))
+
+    async def synth(text: str) -> bytes:
+        async with slots:
+            return await asyncio.to_thread(tts_text_to_wav_bytes, text, cfg)
+
+    async def feed():
+        try:
+            async for text in sentences:
+                if text.strip():
+                    pending.put_nowait((text, asyncio.ensure_future(synth(text))))
+        finally:
+            pending.put_nowait(None)
+
+    feeder = asyncio.ensure_future(feed())
+    try:
+        while (item := await pending.get()) is not None:
+            text, task = item
+            try:
+                wav = await task
+            except Exception as e:
+                # one failed sentence is dropped, the rest of the reply still plays
+                logger.warning("[tts] sentence failed, skipped: %s (%r)", e, text[:60])
+                continue
+            yield text, wav
+        await feeder  # re-raise a failed sentence source
+    finally:
+        feeder.cancel()
+        while not pending.empty():
+            if (item := pending.get_nowait()) is not None:
+                item[1].cancel()
+
+
+class TurnLatency:
+    """
+    Rolling voice-turn latencies: end of user speech -> first reply audio / whole reply,
+    plus how often each stage was the slowest on the turn's critical path.
+    """
+
+    def __init__(self, maxlen: int = 500):
+        self._lock = threading.Lock()
+        self._first_audio: dict[str, deque[float]] = {}
+        self._total: dict[str, deque[float]] = {}
+        self._bottlenecks: dict[str, Counter] = {}
+        self._maxlen = maxlen
+
+    def record(self, source: str, first_audio_sec: float, total_sec: float, bottleneck: str | None = None) -> None:
+        with self._lock:
+            self._first_audio.setdefault(source, deque(maxlen=self._maxlen)).append(first_audio_sec)
+            self._total.setdefault(source, deque(maxlen=self._maxlen)).append(total_sec)
+            if bottleneck:
+                self._bottlenecks.setdefault(source, Counter())[bottleneck] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {}
+            for source, firsts in self._first_audio.items():
+                first = np.asarray(firsts, dtype=np.float64) * 1000.0
+                total = np.asarray(self._total[source], dtype=np.float64) * 1000.0
+                out[source] = {
+                    "turns": int(first.size),
+                    "first_audio_p50_ms": round(float(np.percentile(first, 50)), 1),
+                    "first_audio_p95_ms": round(float(np.percentile(first, 95)), 1),
+                    "total_p50_ms": round(float(np.percentile(total, 50)), 1),
+                    "bottlenecks": dict(self._bottlenecks.get(source) or {}),
+                }
+            return out
+
+
+turn_latency = TurnLatency()
 
 
 def stt_tts_pipeline(wav_path: str, stt_cfg: STTConfig, tts_cfg: TTSConfig | None = None):
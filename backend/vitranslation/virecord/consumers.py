@@ -6,9 +6,13 @@ import base64
 import time
 import logging
 import re
+from dataclasses import asdict
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
-from stt_engine.stream import make_realtime_streamer
+from stt_engine.biasing import BiasProfile, build_profile, extract_terms
+from stt_engine.language import LanguageEvent
+from stt_engine.resample import PCMConverter, parse_input_format
+from stt_engine.stream import make_stable_prefix_streamer
 
 from vitranslation.ai_engine.prompts import VALID_LANGS
 from vitranslation.ai_engine.translator import (
@@ -21,6 +25,8 @@ from .memory import SessionMemory
 from .history_fs import (
     ensure_session,
     read_source_target,
+    read_glossary,
+    write_glossary,
     write_source,
     write_target,
     build_title_context_tail,
@@ -38,12 +44,32 @@ MIN_COMMIT_CHARS = 80
 PAUSE_SEC = 0.3
 TICK = 0.15
 QUICK_COMMIT_CHARS = 80  # commit even without punctuation after this many chars
+VAD_COMMIT_CHARS = 12  # a speech pause (VAD speech_end) closes segments this short
+STOP_FLUSH_TIMEOUT = 60.0  # stop waits for the line-1 final decode; this only guards a hung STT
+AUTO_LANG = "auto"  # stt_language value: detect once per session, then lock
+STATUS_EVERY_SEC = 2.0  # stt.status repeat period while live STT is lagging
+PARTIAL_MIN_WINDOW_SEC = 5.0  # stream per-segment drafts only for long tails (short ones stay batched)
 
 
 def _safe_lang(x: str) -> str:
     return (x or "").strip().lower()
 
 
+def _parse_glossary(raw) -> list[str] | None:
+    """init "glossary": list of terms or one comma/newline separated string; None = not sent."""
+    if raw is None:
+        return None
+    items = raw if isinstance(raw, (list, tuple)) else re.split(r"[,\n;]+", str(raw))
+    return [_norm_space(str(t)) for t in items if _norm_space(str(t))]
+
+
+def _title_stt_bias(mem: SessionMemory) -> BiasProfile:
+    """Title name, its glossary and recurring names/acronyms from earlier recordings of the title."""
+    terms = [*mem.glossary, *extract_terms(mem.committed_source)]
+    prompt = f"{mem.title_name}. {', '.join(mem.glossary)}." if mem.glossary else mem.title_name
+    return build_profile(f"virecord:{mem.title_id}", terms, prompt)
+
+
 def _b64_to_bytes(b64: str) -> bytes:
     return base64.b64decode((b64 or "").encode("utf-8"))
 
@@ -52,6 +78,10 @@ def _norm_space(s: str) -> str:
     return " ".join((s or "").split())
 
 
+def _join_text(a: str, b: str) -> str:
+    return " ".join(p for p in ((a or "").strip(), (b or "").strip()) if p)
+
+
 def _split_commit_by_punct(draft_raw: str) -> tuple[int, str, str]:
     if not draft_raw:
         return 0, "", ""
@@ -112,8 +142,11 @@ class ViRecordConsumer(AsyncJsonWebsocketConsumer):
         self.commit_q: asyncio.Queue[str] = asyncio.Queue()
 
         self._tasks: list[asyncio.Task] = []
+        self._line1_task: asyncio.Task | None = None
         self._inited = False
         self._stop_event = asyncio.Event()
+        self._convert: PCMConverter | None = None  # set by init when audio is not 16 kHz mono PCM16
+        self._follow_stt_language = False  # translate_source "auto": use the locked STT language
 
         logger.warning("[connect] client connected")
 
@@ -140,6 +173,9 @@ class ViRecordConsumer(AsyncJsonWebsocketConsumer):
                 await self.send_json({"type": "error", "error": "bad audio base64"})
                 return
 
+            if self._convert is not None:
+                pcm = self._convert(pcm)  # declared rate/channels/format -> 16 kHz mono PCM16
+
             self.mem.last_audio_ts = time.time()
             await self.audio_q.put(pcm)
             return
@@ -162,14 +198,28 @@ class ViRecordConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json({"type": "error", "error": "missing title_id"})
             return
 
-        if stt_lang not in VALID_LANGS or tr_src not in VALID_LANGS or tr_tgt not in VALID_LANGS:
+        # "auto": detect once, lock for the session (stt.language event); translation source follows
+        if stt_lang not in VALID_LANGS | {AUTO_LANG} or tr_tgt not in VALID_LANGS:
+            await self.send_json({"type": "error", "error": "Only languages allowed: en / vi / zh (stt: auto)"})
+            return
+        if tr_src not in VALID_LANGS and not (tr_src == AUTO_LANG and stt_lang == AUTO_LANG):
             await self.send_json({"type": "error", "error": "Only languages allowed: en / vi / zh"})
             return
 
+        try:
+            audio_fmt = parse_input_format(content)
+        except ValueError as e:
+            await self.send_json({"type": "error", "error": str(e)})
+            return
+        self._convert = None if audio_fmt.is_native() else PCMConverter(audio_fmt)
+
         self.mem.title_id = title_id
         self.mem.title_name = title_name or title_id
         self.mem.stt_language = stt_lang
         self.mem.translate_source = tr_src
+        self._follow_stt_language = tr_src == AUTO_LANG
+        if self._follow_stt_language:
+            self.mem.translate_source = "en"  # until the STT language is locked
         self.mem.translate_target = tr_tgt
 
         ensure_session(self.mem.title_id, self.mem.title_name)
@@ -179,11 +229,15 @@ class ViRecordConsumer(AsyncJsonWebsocketConsumer):
         self.mem.committed_target = (prev_tgt or "").strip()
         self.mem.title_context_tail = build_title_context_tail(prev_src, prev_tgt)
 
-        self.mem.stt_cumulative = ""
+        glossary = _parse_glossary(content.get("glossary"))
+        if glossary is not None:
+            write_glossary(self.mem.title_id, glossary)
+        self.mem.glossary = glossary if glossary is not None else read_glossary(self.mem.title_id)
+
+        self.mem.stt_pending = ""
+        self.mem.stt_tentative = ""
         self.mem.last_audio_ts = time.time()
 
-        self.mem._stt_last_emit = ""
-        self.mem._stt_committed_len = 0
         self.mem._last_commit_hash = 0
         self.mem.last_stt_update_ts = time.time()
 
@@ -192,8 +246,9 @@ class ViRecordConsumer(AsyncJsonWebsocketConsumer):
         self.mem._translating = False
 
 
+        self._line1_task = asyncio.create_task(self._line1_stt(), name="line1_stt")
         self._tasks = [
-            asyncio.create_task(self._line1_stt(), name="line1_stt"),
+            self._line1_task,
             asyncio.create_task(self._pause_commit_loop(), name="pause_commit"),
             asyncio.create_task(self._line2_translate_commits(), name="line2_translate_commits"),
         ]
@@ -203,8 +258,9 @@ class ViRecordConsumer(AsyncJsonWebsocketConsumer):
 
         self._inited = True
         logger.warning(
-            "[init] OK title_id=%s stt=%s tr=%s->%s",
-            self.mem.title_id, self.mem.stt_language, self.mem.translate_source, self.mem.translate_target
+            "[init] OK title_id=%s stt=%s tr=%s->%s audio=%s",
+            self.mem.title_id, self.mem.stt_language, self.mem.translate_source, self.mem.translate_target,
+            audio_fmt,
         )
 
     def _task_done(self, t: asyncio.Task):
@@ -219,9 +275,9 @@ class ViRecordConsumer(AsyncJsonWebsocketConsumer):
     # =========================================================
     # Commit helpers
     # =========================================================
-    async def _commit_source_segment(self, segment_raw: str):
+    async def _commit_source_segment(self, segment_raw: str, min_chars: int = MIN_COMMIT_CHARS):
         segment = _norm_space(segment_raw).strip()
-        if not segment or len(segment) < MIN_COMMIT_CHARS:
+        if not segment or len(segment) < min_chars:
             return
 
         h = hash(segment)
@@ -233,61 +289,143 @@ class ViRecordConsumer(AsyncJsonWebsocketConsumer):
         await self.commit_q.put(segment)
         await self.send_json({"type": "stt.commit", "text": segment})
 
+    async def _emit_draft(self):
+        # live draft for UI: confirmed-but-uncommitted text + tentative tail
+        draft = _join_text(self.mem.stt_pending, self.mem.stt_tentative)
+        await self.send_json({"type": "stt.delta", "text": draft, "delta": ""})
+
+    def _partial_draft_cb(self):
+        # called from the decode thread after each segment: show the draft before the window is done
+        loop = asyncio.get_running_loop()
+        self._draft_seq += 1
+        seq = self._draft_seq
+
+        def on_partial(text: str):
+            loop.call_soon_threadsafe(asyncio.ensure_future, self._emit_partial_draft(seq, text))
+
+        return on_partial
+
+    async def _emit_partial_draft(self, seq: int, text: str):
+        if seq != self._draft_seq or self.mem.stopped:
+            return
+        if len(text) <= len(self.mem.stt_tentative or ""):
+            return  # only grow the draft mid-decode; the final update may shorten it
+        self.mem.stt_tentative = text
+        await self._emit_draft()
+
+    async def _commit_pending(self):
+        pending = (self.mem.stt_pending or "").strip()
+        cut_idx, commit_raw, remain_raw = _split_commit_by_punct(pending)
+        if cut_idx > 0 and len(_norm_space(commit_raw)) >= MIN_COMMIT_CHARS:
+            self.mem.stt_pending = remain_raw
+            await self._commit_source_segment(commit_raw)
+            await self._emit_draft()
+        elif len(_norm_space(pending)) >= QUICK_COMMIT_CHARS:
+            # Fallback: commit long drafts even without punctuation
+            self.mem.stt_pending = ""
+            await self._commit_source_segment(pending)
+            await self._emit_draft()
+
     async def _flush_draft_commit(self):
-        full_raw = (self.mem.stt_cumulative or "").strip()
-        cur = max(0, min(self.mem._stt_committed_len, len(full_raw)))
-        draft_raw = full_raw[cur:].strip()
+        draft_raw = _join_text(self.mem.stt_pending, self.mem.stt_tentative)
+        self.mem.stt_pending = ""
+        self.mem.stt_tentative = ""
         if draft_raw:
-            self.mem._stt_committed_len = len(full_raw)
             await self._commit_source_segment(draft_raw)
 
+    async def _close_utterance(self, streamer):
+        # VAD speech_end: decode the tail once, then the pause closes the segment
+        update = await asyncio.to_thread(streamer.flush)
+        pending = _join_text(self.mem.stt_pending, update.committed)
+        self.mem.stt_tentative = ""
+        self.mem.last_stt_update_ts = time.time()
+        if len(_norm_space(pending)) >= VAD_COMMIT_CHARS:
+            # too-short fragments stay pending and join the next utterance
+            self.mem.stt_pending = ""
+            await self._commit_source_segment(pending, min_chars=VAD_COMMIT_CHARS)
+        else:
+            self.mem.stt_pending = pending
+        await self._emit_draft()
+
     # =========================================================
     # Line 1: STT
     # =========================================================
     async def _line1_stt(self):
         logger.warning("[line1] start stt")
-        streamer = make_realtime_streamer(language=self.mem.stt_language)
+        language = None if self.mem.stt_language == AUTO_LANG else self.mem.stt_language
+        streamer = make_stable_prefix_streamer(language=language, bias=_title_stt_bias(self.mem))
+        lagging = False
+        status_ts = 0.0
+        self._draft_seq = 0
+        draft = None  # in-flight live draft; audio keeps flowing into the streamer meanwhile
 
         while not self.mem.stopped:
             try:
                 pcm = await asyncio.wait_for(self.audio_q.get(), timeout=0.05)
                 streamer.push(pcm)
+                # take everything that queued up during the last decode, so one decode
+                # covers it (drafts are skipped instead of decoded one tick at a time)
+                while not self.audio_q.empty():
+                    streamer.push(self.audio_q.get_nowait())
             except asyncio.TimeoutError:
                 pass
 
-            if streamer.ready():
-                full = await asyncio.to_thread(streamer.transcribe_cumulative)
-                full_raw = (full or "").strip()
-                if not full_raw:
+            st = streamer.status()
+            now = time.time()
+            if st.lagging != lagging or (st.lagging and now - status_ts >= STATUS_EVERY_SEC):
+                lagging, status_ts = st.lagging, now
+                await self.send_json({"type": "stt.status", **asdict(st)})
+
+            for lang_ev in streamer.pop_language_events():
+                await self._on_stt_language(lang_ev)
+
+            if any(ev.kind == "speech_end" for ev in streamer.pop_vad_events()):
+                if draft is not None:
+                    draft.future.cancel()  # flush() covers its audio; a late result is stale
+                    draft = None
+                await self._close_utterance(streamer)
+            elif streamer.ready() and (draft is None or draft.queued()):
+                # a draft still waiting for a decode slot is replaced by the longer window
+                on_partial = None
+                if streamer.window_sec() >= PARTIAL_MIN_WINDOW_SEC:
+                    on_partial = self._partial_draft_cb()
+                draft = streamer.submit_draft(on_partial)
+            elif draft is not None and draft.done():
+                update = streamer.finish_draft(draft)
+                draft = None
+                self._draft_seq += 1  # late partials of this decode are stale now
+                if not update.committed and update.tentative == self.mem.stt_tentative:
                     continue
 
-                self.mem.stt_cumulative = full_raw
+                self.mem.stt_pending = _join_text(self.mem.stt_pending, update.committed)
+                self.mem.stt_tentative = update.tentative
                 self.mem.last_stt_update_ts = time.time()
 
-                cur = max(0, min(self.mem._stt_committed_len, len(full_raw)))
-                self.mem._stt_committed_len = cur
-                draft_raw = full_raw[cur:]
-
-                # emit live draft for UI
-                await self.send_json({"type": "stt.delta", "text": draft_raw, "delta": ""})
-
-                cut_idx, commit_raw, remain_raw = _split_commit_by_punct(draft_raw)
-                if cut_idx > 0 and len(_norm_space(commit_raw)) >= MIN_COMMIT_CHARS:
-                    self.mem._stt_committed_len = cur + cut_idx
-                    await self._commit_source_segment(commit_raw)
-                    await self.send_json({"type": "stt.delta", "text": remain_raw, "delta": ""})
-                else:
-                    # Fallback: commit long drafts even without punctuation
-                    if len(_norm_space(draft_raw)) >= QUICK_COMMIT_CHARS:
-                        self.mem._stt_committed_len = len(full_raw)
-                        await self._commit_source_segment(draft_raw)
-                        await self.send_json({"type": "stt.delta", "text": "", "delta": ""})
+                await self._emit_draft()
+                if update.committed:
+                    await self._commit_pending()
 
             if self.mem.stopping:
                 break
 
+        if self.mem.stopping and not self.mem.stopped:
+            # final pass over whatever audio is still buffered/queued
+            if draft is not None:
+                draft.future.cancel()  # only drops it while queued; flush() makes the result stale anyway
+            while not self.audio_q.empty():
+                streamer.push(self.audio_q.get_nowait())
+            update = await asyncio.to_thread(streamer.flush)
+            self.mem.stt_pending = _join_text(self.mem.stt_pending, update.committed)
+            self.mem.stt_tentative = ""
+
         logger.warning("[line1] exit")
 
+    async def _on_stt_language(self, ev: LanguageEvent):
+        logger.warning("[line1] language %s p=%.2f", ev.language or "released", ev.probability)
+        if ev.locked and self._follow_stt_language and ev.language in VALID_LANGS:
+            self.mem.translate_source = ev.language
+        await self.send_json({"type": "stt.language", **asdict(ev)})
+
     # =========================================================
     # Pause commit loop
     # =========================================================
@@ -299,21 +437,15 @@ class ViRecordConsumer(AsyncJsonWebsocketConsumer):
             if self.mem.stopping:
                 break
 
-            full_raw = (self.mem.stt_cumulative or "").strip()
-            if not full_raw:
-                continue
-
-            cur = max(0, min(self.mem._stt_committed_len, len(full_raw)))
-            self.mem._stt_committed_len = cur
-            draft_raw = full_raw[cur:].strip()
-            if not draft_raw:
+            pending = (self.mem.stt_pending or "").strip()
+            if not pending:
                 continue
 
             idle = time.time() - self.mem.last_stt_update_ts
-            if idle >= PAUSE_SEC and len(_norm_space(draft_raw)) >= MIN_COMMIT_CHARS:
-                self.mem._stt_committed_len = len(full_raw)
-                await self._commit_source_segment(draft_raw)
-                await self.send_json({"type": "stt.delta", "text": "", "delta": ""})
+            if idle >= PAUSE_SEC and len(_norm_space(pending)) >= MIN_COMMIT_CHARS:
+                self.mem.stt_pending = ""
+                await self._commit_source_segment(pending)
+                await self._emit_draft()
 
         logger.warning("[pause] exit")
 
@@ -372,7 +504,17 @@ class ViRecordConsumer(AsyncJsonWebsocketConsumer):
             return
 
         self.mem.stopping = True
-        await asyncio.sleep(0.4)
+        if self._line1_task and not self._line1_task.done():
+            # the final decode carries the last words of the recording: wait for it before committing
+            done, _ = await asyncio.wait({self._line1_task}, timeout=STOP_FLUSH_TIMEOUT)
+            if not done:
+                self._line1_task.cancel()
+                await asyncio.gather(self._line1_task, return_exceptions=True)
+                logger.error(
+                    "[stop] final decode still running after %.0fs, cancelled; unflushed audio lost (keeping draft %r)",
+                    STOP_FLUSH_TIMEOUT,
+                    _join_text(self.mem.stt_pending, self.mem.stt_tentative)[-80:],
+                )
         await self._flush_draft_commit()
 
         t0 = time.time()
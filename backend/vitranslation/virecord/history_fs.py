@@ -105,6 +105,23 @@ def write_target(title_id: str, text: str):
     folder = ensure_session(title_id)
     (folder / "target.txt").write_text(text or "", encoding="utf-8")
 
+def _read_meta(folder: Path) -> dict:
+    try:
+        return json.loads((folder / "meta.json").read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def read_glossary(title_id: str) -> list[str]:
+    """Per-title terminology (meta.json "glossary"), used to bias STT for this title."""
+    meta = _read_meta(ensure_session(title_id))
+    return [str(t).strip() for t in meta.get("glossary") or [] if str(t).strip()]
+
+def write_glossary(title_id: str, terms: list[str]):
+    folder = ensure_session(title_id)
+    meta = _read_meta(folder) or {"title_id": title_id, "title_name": title_id, "created_at": title_id}
+    meta["glossary"] = [t.strip() for t in terms if t and t.strip()]
+    (folder / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
 def build_title_context_tail(prev_source: str, prev_target: str, max_lines: int = 12) -> str:
     """
     Context theo title (không AI): lấy vài dòng cuối từ source/target file.
@@ -26,13 +26,13 @@ class SessionMemory:
     committed_source: str = ""         # full source history (persisted)
     committed_target: str = ""         # full target history (persisted)
     title_context_tail: str = ""       # context tail built from persisted files
+    glossary: list[str] = field(default_factory=list)  # title terminology (meta.json), biases STT
 
     # =========================
     # Runtime STT (current recording session)
     # =========================
-    stt_cumulative: str = ""           # full STT of current recording session
-    _stt_last_emit: str = ""           # for legacy delta compatibility
-    _stt_committed_len: int = 0        # cursor into stt_cumulative (chars) that have been committed
+    stt_pending: str = ""              # confirmed by the streamer, not yet committed as a segment
+    stt_tentative: str = ""            # unconfirmed tail hypothesis (may still change)
     last_stt_update_ts: float = field(default_factory=lambda: time.time())
 
     # =========================
@@ -17,4 +17,8 @@ urlpatterns = [
     # DELETE TOPIC
     path("api/delete_topic", views.api_delete_topic),
     path("api/delete_topic/", views.api_delete_topic),
+
+    # STT SCHEDULER METRICS
+    path("api/stt_stats", views.api_stt_stats),
+    path("api/stt_stats/", views.api_stt_stats),
 ]
@@ -5,6 +5,10 @@ import json
 from django.http import JsonResponse, HttpResponseNotAllowed
 from django.views.decorators.csrf import csrf_exempt
 
+from stt_engine import engines, hardware
+from stt_engine.scheduler import get_scheduler
+from stt_engine.whisper_gpu import registry
+
 from .history_fs import list_titles, new_session, read_detail, delete_session
 
 def api_record_history(request):
@@ -49,3 +53,15 @@ def api_delete_topic(request):
     if ok:
         return JsonResponse({"ok": True})
     return JsonResponse({"error": "not_found_or_failed"}, status=400)
+
+
+def api_stt_stats(request):
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    return JsonResponse({
+        "scheduler": get_scheduler().stats(),
+        "models": registry.stats(),
+        "hardware": hardware.describe(),
+        "engines": engines.describe(),
+        "model_history": registry.history(),
+    })
@@ -9,7 +9,6 @@ const recordedAudio = document.getElementById("recordedAudio");
 const langEl = document.getElementById("lang");
 
 const WS_URL = "ws://127.0.0.1:8000/ws/viassistant/";
-const TARGET_SAMPLE_RATE = 16000;
 
 let audioContext = null;
 let mediaStream = null;
@@ -17,6 +16,35 @@ let processor = null;
 let recording = false;
 let ws = null;
 let inputSampleRate = 48000;
+let sentenceQueue = []; // streamed reply: tts.sentence clips waiting to play, in order
+
+function b64ToBlobUrl(b64, mime) {
+  const bytes = atob(b64);
+  const buf = new Uint8Array(bytes.length);
+  for (let i = 0; i < bytes.length; i++) {
+    buf[i] = bytes.charCodeAt(i);
+  }
+  return URL.createObjectURL(new Blob([buf], { type: mime || "audio/wav" }));
+}
+
+function playNextSentence() {
+  if (!sentenceQueue.length || !ttsAudio.paused) return;
+  ttsAudio.src = sentenceQueue.shift();
+  ttsAudio.play().catch(() => {});
+}
+
+ttsAudio.addEventListener("ended", playNextSentence);
+
+// audio goes out at the mic's native rate; the server resamples/downmixes to 16 kHz mono
+function startMessage() {
+  return JSON.stringify({
+    type: "start",
+    language: "en",
+    sample_rate: inputSampleRate,
+    channels: 1,
+    format: "s16le",
+  });
+}
 
 function setStatus(msg) {
   statusEl.textContent = msg;
@@ -41,30 +69,6 @@ function mergeBuffers(buffers, length) {
   return result;
 }
 
-function downsampleBuffer(buffer, sampleRate, outRate) {
-  if (outRate === sampleRate) {
-    return buffer;
-  }
-  const ratio = sampleRate / outRate;
-  const newLength = Math.round(buffer.length / ratio);
-  const result = new Float32Array(newLength);
-  let offsetResult = 0;
-  let offsetBuffer = 0;
-  while (offsetResult < result.length) {
-    const nextOffsetBuffer = Math.round((offsetResult + 1) * ratio);
-    let sum = 0;
-    let count = 0;
-    for (let i = offsetBuffer; i < nextOffsetBuffer && i < buffer.length; i++) {
-      sum += buffer[i];
-      count++;
-    }
-    result[offsetResult] = sum / count;
-    offsetResult++;
-    offsetBuffer = nextOffsetBuffer;
-  }
-  return result;
-}
-
 function encodeWav(samples, sampleRate) {
   const buffer = new ArrayBuffer(44 + samples.length * 2);
   const view = new DataView(buffer);
@@ -103,6 +107,7 @@ async function startRecording() {
   sttText.textContent = "";
   aiText.textContent = "";
   ttsAudio.removeAttribute("src");
+  sentenceQueue = [];
 
   mediaStream = await navigator.mediaDevices.getUserMedia({ audio: true });
   audioContext = new (window.AudioContext || window.webkitAudioContext)();
@@ -115,7 +120,7 @@ async function startRecording() {
   if (!ws || ws.readyState !== WebSocket.OPEN) {
     ws = new WebSocket(WS_URL);
     ws.onopen = () => {
-      ws.send(JSON.stringify({ type: "start", language: "en" }));
+      ws.send(startMessage());
       setStatus("Recording...");
     };
     ws.onmessage = (evt) => {
@@ -125,16 +130,20 @@ async function startRecording() {
           sttText.textContent = data.stt_text || "";
           aiText.textContent = data.ai_text || "";
           if (data.audio_b64) {
-            const bytes = atob(data.audio_b64);
-            const buf = new Uint8Array(bytes.length);
-            for (let i = 0; i < bytes.length; i++) {
-              buf[i] = bytes.charCodeAt(i);
-            }
-            const blob = new Blob([buf], { type: data.audio_mime || "audio/wav" });
-            ttsAudio.src = URL.createObjectURL(blob);
+            ttsAudio.src = b64ToBlobUrl(data.audio_b64, data.audio_mime);
           }
           setStatus("Done.");
         }
+        if (data.type === "tts.sentence") {
+          // streamed reply: play each sentence as it arrives
+          aiText.textContent = data.index ? `${aiText.textContent} ${data.text}` : data.text;
+          sentenceQueue.push(b64ToBlobUrl(data.audio_b64, data.audio_mime));
+          playNextSentence();
+          setStatus("Speaking...");
+        }
+        if (data.type === "stt.language") {
+          setStatus(data.locked ? `Language: ${data.language}` : "Detecting language...");
+        }
       } catch (e) {
         setStatus("Bad WS message");
       }
@@ -143,16 +152,15 @@ async function startRecording() {
       setStatus("WS closed");
     };
   } else {
-    ws.send(JSON.stringify({ type: "start", language: "en" }));
+    ws.send(startMessage());
   }
 
   processor.onaudioprocess = (e) => {
     if (!recording || !ws || ws.readyState !== WebSocket.OPEN) return;
     const input = e.inputBuffer.getChannelData(0);
-    const downsampled = downsampleBuffer(input, inputSampleRate, TARGET_SAMPLE_RATE);
-    const pcm16 = new Int16Array(downsampled.length);
-    for (let i = 0; i < downsampled.length; i++) {
-      let s = Math.max(-1, Math.min(1, downsampled[i]));
+    const pcm16 = new Int16Array(input.length);
+    for (let i = 0; i < input.length; i++) {
+      let s = Math.max(-1, Math.min(1, input[i]));
       pcm16[i] = s < 0 ? s * 0x8000 : s * 0x7fff;
     }
     ws.send(pcm16.buffer);
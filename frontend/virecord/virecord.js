@@ -535,6 +535,9 @@ async function startRecording(isReconnect = false) {
   ws.onopen = async () => {
     setStatus("Recording...");
 
+    // open the mic first: init declares its native rate (server resamples to 16 kHz)
+    await initAudio();
+
     wsSend({
       type: "init",
       title_id: activeTitleId,
@@ -542,9 +545,10 @@ async function startRecording(isReconnect = false) {
       stt_language: sourceLang,
       translate_source: sourceLang,
       translate_target: targetLang,
+      sample_rate: audioCtx.sampleRate,
+      channels: 1,
+      format: "s16le",
     });
-
-    await initAudio();
   };
 
   ws.onmessage = (ev) => {
@@ -584,6 +588,27 @@ async function startRecording(isReconnect = false) {
       return;
     }
 
+    // -------------------------
+    // STT STATUS (live STT speed)
+    // -> báo khi STT bị chậm hơn giọng nói
+    // -------------------------
+    if (msg.type === "stt.status") {
+      if (!pendingStop) {
+        const backlog = Number(msg.backlog_sec || 0).toFixed(1);
+        setStatus(msg.lagging ? `Recording... (STT lagging ${backlog}s)` : "Recording...");
+      }
+      return;
+    }
+
+    // stt_language "auto": the server locked (or released) the detected language
+    if (msg.type === "stt.language") {
+      if (!pendingStop) {
+        const lang = LANGS[msg.language] ? LANGS[msg.language].label : (msg.language || "detecting");
+        setStatus(msg.locked ? `Recording... (${lang})` : "Recording... (detecting language)");
+      }
+      return;
+    }
+
     // -------------------------
     // TRANSLATION DELTA
     // -> streaming vào tgtLive (append)
@@ -708,7 +733,7 @@ $("btnRecord").onclick = () => {
 };
 
 /* ======================
- * AUDIO → PCM16(base64) → WS
+ * AUDIO → PCM16(base64, native rate) → WS
  * ====================== */
 async function initAudio() {
   micStream = await navigator.mediaDevices.getUserMedia({
@@ -724,14 +749,11 @@ async function initAudio() {
 
     const input = e.inputBuffer.getChannelData(0);
 
-    // resample -> 16k PCM16
-    const targetRate = 16000;
-    const ratio = audioCtx.sampleRate / targetRate;
-    const newLen = Math.round(input.length / ratio);
-    const pcm16 = new Int16Array(newLen);
+    // native-rate PCM16; resampling to 16k happens on the server (anti-aliased)
+    const pcm16 = new Int16Array(input.length);
 
-    for (let i = 0; i < newLen; i++) {
-      const s = Math.max(-1, Math.min(1, input[Math.round(i * ratio)]));
+    for (let i = 0; i < input.length; i++) {
+      const s = Math.max(-1, Math.min(1, input[i]));
       pcm16[i] = s < 0 ? (s * 0x8000) : (s * 0x7fff);
     }
 